@@ -0,0 +1,431 @@
+"""In-memory stand-ins for the BlitzGateway objects used by omero-arc.
+
+A FakeServer holds a synthetic project and counts the server round
+trips of all connections to it. Every round trip sleeps for the
+configured latency.
+
+The query service of FakeGateway answers the HQL queries of
+ProjectSnapshot.load and load_pixels, so that the snapshot is loaded
+with the real loader. Pass FAKE_GATEWAY_CLASSES as classes to wrap the
+results with the fake wrappers. The query parameters are those of
+omero-py (omero.sys.ParametersI).
+"""
+import datetime
+import threading
+import time
+from collections import Counter
+
+from omero_arc.arc_pixels import PIXELS_QUERY
+from omero_arc.arc_snapshot import (
+    ANNOTATION_QUERY,
+    DATASET_QUERY,
+    IMAGE_QUERY,
+    GatewayClasses,
+)
+
+
+class FakeServer:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, name):
+        with self._lock:
+            self.round_trips[name] += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+
+class FakeExperimenter:
+    def __init__(self, experimenter_id, first_name, last_name):
+        self._id = experimenter_id
+        self._first_name = first_name
+        self._last_name = last_name
+
+    def getId(self):
+        return self._id
+
+    def getFirstName(self):
+        return self._first_name
+
+    def getLastName(self):
+        return self._last_name
+
+    def getEmail(self):
+        return f"{self._first_name}.{self._last_name}@example.org".lower()
+
+
+class FakeDetails:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def getOwner(self):
+        return self._owner
+
+
+class FakeRType:
+    def __init__(self, value):
+        self._value = value
+
+    def getValue(self):
+        return self._value
+
+
+class FakeModelObject(dict):
+    """Object data as returned by the fake query service. Like omero
+    model objects, ids are returned as rtypes."""
+
+    def getId(self):
+        return FakeRType(self["id"])
+
+    def getFileset(self):
+        # unloaded, only the id is known
+        if self.get("fileset") is None:
+            return None
+        return FakeModelObject(id=self["fileset"])
+
+
+class FakeMapAnnotationObject(FakeModelObject):
+    pass
+
+
+class FakeLink:
+    def __init__(self, parent, child):
+        self._parent = parent
+        self._child = child
+
+    def getParent(self):
+        return self._parent
+
+    def getChild(self):
+        return self._child
+
+
+class FakeMapAnnotation:
+    OMERO_CLASS = "MapAnnotation"
+
+    def __init__(self, conn, obj):
+        self._conn = conn
+        self._obj = obj
+
+    def getNs(self):
+        return self._obj["ns"]
+
+    def getValue(self):
+        return self._obj["values"]
+
+
+def map_annotation(namespace, values):
+    return FakeMapAnnotationObject(ns=namespace, values=list(values.items()))
+
+
+class FakeLength:
+    def __init__(self, value, unit):
+        self._value = value
+        self._unit = unit
+
+    def getValue(self):
+        return self._value
+
+    def getUnit(self):
+        return self._unit
+
+
+class FakeObject:
+    """Base of fake projects, datasets and images.
+
+    Like the gateway wrappers, the object data (_obj) can be rewrapped
+    for another connection with FakeObject(conn, obj).
+    """
+
+    OMERO_CLASS = None
+
+    def __init__(self, conn, obj):
+        self._conn = conn
+        self._obj = obj
+
+    def getId(self):
+        return self._obj["id"]
+
+    def getName(self):
+        return self._obj["name"]
+
+    def getDescription(self):
+        return self._obj.get("description", "")
+
+    def getOwner(self):
+        self._conn.server.call("getOwner")
+        return self._obj["owner"]
+
+    def getDetails(self):
+        return FakeDetails(self._obj["owner"])
+
+    def updateEventDate(self):
+        return self._obj["updated"]
+
+    def listAnnotations(self):
+        self._conn.server.call("listAnnotations")
+        return iter(
+            [
+                FakeMapAnnotation(self._conn, obj)
+                for obj in self._obj.get("annotations", [])
+            ]
+        )
+
+
+class FakeProject(FakeObject):
+    OMERO_CLASS = "Project"
+
+
+class FakeDataset(FakeObject):
+    OMERO_CLASS = "Dataset"
+
+
+class FakeImage(FakeObject):
+    OMERO_CLASS = "Image"
+
+    def getSizeX(self):
+        return self._obj["size_x"]
+
+    def getSizeY(self):
+        return self._obj["size_y"]
+
+    def getSizeZ(self):
+        return self._obj["size_z"]
+
+    def getSizeC(self):
+        return self._obj["size_c"]
+
+    def getSizeT(self):
+        return self._obj["size_t"]
+
+    def getPixelsType(self):
+        return self._obj["pixel_type"]
+
+    def _pixel_size(self, value, units):
+        if units:
+            return FakeLength(value, "MICROMETER")
+        return value
+
+    def getPixelSizeX(self, units=None):
+        return self._pixel_size(self._obj["pixel_size"], units)
+
+    def getPixelSizeY(self, units=None):
+        return self._pixel_size(self._obj["pixel_size"], units)
+
+    def getPixelSizeZ(self, units=None):
+        return self._pixel_size(self._obj["pixel_size"], units)
+
+    def loadOriginalMetadata(self):
+        self._conn.server.call("loadOriginalMetadata")
+        return (None, self._obj["series_metadata"], self._obj["global_metadata"])
+
+
+FAKE_GATEWAY_CLASSES = GatewayClasses(
+    FakeDataset, FakeImage, FakeMapAnnotation, FakeMapAnnotationObject
+)
+
+
+def _parameter(params, name):
+    from omero.rtypes import unwrap
+
+    return unwrap(params.map[name])
+
+
+class FakeQueryService:
+    """Answers the queries of ProjectSnapshot.load and load_pixels."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _links(self, parents, children, ids):
+        links = [
+            FakeLink(parent, child)
+            for parent in parents
+            if parent["id"] in ids
+            for child in children(parent)
+        ]
+        return sorted(links, key=lambda link: link.getChild()["id"])
+
+    def findAllByQuery(self, query, params, ctx=None):
+        self._conn.server.call("findAllByQuery")
+        conn = self._conn
+        if query == DATASET_QUERY:
+            if _parameter(params, "id") != conn._project["id"]:
+                return []
+            return list(conn._datasets)
+
+        ids = set(_parameter(params, "ids"))
+        if query == IMAGE_QUERY:
+            return self._links(
+                conn._datasets, lambda dataset: conn._images[dataset["id"]], ids
+            )
+        parents = {
+            "Project": [conn._project],
+            "Dataset": conn._datasets,
+            "Image": [obj for objs in conn._images.values() for obj in objs],
+        }
+        for omero_class, objects in parents.items():
+            if query == ANNOTATION_QUERY.format(omero_class):
+                return [
+                    FakeLink(obj, annotation)
+                    for obj in objects
+                    if obj["id"] in ids
+                    for annotation in obj.get("annotations", [])
+                ]
+        raise NotImplementedError(query)
+
+    def projection(self, query, params, ctx=None):
+        self._conn.server.call("projection")
+        if query != PIXELS_QUERY:
+            raise NotImplementedError(query)
+        ids = set(_parameter(params, "ids"))
+        rows = []
+        for dataset_id, objs in self._conn._images.items():
+            if dataset_id not in ids:
+                continue
+            for obj in objs:
+                rows.append(
+                    [dataset_id, obj["id"]]
+                    + [obj[f"size_{d}"] for d in "xyzct"]
+                    + [obj["pixel_size"]] * 3
+                    + ["MICROMETER", obj["pixel_type"]]
+                )
+        return sorted(rows, key=lambda row: row[1])
+
+
+class _FakeClient:
+    def getSessionId(self):
+        return "fake-session"
+
+
+class FakeGateway:
+    """Stand-in for omero.gateway.BlitzGateway."""
+
+    SERVICE_OPTS = None
+
+    def __init__(self, server, project, datasets, images, experimenters=()):
+        self.server = server
+        self._experimenters = {e.getId(): e for e in experimenters}
+        self.c = _FakeClient()
+        self._project = project
+        self._datasets = datasets
+        self._images = images
+
+    def clone(self):
+        return FakeGateway(
+            self.server,
+            self._project,
+            self._datasets,
+            self._images,
+            self._experimenters.values(),
+        )
+
+    def connect(self, sUuid=None):
+        self.server.call("connect")
+        return True
+
+    def close(self, hard=True):
+        pass
+
+    def isConnected(self):
+        return True
+
+    def getObjects(self, obj_type, ids=None, opts=None):
+        self.server.call("getObjects")
+        if obj_type == "Experimenter":
+            return iter([self._experimenters[i] for i in ids])
+        if obj_type == "Dataset":
+            objs, cls = self._datasets, FakeDataset
+        elif obj_type == "Image":
+            objs, cls = self._images[opts["dataset"]], FakeImage
+        else:
+            raise NotImplementedError(obj_type)
+        return iter([cls(self, obj) for obj in objs])
+
+    def getObject(self, obj_type, oid):
+        self.server.call("getObject")
+        if obj_type != "Project" or oid != self._project["id"]:
+            raise NotImplementedError(obj_type)
+        return FakeProject(self, self._project)
+
+    def getQueryService(self):
+        return FakeQueryService(self)
+
+
+def synthetic_project(
+    n_images,
+    n_datasets=4,
+    n_metadata_keys=100,
+    n_owners=3,
+    n_series=4,
+    latency=0.0,
+):
+    """Creates a FakeGateway with a synthetic project of n_images
+    images distributed over n_datasets datasets. n_series consecutive
+    images are series of one fileset."""
+    server = FakeServer(latency=latency)
+    owners = [
+        FakeExperimenter(i + 1, f"First{i}", f"Last{i}") for i in range(n_owners)
+    ]
+    updated = datetime.datetime(2023, 1, 1)
+
+    project = FakeModelObject(
+        id=1,
+        name="Synthetic Study",
+        description="A synthetic project for benchmarks",
+        owner=owners[0],
+        updated=updated,
+        annotations=[
+            map_annotation(
+                "ARC:ISA:STUDY:STUDY PUBLICATIONS",
+                {"Study Publication DOI": f"10.1234/{i}"},
+            )
+            for i in range(3)
+        ],
+    )
+    global_metadata = [(f"global key {i}", f"value {i}") for i in range(n_metadata_keys)]
+
+    datasets = []
+    images = {}
+    image_id = 1
+    for d in range(n_datasets):
+        dataset_id = d + 1
+        datasets.append(
+            FakeModelObject(
+                id=dataset_id,
+                name=f"Synthetic Assay {dataset_id}",
+                owner=owners[d % n_owners],
+                updated=updated,
+                annotations=[
+                    map_annotation(
+                        "ARC:ISA:ASSAY:ASSAY PERFORMERS", {"Last Name": "Doe"}
+                    )
+                ],
+            )
+        )
+        images[dataset_id] = []
+        n = n_images // n_datasets + (1 if d < n_images % n_datasets else 0)
+        for _ in range(n):
+            images[dataset_id].append(
+                FakeModelObject(
+                    id=image_id,
+                    name=f"image {image_id}",
+                    owner=owners[d % n_owners],
+                    updated=updated,
+                    size_x=512,
+                    size_y=512,
+                    size_z=10,
+                    size_c=3,
+                    size_t=1,
+                    pixel_type="uint16",
+                    fileset=(image_id - 1) // n_series + 1,
+                    pixel_size=0.1,
+                    series_metadata=[("series", image_id)],
+                    global_metadata=global_metadata,
+                )
+            )
+            image_id += 1
+
+    return FakeGateway(server, project, datasets, images, owners)
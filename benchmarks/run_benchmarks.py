@@ -0,0 +1,260 @@
+"""Benchmarks ArcPacker stage by stage without an omero server.
+
+The packer runs against the in-memory gateway of fake_omero.py, which
+needs omero-py for the query parameters of the snapshot. With
+--isa-backend arccommander, the stub fake_arc is put on the PATH as
+`arc` and its invocations are counted.
+
+Examples:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --images 10 1000 100000 --latency 2
+    python benchmarks/run_benchmarks.py --isa-backend arccommander \
+        --arc-startup 0.3 --images 10 100
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent / "src"))
+
+from fake_omero import FAKE_GATEWAY_CLASSES, synthetic_project  # noqa: E402
+from omero_arc.arc_packer import ArcPacker  # noqa: E402
+from omero_arc.arc_snapshot import ProjectSnapshot  # noqa: E402
+
+
+class StageTimer:
+    """Records wall time, server round trips, arc invocations and peak
+    traced memory of every stage."""
+
+    def __init__(self, server, arc_log=None):
+        self.server = server
+        self.arc_log = arc_log
+        self.results = []
+
+    def _arc_invocations(self):
+        if self.arc_log is None or not self.arc_log.exists():
+            return 0
+        with open(self.arc_log) as f:
+            return sum(1 for _ in f)
+
+    @contextmanager
+    def stage(self, name):
+        round_trips = sum(self.server.round_trips.values())
+        arc_invocations = self._arc_invocations()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        self.results.append(
+            {
+                "stage": name,
+                "seconds": seconds,
+                "round_trips": sum(self.server.round_trips.values()) - round_trips,
+                "arc_invocations": self._arc_invocations() - arc_invocations,
+                "peak_mib": peak / 2**20,
+            }
+        )
+
+
+def write_image_files(path, n_images, image_size):
+    """Writes one file per image and returns the image filenames
+    mapping as created by omero-cli-transfer."""
+    mapping = {}
+    data = os.urandom(image_size)
+    for image_id in range(1, n_images + 1):
+        relpath = Path(f"pixel_images/{image_id}/image{image_id}.tiff")
+        os.makedirs(path / relpath.parent, exist_ok=True)
+        with open(path / relpath, "wb") as f:
+            f.write(data)
+        mapping[f"Image:{image_id}"] = relpath
+    return mapping
+
+
+@contextmanager
+def fake_arc_on_path(workdir, startup):
+    """Puts an `arc` executable that runs fake_arc on the PATH."""
+    bindir = workdir / "bin"
+    os.makedirs(bindir)
+    arc = bindir / "arc"
+    with open(arc, "w") as f:
+        f.write(f"#!/bin/sh\nexec {sys.executable} {HERE / 'fake_arc'} \"$@\"\n")
+    arc.chmod(0o755)
+
+    arc_log = workdir / "arc_invocations.jsonl"
+    env = {
+        "PATH": f"{bindir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "PYTHONPATH": os.pathsep.join(
+            [str(HERE.parent / "src"), os.environ.get("PYTHONPATH", "")]
+        ),
+        "FAKE_ARC_LOG": str(arc_log),
+        "FAKE_ARC_STARTUP": str(startup),
+    }
+    old_env = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield arc_log
+    finally:
+        for key, value in old_env.items():
+            if value is None:
+                del os.environ[key]
+            else:
+                os.environ[key] = value
+
+
+def run_benchmark(n_images, args, workdir):
+    conn = synthetic_project(
+        n_images,
+        n_datasets=args.datasets,
+        n_metadata_keys=args.metadata_keys,
+        latency=args.latency / 1000,
+    )
+    project = conn.getObject("Project", 1)
+    conn.server.round_trips.clear()
+
+    image_path = workdir / "images"
+    mapping = write_image_files(image_path, n_images, args.image_size)
+    arc_path = workdir / "arc"
+
+    packer = ArcPacker(
+        project,
+        arc_path,
+        image_path,
+        mapping,
+        conn,
+        isa_backend=args.isa_backend,
+        staging_workers=args.workers,
+        metadata_workers=args.workers,
+    )
+
+    arc_log = workdir / "arc_invocations.jsonl"
+    timer = StageTimer(conn.server, arc_log)
+    tracemalloc.start()
+    try:
+        with timer.stage("snapshot"):
+            packer.snapshot = ProjectSnapshot.load(
+                conn,
+                project,
+                instrumentation=packer.instrumentation,
+                classes=FAKE_GATEWAY_CLASSES,
+            )
+            # prefetches the owners
+            packer.project_snapshot()
+        with timer.stage("investigation"):
+            with packer.batched_isa_commands():
+                packer.initialize_arc_repo()
+        with timer.stage("study"):
+            with packer.batched_isa_commands():
+                packer._create_study()
+        with timer.stage("assays"):
+            with packer.batched_isa_commands():
+                packer._create_assays()
+            packer._record_isa_objects()
+        if args.pipelined:
+            # image copy, original metadata and sheets overlap
+            with timer.stage("assay data"):
+                packer._add_assay_data()
+        else:
+            with timer.stage("image copy"):
+                for assay_identifier in packer.assay_contexts:
+                    packer._add_image_data_for_assay(assay_identifier)
+            with timer.stage("original metadata"):
+                for assay_identifier in packer.assay_contexts:
+                    packer._add_original_metadata_for_assay(assay_identifier)
+            with timer.stage("sheets"):
+                packer._add_isa_assay_sheets()
+    finally:
+        tracemalloc.stop()
+    return timer.results
+
+
+def format_results(n_images, results):
+    lines = [
+        f"{n_images} images",
+        f"{'stage':<20}{'seconds':>10}{'round trips':>13}"
+        f"{'arc calls':>11}{'peak MiB':>10}",
+    ]
+    for r in results:
+        lines.append(
+            f"{r['stage']:<20}{r['seconds']:>10.3f}{r['round_trips']:>13}"
+            f"{r['arc_invocations']:>11}{r['peak_mib']:>10.1f}"
+        )
+    total = sum(r["seconds"] for r in results)
+    lines.append(f"{'total':<20}{total:>10.3f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--images",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="project sizes (number of images) to benchmark",
+    )
+    parser.add_argument("--datasets", type=int, default=4)
+    parser.add_argument(
+        "--metadata-keys",
+        type=int,
+        default=100,
+        help="number of global original metadata entries per image",
+    )
+    parser.add_argument(
+        "--image-size", type=int, default=4096, help="bytes per image file"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="ms per server round trip"
+    )
+    parser.add_argument(
+        "--isa-backend", choices=["xlsx", "arccommander"], default="xlsx"
+    )
+    parser.add_argument(
+        "--arc-startup",
+        type=float,
+        default=0.0,
+        help="seconds the fake arc executable sleeps per invocation",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="export image files, original metadata and sheets in one "
+        "pipelined stage",
+    )
+    parser.add_argument(
+        "--json", type=Path, help="append the results as json lines to this file"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for n_images in args.images:
+        workdir = Path(tempfile.mkdtemp(prefix="omero-arc-benchmark-"))
+        try:
+            with fake_arc_on_path(workdir, args.arc_startup):
+                results = run_benchmark(n_images, args, workdir)
+        finally:
+            shutil.rmtree(workdir)
+        print(format_results(n_images, results))
+        print()
+        if args.json is not None:
+            with open(args.json, "a") as f:
+                for r in results:
+                    f.write(json.dumps(dict(r, images=n_images)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,72 @@
-from omero_arc.arc_packer import ArcPacker, pack_arc
+"""Plugin for omero-cli-transfer to export OMERO data to ARC repositories.
+
+omero-cli-transfer loads pack_arc through the
+omero_cli_transfer.pack.plugin entry point for every `omero transfer`
+command. Importing this package therefore only defines thin entry
+points; the packer modules (and pandas, openpyxl) are imported when an
+ARC is actually packed or one of the exported names is accessed.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "ArcBatchPacker": "omero_arc.arc_batch",
+    "ArcPacker": "omero_arc.arc_packer",
+    "AsyncArcPacker": "omero_arc.arc_async",
+}
+
+__all__ = [
+    "ArcBatchPacker",
+    "ArcPacker",
+    "AsyncArcPacker",
+    "pack_arc",
+    "pack_arc_batch",
+]
+
+
+def pack_arc(ome_object,
+             destination_path,
+             tmp_path,
+             image_filenames_mapping,
+             conn,
+             **kwargs):
+    """Packs ome_object into an ARC at destination_path, see
+    omero_arc.arc_packer.pack_arc."""
+    from omero_arc.arc_packer import pack_arc
+
+    return pack_arc(ome_object,
+                    destination_path,
+                    tmp_path,
+                    image_filenames_mapping,
+                    conn,
+                    **kwargs)
+
+
+def pack_arc_batch(ome_objects,
+                   destination_path,
+                   tmp_path,
+                   image_filenames_mapping,
+                   conn,
+                   **kwargs):
+    """Packs several omero projects into one ARC, see
+    omero_arc.arc_batch.pack_arc_batch."""
+    from omero_arc.arc_batch import pack_arc_batch
+
+    return pack_arc_batch(ome_objects,
+                          destination_path,
+                          tmp_path,
+                          image_filenames_mapping,
+                          conn,
+                          **kwargs)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import threading
+import time
+
+from omero_arc.arc_backend import ArcCommanderBackend
+from omero_arc.arc_instrumentation import SUBPROCESSES
+from omero_arc.arc_packer import ArcPacker
+from omero_arc.arc_staging import StagingSummary
+
+# put into the progress queue when the pack has ended
+_END_OF_PACK = object()
+
+
+class PackCancelled(Exception):
+    """Raised in executor threads when the pack has been cancelled."""
+
+
+class AsyncArcPacker:
+    """Packs an omero project into an ARC repository from asyncio code.
+
+    Wraps an ArcPacker and runs its blocking steps (omero gateway
+    calls, file copies, xlsx and metadata writing) in executor threads,
+    so that several packs can share one event loop. ARCCommander is
+    run with asyncio subprocesses.
+
+        packer = AsyncArcPacker(project, path, tmp_path, mapping, conn)
+        task = asyncio.create_task(packer.pack())
+        async for event in packer.progress():
+            print(event)
+        await task
+
+    Cancelling the pack task stops the pack at the next file, image or
+    ARCCommander command. Steps that are already running in an
+    executor thread are waited for, so that no thread writes into the
+    ARC once pack() has returned. Files that were not completely
+    written are not recorded in the manifest and are written again by
+    the next pack.
+    """
+
+    def __init__(
+        self,
+        ome_object,
+        destination_path,
+        tmp_path,
+        image_filenames_mapping,
+        conn,
+        executor=None,
+        **kwargs,
+    ):
+        """executor runs the blocking steps, the default executor of
+        the event loop if None. kwargs are passed to ArcPacker; the
+        assays are always exported one after the other, the image
+        files of an assay are copied with staging_workers concurrent
+        copies."""
+        kwargs["pipeline_queue_size"] = 0
+        self.packer = ArcPacker(
+            ome_object,
+            destination_path,
+            tmp_path,
+            image_filenames_mapping,
+            conn,
+            **kwargs,
+        )
+        self.executor = executor
+        self._cancelled = threading.Event()
+        self._events = None
+        self._loop = None
+        self.packer.progress.add_callback(self._publish)
+
+    @property
+    def instrumentation(self):
+        return self.packer.instrumentation
+
+    async def pack(self):
+        self._loop = asyncio.get_running_loop()
+        self._cancelled.clear()
+        try:
+            with self.instrumentation.span("pack"):
+                await self._pack()
+        finally:
+            # after the events that are still scheduled
+            self._loop.call_soon_threadsafe(self._queue().put_nowait, _END_OF_PACK)
+
+    async def progress(self):
+        """Yields the omero_arc.arc_progress.ProgressEvent of every
+        exported item until the pack has ended."""
+        queue = self._queue()
+        while True:
+            event = await queue.get()
+            if event is _END_OF_PACK:
+                return
+            yield event
+
+    def _queue(self):
+        if self._events is None:
+            self._events = asyncio.Queue()
+        return self._events
+
+    def _publish(self, event):
+        # called by the progress of the packer, also in executor threads
+        self._loop.call_soon_threadsafe(self._queue().put_nowait, event)
+
+    async def _blocking(self, function, *args):
+        """Runs function(*args) in the executor."""
+        future = self._loop.run_in_executor(self.executor, function, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._cancelled.set()
+            # a running thread cannot be interrupted, wait for it
+            await asyncio.wait([future])
+            if not future.cancelled():
+                future.exception()
+            raise
+
+    async def _pack(self):
+        packer = self.packer
+        create = packer._creates_arc_repo()
+
+        await self._blocking(packer.project_snapshot)
+
+        plan = await self._blocking(self._isa_command_plan, create)
+        if create:
+            os.makedirs(packer.path_to_arc_repo, exist_ok=False)
+        await self._run_isa_commands(plan, create)
+        await self._blocking(packer._record_isa_objects)
+
+        packer.progress.start(await self._blocking(packer._progress_totals))
+        try:
+            await self._add_assay_data()
+            await self._blocking(packer._write_checksums)
+        finally:
+            packer.progress.finish()
+
+    async def _add_assay_data(self):
+        packer = self.packer
+        fetcher = packer._open_metadata_fetcher()
+        try:
+            for assay_identifier in packer.assay_contexts:
+                await self._add_image_data_for_assay(assay_identifier)
+                await self._add_original_metadata_for_assay(assay_identifier)
+                await self._blocking(packer._add_isa_assay_sheet, assay_identifier)
+        finally:
+            # closing waits for the fetcher threads and their connections
+            await self._blocking(packer._close_metadata_fetcher, fetcher)
+
+    def _isa_command_plan(self, create):
+        packer = self.packer
+        with packer.batched_isa_commands(execute=False) as plan:
+            if create:
+                packer._create_investigation()
+            packer._create_study()
+            packer._create_assays()
+        return plan
+
+    async def _run_isa_commands(self, plan, create):
+        backend = self.packer.isa_backend
+        if not isinstance(backend, ArcCommanderBackend):
+            if create:
+                await self._blocking(backend.init_arc)
+            with self.instrumentation.span("isa commands"):
+                await self._blocking(plan.execute, backend)
+            return
+        if create:
+            await self._subprocess(["arc", "init"])
+        with self.instrumentation.span("isa commands"):
+            for command in plan.ordered_commands():
+                await self._subprocess(command)
+
+    async def _subprocess(self, command):
+        """Runs command in the ARC like AbstractIsaBackend._subprocess
+        without blocking the event loop."""
+        self.instrumentation.count(SUBPROCESSES)
+        with self.instrumentation.span(f"subprocess: {command[0]}"):
+            process = await asyncio.create_subprocess_exec(
+                *[str(arg) for arg in command],
+                cwd=self.packer.path_to_arc_repo,
+            )
+            try:
+                await process.wait()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+
+    async def _add_image_data_for_assay(self, assay_identifier):
+        packer = self.packer
+        files = await self._blocking(packer._image_files_to_stage, assay_identifier)
+        await self._blocking(packer._set_image_files_total, assay_identifier, files)
+        summary = StagingSummary()
+        start = time.perf_counter()
+        workers = asyncio.Semaphore(max(packer.file_stager.max_workers, 1))
+
+        async def _copy(src, dst, image):
+            async with workers:
+                with self.instrumentation.span("image copy"):
+                    sha256 = await self._blocking(
+                        packer.file_stager.stage_into, src, dst, summary
+                    )
+                await self._blocking(
+                    packer._image_file_staged,
+                    assay_identifier,
+                    src,
+                    dst,
+                    image,
+                    sha256,
+                )
+
+        copies = [asyncio.ensure_future(_copy(*file)) for file in files]
+        try:
+            await asyncio.gather(*copies)
+        except BaseException:
+            # stop the other copies before the error is raised
+            for copy in copies:
+                copy.cancel()
+            await asyncio.wait(copies)
+            raise
+        finally:
+            summary.seconds = time.perf_counter() - start
+            packer.staging_summary.update(summary)
+            await self._blocking(packer.manifest.save)
+
+    async def _add_original_metadata_for_assay(self, assay_identifier):
+        packer = self.packer
+        images = await self._blocking(
+            packer._images_without_metadata, assay_identifier
+        )
+        packer.progress.set_total("metadata", assay_identifier, len(images))
+        if len(images) == 0:
+            return
+
+        def _images():
+            for image in images:
+                if self._cancelled.is_set():
+                    raise PackCancelled()
+                yield image
+
+        try:
+            await self._blocking(
+                packer._write_original_metadata, assay_identifier, _images()
+            )
+        finally:
+            await self._blocking(packer.manifest.save)
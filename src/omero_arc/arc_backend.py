@@ -0,0 +1,544 @@
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+from pathlib import Path
+
+from omero_arc.arc_instrumentation import SUBPROCESSES, get_instrumentation
+from omero_arc.arc_xlsx import (
+    ASSAY_SECTIONS,
+    INVESTIGATION_SECTIONS,
+    IsaSheet,
+)
+
+
+INVESTIGATION_FILENAME = "isa.investigation.xlsx"
+INVESTIGATION_SHEET = "isa_investigation"
+STUDY_SHEET = "Study"
+ASSAY_SHEET = "Assay"
+
+
+def _person_options(prefix):
+    return {
+        "--lastname": f"{prefix}Last Name",
+        "--firstname": f"{prefix}First Name",
+        "--midinitials": f"{prefix}Mid Initials",
+        "--email": f"{prefix}Email",
+        "--phone": f"{prefix}Phone",
+        "--fax": f"{prefix}Fax",
+        "--address": f"{prefix}Address",
+        "--affiliation": f"{prefix}Affiliation",
+        "--orcid": "Comment[ORCID]",
+        "--roles": f"{prefix}Roles",
+        "--rolestermaccessionnumber": f"{prefix}Roles Term Accession Number",
+        "--rolestermsourceref": f"{prefix}Roles Term Source REF",
+    }
+
+
+def _publication_options(prefix):
+    return {
+        "--doi": f"{prefix}Publication DOI",
+        "--pubmedid": f"{prefix}Publication PubMed ID",
+        "--authorlist": f"{prefix}Publication Author List",
+        "--title": f"{prefix}Publication Title",
+        "--status": f"{prefix}Publication Status",
+        "--statustermaccessionnumber": (
+            f"{prefix}Publication Status Term Accession Number"
+        ),
+        "--statustermsourceref": f"{prefix}Publication Status Term Source REF",
+    }
+
+
+# Maps ARCCommander command options to the row labels that ARCCommander
+# writes. Keyed by the subcommand, each entry holds the affected section
+# and whether a new item is registered (append) or values are set.
+COMMAND_OPTIONS = {
+    ("investigation", "create"): (
+        "INVESTIGATION",
+        False,
+        {
+            "--identifier": "Investigation Identifier",
+            "--title": "Investigation Title",
+            "--description": "Investigation Description",
+            "--submissiondate": "Investigation Submission Date",
+            "--publicreleasedate": "Investigation Public Release Date",
+        },
+    ),
+    ("investigation", "publication", "register"): (
+        "INVESTIGATION PUBLICATIONS",
+        True,
+        _publication_options("Investigation "),
+    ),
+    ("investigation", "person", "register"): (
+        "INVESTIGATION CONTACTS",
+        True,
+        _person_options("Investigation Person "),
+    ),
+    ("study", "add"): (
+        "STUDY",
+        False,
+        {
+            "--identifier": "Study Identifier",
+            "--title": "Study Title",
+            "--description": "Study Description",
+            "--submissiondate": "Study Submission Date",
+            "--publicreleasedate": "Study Public Release Date",
+        },
+    ),
+    ("study", "publication", "register"): (
+        "STUDY PUBLICATIONS",
+        True,
+        _publication_options("Study "),
+    ),
+    ("study", "design", "register"): (
+        "STUDY DESIGN DESCRIPTORS",
+        True,
+        {
+            "--designtype": "Study Design Type",
+            "--typetermaccessionnumber": "Study Design Type Term Accession Number",
+            "--typetermsourceref": "Study Design Type Term Source REF",
+        },
+    ),
+    ("study", "factor", "register"): (
+        "STUDY FACTORS",
+        True,
+        {
+            "--name": "Study Factor Name",
+            "--factortype": "Study Factor Type",
+            "--typetermaccessionnumber": "Study Factor Type Term Accession Number",
+            "--typetermsourceref": "Study Factor Type Term Source REF",
+        },
+    ),
+    ("study", "protocol", "register"): (
+        "STUDY PROTOCOLS",
+        True,
+        {
+            "--name": "Study Protocol Name",
+            "--protocoltype": "Study Protocol Type",
+            "--typetermaccessionnumber": "Study Protocol Type Term Accession Number",
+            "--typetermsourceref": "Study Protocol Type Term Source REF",
+            "--description": "Study Protocol Description",
+            "--uri": "Study Protocol URI",
+            "--version": "Study Protocol Version",
+            "--parametersname": "Study Protocol Parameters Name",
+            "--parameterstermaccessionnumber": (
+                "Study Protocol Parameters Term Accession Number"
+            ),
+            "--parameterstermsourceref": (
+                "Study Protocol Parameters Term Source REF"
+            ),
+            "--componentsname": "Study Protocol Components Name",
+            "--componentstype": "Study Protocol Components Type",
+            "--componentstypetermaccessionnumber": (
+                "Study Protocol Components Type Term Accession Number"
+            ),
+            "--componentstypetermsourceref": (
+                "Study Protocol Components Type Term Source REF"
+            ),
+        },
+    ),
+    ("study", "person", "register"): (
+        "STUDY CONTACTS",
+        True,
+        _person_options("Study Person "),
+    ),
+    ("assay", "add"): (
+        "ASSAY",
+        False,
+        {
+            "--measurementtype": "Measurement Type",
+            # ARCCommander swaps term source ref and accession number,
+            # see https://github.com/nfdi4plants/ARCCommander/issues/232
+            "--measurementtypetermsourceref": (
+                "Measurement Type Term Accession Number"
+            ),
+            "--measurementtypetermaccessionnumber": (
+                "Measurement Type Term Source REF"
+            ),
+            "--technologytype": "Technology Type",
+            "--technologytypetermsourceref": (
+                "Technology Type Term Accession Number"
+            ),
+            "--technologytypetermaccessionnumber": (
+                "Technology Type Term Source REF"
+            ),
+            "--technologyplatform": "Technology Platform",
+        },
+    ),
+    ("assay", "person", "register"): (
+        "ASSAY PERFORMERS",
+        True,
+        _person_options(""),
+    ),
+}
+
+
+# The options that identify a registered item. ARCCommander update
+# commands change the item with the same key and register it if it is
+# missing.
+ITEM_KEYS = {
+    "INVESTIGATION PUBLICATIONS": ["--doi"],
+    "INVESTIGATION CONTACTS": ["--lastname", "--firstname", "--midinitials"],
+    "STUDY PUBLICATIONS": ["--doi"],
+    "STUDY DESIGN DESCRIPTORS": ["--designtype"],
+    "STUDY FACTORS": ["--name"],
+    "STUDY PROTOCOLS": ["--name"],
+    "STUDY CONTACTS": ["--lastname", "--firstname", "--midinitials"],
+    "ASSAY PERFORMERS": ["--lastname", "--firstname", "--midinitials"],
+}
+
+ADD_IF_MISSING = "--addifmissing"
+
+
+def _update_options():
+    options = {}
+    for subcommand, (section, append, option_labels) in COMMAND_OPTIONS.items():
+        if subcommand == ("investigation", "create"):
+            continue
+        options[subcommand[:-1] + ("update",)] = (section, append, option_labels)
+    return options
+
+
+COMMAND_OPTIONS.update(_update_options())
+
+
+# key: the labels that identify the item of an appending edit, None to
+# always register a new item. overwrite: whether an existing item with
+# the same key is updated (update commands) or left as it is (register
+# commands, which ARCCommander refuses for existing items).
+IsaEdit = namedtuple(
+    "IsaEdit",
+    [
+        "path",
+        "title",
+        "layout",
+        "study_identifier",
+        "section",
+        "values",
+        "append",
+        "key",
+        "overwrite",
+    ],
+    defaults=[None, True],
+)
+
+
+def parse_arccommander_command(command):
+    """Splits an ARCCommander command into its subcommand and options.
+
+    ["arc", "study", "add", "--identifier", "my-study"] ->
+    (("study", "add"), {"--identifier": "my-study"})
+    """
+    assert command[0] == "arc", f"not an ARCCommander command: {command}"
+    subcommand = []
+    i = 1
+    while i < len(command) and not str(command[i]).startswith("--"):
+        subcommand.append(command[i])
+        i += 1
+    options = {}
+    while i < len(command):
+        options[command[i]] = command[i + 1] if i + 1 < len(command) else None
+        i += 2
+    return tuple(subcommand), options
+
+
+def update_command(command):
+    """Returns the ARCCommander command that updates the object created
+    or registered by command, e.g.
+
+    ["arc", "study", "person", "register", ...] ->
+    ["arc", "study", "person", "update", ..., "--addifmissing"]
+    """
+    subcommand, options = parse_arccommander_command(command)
+    if subcommand[-1] not in ("add", "register"):
+        raise ValueError(f"cannot update with ARCCommander command: {command}")
+    update = ["arc", *subcommand[:-1], "update"]
+    for option, value in options.items():
+        update.extend([option, value])
+    if subcommand[-1] == "register":
+        update.append(ADD_IF_MISSING)
+    return update
+
+
+def command_workbooks(command):
+    """Returns the isa files (relative to the ARC root) that are changed
+    by an ARCCommander command. The first one is the primary target."""
+    subcommand, options = parse_arccommander_command(command)
+    if subcommand[0] == "investigation":
+        return [INVESTIGATION_FILENAME]
+    if subcommand[0] == "study":
+        study_identifier = options.get(
+            "--identifier"
+            if subcommand in (("study", "add"), ("study", "update"))
+            else "--studyidentifier"
+        )
+        return [f"studies/{study_identifier}/isa.study.xlsx", INVESTIGATION_FILENAME]
+    assay_workbook = f"assays/{options.get('--assayidentifier')}/isa.assay.xlsx"
+    if subcommand in (("assay", "add"), ("assay", "update")):
+        study_identifier = options.get("--studyidentifier")
+        return [
+            assay_workbook,
+            f"studies/{study_identifier}/isa.study.xlsx",
+            INVESTIGATION_FILENAME,
+        ]
+    return [assay_workbook]
+
+
+def command_folders(command):
+    """Returns the folders that ARCCommander creates for a command."""
+    subcommand, options = parse_arccommander_command(command)
+    if subcommand == ("study", "add"):
+        study_identifier = options["--identifier"]
+        return [
+            f"studies/{study_identifier}/resources",
+            f"studies/{study_identifier}/protocols",
+        ]
+    if subcommand == ("assay", "add"):
+        assay_identifier = options["--assayidentifier"]
+        return [
+            f"assays/{assay_identifier}/dataset",
+            f"assays/{assay_identifier}/protocols",
+        ]
+    return []
+
+
+class AbstractIsaBackend:
+    """Applies the ARCCommander commands generated by the isa mappers
+    to an ARC repository."""
+
+    def __init__(self, path_to_arc_repo: Path, instrumentation=None):
+        self.path_to_arc_repo = Path(path_to_arc_repo)
+        self.instrumentation = get_instrumentation(instrumentation)
+
+    def _subprocess(self, command):
+        self.instrumentation.count(SUBPROCESSES)
+        with self.instrumentation.span(f"subprocess: {command[0]}"):
+            subprocess.run(command, cwd=self.path_to_arc_repo)
+
+    def init_arc(self):
+        raise NotImplementedError
+
+    def run(self, command):
+        raise NotImplementedError
+
+    def run_all(self, commands):
+        for command in commands:
+            if len(command) > 0:
+                self.run(command)
+
+    def run_batch(self, commands):
+        """Runs a batch of commands. Backends that can apply
+        several commands at once override this."""
+        self.run_all(commands)
+
+    def estimated_cost(self, commands):
+        """Returns the number of spawned processes and workbook
+        load/save cycles needed to run commands."""
+        raise NotImplementedError
+
+
+class ArcCommanderBackend(AbstractIsaBackend):
+    """Runs every command as ARCCommander subprocess."""
+
+    def init_arc(self):
+        self._subprocess(["arc", "init"])
+
+    def run(self, command):
+        self._subprocess(command)
+
+    def estimated_cost(self, commands):
+        return {
+            "processes": len(commands),
+            "workbook_rewrites": sum(
+                len(command_workbooks(command)) for command in commands
+            ),
+        }
+
+
+class XlsxIsaBackend(AbstractIsaBackend):
+    """Writes the ISA files in-process with openpyxl.
+
+    Produces the same files and folders as ARCCommander without
+    spawning a process per command.
+    """
+
+    def init_arc(self):
+        for folder in [".arc", "assays", "studies", "workflows", "runs"]:
+            os.makedirs(self.path_to_arc_repo / folder, exist_ok=True)
+        if shutil.which("git") is not None:
+            self._subprocess(["git", "init", "--quiet"])
+
+    def run(self, command):
+        self.run_batch([command])
+
+    def run_batch(self, commands):
+        edits = []
+        for command in commands:
+            if len(command) > 0:
+                self._makedirs(*command_folders(command))
+                edits.extend(self.edits(command))
+        self.apply(edits)
+
+    def estimated_cost(self, commands):
+        workbooks = set()
+        for command in commands:
+            workbooks.update(command_workbooks(command))
+        return {"processes": 0, "workbook_rewrites": len(workbooks)}
+
+    def _investigation_edit(self, *args):
+        return IsaEdit(
+            self.path_to_arc_repo / INVESTIGATION_FILENAME,
+            INVESTIGATION_SHEET,
+            INVESTIGATION_SECTIONS,
+            *args,
+        )
+
+    def _study_edit(self, study_identifier, *args):
+        return IsaEdit(
+            self.path_to_arc_repo / f"studies/{study_identifier}/isa.study.xlsx",
+            STUDY_SHEET,
+            {},
+            study_identifier,
+            *args,
+        )
+
+    def _assay_edit(self, assay_identifier, *args):
+        return IsaEdit(
+            self.path_to_arc_repo / f"assays/{assay_identifier}/isa.assay.xlsx",
+            ASSAY_SHEET,
+            ASSAY_SECTIONS,
+            None,
+            *args,
+        )
+
+    def _makedirs(self, *folders):
+        for folder in folders:
+            path = self.path_to_arc_repo / folder
+            os.makedirs(path, exist_ok=True)
+            (path / ".gitkeep").touch()
+
+    def edits(self, command):
+        """Translates an ARCCommander command to a list of IsaEdit.
+        Does not touch the file system."""
+        subcommand, options = parse_arccommander_command(command)
+        if subcommand not in COMMAND_OPTIONS:
+            raise ValueError(f"unsupported ARCCommander command: {command}")
+        section, append, option_labels = COMMAND_OPTIONS[subcommand]
+        values = {
+            option_labels[option]: value
+            for option, value in options.items()
+            if option in option_labels
+        }
+        key = None
+        if append:
+            key = [option_labels[option] for option in ITEM_KEYS[section]]
+        overwrite = subcommand[-1] == "update"
+
+        if subcommand[0] == "investigation":
+            return [
+                self._investigation_edit(
+                    None, section, values, append, key, overwrite
+                )
+            ]
+
+        if subcommand[0] == "study":
+            if subcommand in (("study", "add"), ("study", "update")):
+                study_identifier = options["--identifier"]
+                values["Study File Name"] = f"{study_identifier}/isa.study.xlsx"
+            else:
+                study_identifier = options["--studyidentifier"]
+            return [
+                self._investigation_edit(
+                    study_identifier, section, values, append, key, overwrite
+                ),
+                self._study_edit(
+                    study_identifier, section, values, append, key, overwrite
+                ),
+            ]
+
+        assay_identifier = options["--assayidentifier"]
+        if subcommand[1] == "person":
+            return [
+                self._assay_edit(
+                    assay_identifier, section, values, append, key, overwrite
+                )
+            ]
+
+        study_identifier = options["--studyidentifier"]
+        study_assay_values = {
+            f"Study Assay {label}": value for label, value in values.items()
+        }
+        study_assay_values[
+            "Study Assay File Name"
+        ] = f"{assay_identifier}/isa.assay.xlsx"
+        study_assay_key = ["Study Assay File Name"]
+        return [
+            self._assay_edit(assay_identifier, section, values, append),
+            self._investigation_edit(
+                study_identifier,
+                "STUDY ASSAYS",
+                study_assay_values,
+                True,
+                study_assay_key,
+                overwrite,
+            ),
+            self._study_edit(
+                study_identifier,
+                "STUDY ASSAYS",
+                study_assay_values,
+                True,
+                study_assay_key,
+                overwrite,
+            ),
+        ]
+
+    def apply(self, edits):
+        """Applies edits with one load/save cycle per workbook."""
+        sheets = {}
+        for edit in edits:
+            if edit.path not in sheets:
+                sheet = None
+                if edit.path.exists():
+                    sheet = IsaSheet.load(edit.path, edit.title)
+                if sheet is None:
+                    sheet = IsaSheet.new(edit.title, edit.layout)
+                sheets[edit.path] = sheet
+            self._apply_edit(sheets[edit.path], edit)
+
+        with self.instrumentation.span("xlsx write"):
+            for path, sheet in sheets.items():
+                os.makedirs(path.parent, exist_ok=True)
+                sheet.save(path)
+
+    def _apply_edit(self, sheet, edit):
+        block = None
+        if edit.study_identifier is not None:
+            block = sheet.study_block(edit.study_identifier)
+            if block is None:
+                block = sheet.add_study_block()
+                sheet.section("STUDY", block).set(
+                    {"Study Identifier": edit.study_identifier}
+                )
+        section = sheet.section(edit.section, block)
+        if edit.key is not None:
+            key = {label: edit.values.get(label) for label in edit.key}
+            section.update(key, edit.values, overwrite=edit.overwrite)
+        elif edit.append:
+            section.append(edit.values)
+        else:
+            section.set(edit.values)
+
+
+ISA_BACKENDS = {
+    "xlsx": XlsxIsaBackend,
+    "arccommander": ArcCommanderBackend,
+}
+
+
+def create_isa_backend(name, path_to_arc_repo, instrumentation=None):
+    if name not in ISA_BACKENDS:
+        raise ValueError(
+            f"Unknown isa backend {name}. "
+            f"Choose one of {', '.join(ISA_BACKENDS)}."
+        )
+    return ISA_BACKENDS[name](path_to_arc_repo, instrumentation=instrumentation)
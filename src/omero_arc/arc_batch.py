@@ -0,0 +1,214 @@
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from omero_arc.arc_instrumentation import instrumentation_from_env
+from omero_arc.arc_metadata import OriginalMetadataFetcher
+from omero_arc.arc_packer import ArcPacker
+from omero_arc.arc_plan import IsaCommandPlan
+from omero_arc.arc_progress import ProgressBar
+from omero_arc.arc_staging import StagingSummary
+
+
+def projects_of_owner(conn, owner_id):
+    """Returns all projects owned by an experimenter."""
+    return list(conn.getObjects("Project", opts={"owner": owner_id}))
+
+
+def projects_of_group(conn, group_id):
+    """Returns all projects of a group. conn must be allowed to read
+    the group, e.g. with conn.SERVICE_OPTS.setOmeroGroup(-1)."""
+    return list(conn.getObjects("Project", opts={"group": group_id}))
+
+
+def pack_arc_batch(ome_objects,
+                   destination_path,
+                   tmp_path,
+                   image_filenames_mapping,
+                   conn,
+                   **kwargs):
+    """Packs several omero projects into one ARC, see ArcBatchPacker.
+
+    As for pack_arc, instrumentation is selected with the
+    OMERO_ARC_TRACE environment variable if it is not passed, and a
+    progress bar is drawn if stderr is a terminal.
+    """
+    instrumentation = kwargs.pop("instrumentation", None)
+    if instrumentation is None:
+        instrumentation = instrumentation_from_env()
+    progress_callback = kwargs.pop("progress_callback", None)
+    if progress_callback is None and sys.stderr.isatty():
+        progress_callback = ProgressBar()
+
+    packer = ArcBatchPacker(ome_objects,
+                            destination_path,
+                            tmp_path,
+                            image_filenames_mapping,
+                            conn,
+                            instrumentation=instrumentation,
+                            progress_callback=progress_callback,
+                            **kwargs)
+    try:
+        packer.pack()
+    finally:
+        if isinstance(progress_callback, ProgressBar):
+            print(packer.progress.summary())
+        if instrumentation.enabled:
+            print(instrumentation.summary())
+        instrumentation.close()
+
+
+class ArcBatchPacker:
+    def __init__(
+        self,
+        ome_objects,
+        destination_path: Path,
+        tmp_path,
+        image_filenames_mapping,
+        conn,
+        max_workers=4,
+        **kwargs,
+    ):
+        """Packs several omero projects into one ARC, one study per
+        project.
+
+        All projects are packed with one connection. The packers of the
+        projects share the isa backend, the manifest, the cache of
+        experimenters and the pool of connections that fetch original
+        metadata.
+
+        The packers also share one PackProgress (self.progress) with
+        the totals of all projects.
+
+        The isa commands of all projects (investigation, studies,
+        assays) are collected in one plan and written by a single
+        writer, so that the shared investigation file is written once.
+        Afterwards the data of all assays (image files, original
+        metadata, assay sheets) is exported concurrently with
+        max_workers threads. Each assay only writes to its own folder.
+
+        image_filenames_mapping must cover the images of all projects.
+        Further keyword arguments are passed to ArcPacker.
+        """
+        ome_objects = list(ome_objects)
+        assert len(ome_objects) > 0, "no projects to pack"
+        self.path_to_arc_repo = destination_path
+        self.conn = conn
+        self.max_workers = max_workers
+
+        self.packers = [
+            ArcPacker(
+                ome_object,
+                destination_path,
+                tmp_path,
+                image_filenames_mapping,
+                conn,
+                **kwargs,
+            )
+            for ome_object in ome_objects
+        ]
+        first = self.packers[0]
+        self.instrumentation = first.instrumentation
+        self.isa_backend = first.isa_backend
+        self.manifest = first.manifest
+        self.progress = first.progress
+        self.metadata_fetcher = OriginalMetadataFetcher(
+            conn,
+            max_workers=first.metadata_workers,
+            instrumentation=self.instrumentation,
+        )
+        for packer in self.packers[1:]:
+            packer.isa_backend = self.isa_backend
+            packer.manifest = self.manifest
+            packer.experimenters = first.experimenters
+            packer.global_metadata_digests = first.global_metadata_digests
+            packer.progress = self.progress
+
+    def pack(self):
+        # all packers write to the same ARC
+        new_arc = self.packers[0]._creates_arc_repo()
+
+        with self.instrumentation.span("pack batch"):
+            for packer in self.packers:
+                packer.project_snapshot()
+            self._create_isa_objects(new_arc)
+            self._add_assay_data()
+
+    def staging_summary(self):
+        summary = StagingSummary()
+        for packer in self.packers:
+            summary.update(packer.staging_summary)
+        return summary
+
+    def _create_isa_objects(self, new_arc):
+        plan = IsaCommandPlan()
+        for packer in self.packers:
+            packer.isa_command_plan = plan
+        try:
+            for packer in self.packers:
+                packer._create_study()
+                packer._create_assays()
+            self._check_identifiers()
+            if new_arc:
+                # the plan runs the investigation commands first
+                self.packers[0].initialize_arc_repo()
+        finally:
+            for packer in self.packers:
+                packer.isa_command_plan = None
+        with self.instrumentation.span("isa commands"):
+            plan.execute(self.isa_backend)
+
+        for packer in self.packers:
+            packer._record_isa_objects()
+
+    def _check_identifiers(self):
+        for kind, identifiers in [
+            (
+                "study",
+                [packer.study_mapper.study_identifier() for packer in self.packers],
+            ),
+            (
+                "assay",
+                [
+                    assay_identifier
+                    for packer in self.packers
+                    for assay_identifier in packer.assay_contexts
+                ],
+            ),
+        ]:
+            duplicates = [i for i, n in Counter(identifiers).items() if n > 1]
+            if len(duplicates) > 0:
+                raise ValueError(
+                    f"{kind} identifiers must be unique within an ARC: "
+                    f"{', '.join(duplicates)}"
+                )
+
+    def _add_assay_data(self):
+        tasks = [
+            (packer, assay_identifier)
+            for packer in self.packers
+            for assay_identifier in packer.assay_contexts
+        ]
+        totals = {}
+        for packer in self.packers:
+            totals.update(packer._progress_totals())
+        self.progress.start(totals)
+        for packer in self.packers:
+            packer.metadata_fetcher = self.metadata_fetcher
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(packer._add_data_for_assay, assay_identifier)
+                    for packer, assay_identifier in tasks
+                ]
+                # raise exceptions of workers
+                for future in futures:
+                    future.result()
+            for packer in self.packers:
+                packer._write_checksums()
+        finally:
+            for packer in self.packers:
+                packer.metadata_fetcher = None
+            self.metadata_fetcher.close()
+            self.progress.finish()
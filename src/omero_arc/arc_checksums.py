@@ -0,0 +1,136 @@
+"""Checksum index of the files exported to the assays of an ARC.
+
+Every assay folder holds a checksums.sha256 file in the format of
+sha256sum with the paths relative to the assay folder, so that
+
+    cd assays/my-assay && sha256sum -c checksums.sha256
+
+checks an assay without omero-arc (git-lfs pointer files must be
+checked out first). Verify a whole ARC with
+
+    python -m omero_arc.arc_checksums path/to/arc_repo
+"""
+import hashlib
+import os
+import sys
+from collections import namedtuple
+from pathlib import Path, PurePosixPath
+
+from omero_arc.arc_git_stores import lfs_object_path, read_lfs_pointer
+
+CHECKSUMS_FILENAME = "checksums.sha256"
+
+# actual is None if the file is missing
+ChecksumMismatch = namedtuple("ChecksumMismatch", ["path", "expected", "actual"])
+
+
+def sha256_file(path, chunk_size=8 * 2**20, hasher=None):
+    """Returns the sha256 of the file at path. If hasher is given, it
+    is updated with the content of the file instead."""
+    h = hashlib.sha256() if hasher is None else hasher
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_checksum_index(path):
+    """Returns a dict relative path -> sha256 of a checksums.sha256
+    file, an empty dict if it does not exist."""
+    checksums = {}
+    if not os.path.exists(path):
+        return checksums
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if len(line) == 0:
+                continue
+            sha256, relpath = line.split(" ", 1)
+            # "*" marks binary mode in sha256sum files
+            checksums[relpath[1:]] = sha256
+    return checksums
+
+
+def write_checksum_index(path, checksums):
+    """Writes a dict relative path -> sha256 atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        for relpath in sorted(checksums):
+            f.write(f"{checksums[relpath]}  {relpath}\n")
+    os.replace(tmp_path, path)
+
+
+def assay_checksums(manifest):
+    """Returns a dict assay identifier -> dict relative path -> sha256
+    of the files recorded in the manifest, relative to the assay
+    folder."""
+    checksums = {}
+    for relpath, entry in manifest.data["files"].items():
+        parts = PurePosixPath(relpath).parts
+        if len(parts) < 3 or parts[0] != "assays" or entry.get("sha256") is None:
+            continue
+        checksums.setdefault(parts[1], {})[
+            str(PurePosixPath(*parts[2:]))
+        ] = entry["sha256"]
+    return checksums
+
+
+def write_assay_checksums(path_to_arc_repo, manifest, assay_identifiers):
+    """Writes the checksum indexes of assays from the checksums that
+    have been recorded in the manifest while the files were exported.
+    No exported file is read."""
+    checksums = assay_checksums(manifest)
+    for assay_identifier in assay_identifiers:
+        folder = Path(path_to_arc_repo) / f"assays/{assay_identifier}"
+        os.makedirs(folder, exist_ok=True)
+        write_checksum_index(
+            folder / CHECKSUMS_FILENAME, checksums.get(assay_identifier, {})
+        )
+
+
+def verify_checksums(folder, lfs_objects=None):
+    """Checks the files listed in the checksums.sha256 file of folder and
+    returns a ChecksumMismatch for every missing or changed file.
+
+    For git-lfs pointer files, the object in the lfs_objects folder is
+    checked."""
+    folder = Path(folder)
+    mismatches = []
+    checksums = read_checksum_index(folder / CHECKSUMS_FILENAME)
+    for relpath, expected in checksums.items():
+        path = folder / relpath
+        if lfs_objects is not None and path.exists():
+            oid = read_lfs_pointer(path)
+            if oid is not None:
+                path = lfs_object_path(lfs_objects, oid)
+        actual = sha256_file(path) if path.exists() else None
+        if actual != expected:
+            mismatches.append(ChecksumMismatch(path, expected, actual))
+    return mismatches
+
+
+def verify_arc(path_to_arc_repo):
+    """Checks the checksum indexes of all assays of an ARC, see
+    verify_checksums."""
+    mismatches = []
+    lfs_objects = Path(path_to_arc_repo) / ".git/lfs/objects"
+    index_paths = Path(path_to_arc_repo).glob(f"assays/*/{CHECKSUMS_FILENAME}")
+    for index_path in sorted(index_paths):
+        mismatches.extend(verify_checksums(index_path.parent, lfs_objects))
+    return mismatches
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python -m omero_arc.arc_checksums path/to/arc_repo")
+        return 2
+    mismatches = verify_arc(argv[0])
+    for mismatch in mismatches:
+        state = "MISSING" if mismatch.actual is None else "FAILED"
+        print(f"{mismatch.path}: {state}")
+    return 1 if len(mismatches) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import threading
+
+from omero_arc.arc_instrumentation import get_instrumentation
+
+CACHE_HITS = "experimenter cache hits"
+CACHE_MISSES = "experimenter cache misses"
+
+
+def owner_id(ome_object):
+    return ome_object.getDetails().getOwner().getId()
+
+
+class ExperimenterCache:
+    """Experimenters (owners of omero objects) by id.
+
+    One cache is shared by all mappers of a pack, so that the contact
+    defaults of projects and datasets of the same owner are filled
+    from one experimenter object. Fill the cache with prefetch at the
+    start of a pack to load all owners with one query. Hits and misses
+    are counted with instrumentation.
+    """
+
+    def __init__(self, instrumentation=None):
+        self.instrumentation = get_instrumentation(instrumentation)
+        self._experimenters = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._experimenters)
+
+    def prefetch(self, conn, ome_objects):
+        """Loads the owners of ome_objects that are not cached yet."""
+        missing = {owner_id(ome_object) for ome_object in ome_objects}
+        missing -= set(self._experimenters)
+        if len(missing) == 0:
+            return
+        self.instrumentation.server_call("getObjects")
+        experimenters = conn.getObjects("Experimenter", sorted(missing))
+        with self._lock:
+            for experimenter in experimenters:
+                self._experimenters[experimenter.getId()] = experimenter
+
+    def owner(self, ome_object):
+        """Returns the owner of ome_object."""
+        experimenter_id = owner_id(ome_object)
+        experimenter = self._experimenters.get(experimenter_id)
+        if experimenter is not None:
+            self.instrumentation.count(CACHE_HITS)
+            return experimenter
+        self.instrumentation.count(CACHE_MISSES)
+        experimenter = ome_object.getOwner()
+        with self._lock:
+            self._experimenters[experimenter_id] = experimenter
+        return experimenter
@@ -0,0 +1,209 @@
+"""Staging of image files directly into the object store of git-lfs or
+git-annex.
+
+Committing a large file to an ARC normally reads it three times: when
+it is copied into the ARC, when git lfs (or git annex) hashes it and
+when it is copied into the object store. A GitObjectStore lets the
+FileStager put the data into the object store in the same pass that
+computes its sha256 and only writes a reference to the ARC:
+
+* lfs: a pointer file, the data goes to .git/lfs/objects.
+* annex: a symlink, the data goes to .git/annex/objects.
+"""
+import hashlib
+import os
+import struct
+import threading
+import uuid
+from pathlib import Path
+
+STAGING_MODES = ("files", "lfs", "annex")
+
+# environment variable to select the staging mode, e.g. for
+# omero transfer pack
+STAGING_MODE_ENV_VARIABLE = "OMERO_ARC_STAGING_MODE"
+
+LFS_POINTER_VERSION = "https://git-lfs.github.com/spec/v1"
+LFS_ATTRIBUTES = "filter=lfs diff=lfs merge=lfs -text"
+
+# larger files are never lfs pointers
+_MAX_POINTER_SIZE = 1024
+
+# .gitattributes may be appended by the stores of several packers
+_ATTRIBUTES_LOCK = threading.Lock()
+
+
+def lfs_pointer(sha256, size):
+    return f"version {LFS_POINTER_VERSION}\noid sha256:{sha256}\nsize {size}\n"
+
+
+def read_lfs_pointer(path):
+    """Returns the sha256 of the object an lfs pointer file refers to,
+    None if path is no pointer file."""
+    if os.path.islink(path) or os.path.getsize(path) > _MAX_POINTER_SIZE:
+        return None
+    with open(path, "rb") as f:
+        lines = f.read().decode(errors="replace").splitlines()
+    if len(lines) < 3 or lines[0] != f"version {LFS_POINTER_VERSION}":
+        return None
+    if not lines[1].startswith("oid sha256:"):
+        return None
+    return lines[1][len("oid sha256:"):]
+
+
+def lfs_object_path(lfs_objects, sha256):
+    return Path(lfs_objects) / sha256[0:2] / sha256[2:4] / sha256
+
+
+def annex_key(sha256, size, filename, max_extensions=2, max_extension_length=4):
+    """Returns the SHA256E key of git-annex for a file. Like git-annex,
+    up to max_extensions alphanumeric extensions of the filename are
+    kept."""
+    extensions = []
+    parts = filename.split(".")[1:]
+    while len(parts) > 0 and len(extensions) < max_extensions:
+        extension = parts.pop()
+        if not (extension.isalnum() and len(extension) <= max_extension_length):
+            break
+        extensions.insert(0, extension)
+    suffix = "".join(f".{extension}" for extension in extensions)
+    return f"SHA256E-s{size}--{sha256}{suffix}"
+
+
+def annex_hash_dirs(key):
+    """Returns the two level hash directory of git-annex (hashdirmixed)
+    for a key, e.g. "pX/ZJ"."""
+    chars = "0123456789zqjxkmvwgpfZQJXKMVWGPF"
+    (word,) = struct.unpack("<I", hashlib.md5(key.encode()).digest()[:4])
+    cs = [chars[(word >> (6 * i)) & 31] for i in range(4)]
+    return f"{cs[1]}{cs[0]}/{cs[3]}{cs[2]}"
+
+
+class GitObjectStore:
+    """Moves staged files into the object store of a git repository and
+    replaces them with references in the working tree.
+
+    The store is located when the first file is staged, so that it can
+    be created for a repository that does not exist yet.
+    """
+
+    tmp_folder = None
+
+    def __init__(self, path_to_repo):
+        self.path_to_repo = Path(path_to_repo)
+
+    @property
+    def git_dir(self):
+        git_dir = self.path_to_repo / ".git"
+        if not git_dir.is_dir():
+            raise ValueError(
+                f"{self.path_to_repo} is not a git repository. "
+                "Staging into git objects needs an initialized repository."
+            )
+        return git_dir
+
+    def tmp_path(self):
+        """Returns a new path to stage a file to before it is added."""
+        folder = self.git_dir / self.tmp_folder
+        os.makedirs(folder, exist_ok=True)
+        return folder / f"omero-arc-{uuid.uuid4().hex}"
+
+    def add(self, tmp_path, dst, sha256):
+        """Moves the file at tmp_path with the given sha256 into the store
+        and creates the reference dst."""
+        raise NotImplementedError
+
+    def _move_object(self, tmp_path, object_path):
+        # identical content is stored once
+        if object_path.exists():
+            os.remove(tmp_path)
+            return False
+        os.makedirs(object_path.parent, exist_ok=True)
+        os.replace(tmp_path, object_path)
+        return True
+
+
+class GitLfsStore(GitObjectStore):
+    """Stores files in .git/lfs/objects and writes lfs pointer files.
+
+    The folders of the pointer files are tracked with lfs in
+    .gitattributes, so that git add keeps the pointers as they are.
+    """
+
+    tmp_folder = "lfs/tmp"
+
+    def __init__(self, path_to_repo):
+        super().__init__(path_to_repo)
+        self._tracked = set()
+
+    def add(self, tmp_path, dst, sha256):
+        size = os.path.getsize(tmp_path)
+        self._move_object(
+            tmp_path, lfs_object_path(self.git_dir / "lfs/objects", sha256)
+        )
+        if os.path.lexists(dst):
+            os.remove(dst)
+        with open(dst, "w") as f:
+            f.write(lfs_pointer(sha256, size))
+        self._track(Path(dst).parent)
+
+    def _track(self, folder):
+        pattern = Path(folder).relative_to(self.path_to_repo).as_posix() + "/**"
+        if pattern in self._tracked:
+            return
+        line = f"{pattern} {LFS_ATTRIBUTES}"
+        path = self.path_to_repo / ".gitattributes"
+        with _ATTRIBUTES_LOCK:
+            text = path.read_text() if path.exists() else ""
+            if line not in text.splitlines():
+                with open(path, "a") as f:
+                    if len(text) > 0 and not text.endswith("\n"):
+                        f.write("\n")
+                    f.write(line + "\n")
+        self._tracked.add(pattern)
+
+
+class GitAnnexStore(GitObjectStore):
+    """Stores files in .git/annex/objects under their SHA256E key and
+    replaces them with symlinks, like git annex add.
+
+    git-annex records the content in its location log with
+    git annex fsck --fast, which does not read the files.
+    """
+
+    tmp_folder = "annex/tmp"
+
+    def add(self, tmp_path, dst, sha256):
+        size = os.path.getsize(tmp_path)
+        key = annex_key(sha256, size, Path(dst).name)
+        object_path = (
+            self.git_dir / "annex/objects" / annex_hash_dirs(key) / key / key
+        )
+        if self._move_object(tmp_path, object_path):
+            # a hardlinked object shares its permissions with the source
+            if os.stat(object_path).st_nlink == 1:
+                os.chmod(object_path, 0o444)
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.symlink(os.path.relpath(object_path, Path(dst).parent), dst)
+
+
+_STORES = {
+    "lfs": GitLfsStore,
+    "annex": GitAnnexStore,
+}
+
+
+def create_git_store(staging_mode, path_to_repo):
+    """Returns the GitObjectStore of a staging mode, None for "files".
+    If staging_mode is None, it is read from OMERO_ARC_STAGING_MODE."""
+    if staging_mode is None:
+        staging_mode = os.environ.get(STAGING_MODE_ENV_VARIABLE) or "files"
+    if staging_mode not in STAGING_MODES:
+        raise ValueError(
+            f"Unknown staging mode {staging_mode}. "
+            f"Choose one of {', '.join(STAGING_MODES)}."
+        )
+    if staging_mode == "files":
+        return None
+    return _STORES[staging_mode](path_to_repo)
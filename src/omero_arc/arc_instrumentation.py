@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+
+# environment variable to enable instrumentation of pack_arc:
+# "summary" prints a summary table, any other value is the path
+# of a json lines file to write all events to
+TRACE_ENV_VARIABLE = "OMERO_ARC_TRACE"
+
+SERVER_CALLS = "server calls"
+BYTES_COPIED = "bytes copied"
+FILES_COPIED = "files copied"
+SUBPROCESSES = "subprocesses"
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+    """Receives the spans and counters of a pack.
+
+    The base class ignores everything, so that instrumentation hooks
+    cost one method call when instrumentation is disabled. Subclasses
+    override span and count.
+
+    * span(name): context manager around a unit of work, e.g. a
+        packing stage or a subprocess.
+    * count(name, value): adds value to a counter, e.g. server calls
+        or bytes copied.
+    """
+
+    enabled = False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def count(self, name, value=1):
+        pass
+
+    def server_call(self, method):
+        self.count(f"{SERVER_CALLS}: {method}")
+
+    def summary(self):
+        return ""
+
+    def close(self):
+        pass
+
+
+NULL_INSTRUMENTATION = Instrumentation()
+
+
+def get_instrumentation(instrumentation=None):
+    if instrumentation is None:
+        return NULL_INSTRUMENTATION
+    return instrumentation
+
+
+class _Span:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._perf_start
+        self.instrumentation._end_span(self.name, self.start, seconds)
+        return False
+
+
+class RecordingInstrumentation(Instrumentation):
+    """Sums up calls and seconds per span name and the values of all
+    counters. Safe to use from several threads."""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def _end_span(self, name, start, seconds):
+        with self._lock:
+            calls, total = self.spans.get(name, (0, 0.0))
+            self.spans[name] = (calls + 1, total + seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        lines = [f"{'span':<40}{'calls':>8}{'seconds':>12}"]
+        for name, (calls, seconds) in self.spans.items():
+            lines.append(f"{name:<40}{calls:>8}{seconds:>12.3f}")
+        lines.append("")
+        lines.append(f"{'counter':<40}{'value':>20}")
+        for name in sorted(self.counters):
+            lines.append(f"{name:<40}{self.counters[name]:>20}")
+        return "\n".join(lines)
+
+
+class JsonLinesInstrumentation(RecordingInstrumentation):
+    """Records like RecordingInstrumentation and writes every span and
+    counter update as one json object per line to path."""
+
+    def __init__(self, path):
+        super().__init__()
+        self._file = open(path, "a")
+
+    def _emit(self, event):
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _end_span(self, name, start, seconds):
+        super()._end_span(name, start, seconds)
+        self._emit(
+            {
+                "event": "span",
+                "name": name,
+                "start": start,
+                "seconds": seconds,
+                "thread": threading.current_thread().name,
+            }
+        )
+
+    def count(self, name, value=1):
+        super().count(name, value)
+        self._emit(
+            {"event": "count", "name": name, "value": value, "time": time.time()}
+        )
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def instrumentation_from_env():
+    """Creates the instrumentation selected with OMERO_ARC_TRACE."""
+    value = os.environ.get(TRACE_ENV_VARIABLE)
+    if not value:
+        return NULL_INSTRUMENTATION
+    if value == "summary":
+        return RecordingInstrumentation()
+    return JsonLinesInstrumentation(value)
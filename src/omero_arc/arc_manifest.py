@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from omero_arc.arc_checksums import sha256_file
+
+MANIFEST_FILENAME = ".arc/omero_arc_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def commands_digest(commands):
+    return hashlib.sha256(
+        json.dumps([[str(arg) for arg in c] for c in commands]).encode()
+    ).hexdigest()
+
+
+def update_timestamp(ome_object):
+    """Returns the time of the last update of an omero object as string."""
+    return ome_object.updateEventDate().isoformat()
+
+
+class ArcManifest:
+    """Records what has been exported from OMERO to an ARC.
+
+    The manifest is stored in .arc/ of the ARC and holds the studies and
+    assays created for omero projects and datasets, and for every
+    exported file the omero object it was created from, the update
+    timestamp of that object, the file size and its checksum. Packing
+    into an ARC with a manifest skips all files that are up to date.
+
+    A manifest can be shared by packers running in several threads.
+    A manifest written by another version is ignored.
+    """
+
+    def __init__(self, path_to_arc_repo: Path):
+        self.path = Path(path_to_arc_repo) / MANIFEST_FILENAME
+        self._lock = threading.RLock()
+        self.data = {
+            "version": MANIFEST_VERSION,
+            "studies": {},
+            "assays": {},
+            "files": {},
+            "sheets": {},
+        }
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            # a manifest of another version is not trusted, all files
+            # are exported again
+            if data.get("version") == MANIFEST_VERSION:
+                self.data.update(data)
+
+    def save(self):
+        """Writes the manifest atomically."""
+        os.makedirs(self.path.parent, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def _isa_object(self, kind, ome_object):
+        return self.data[kind].get(f"{ome_object.OMERO_CLASS}:{ome_object.getId()}")
+
+    def _record_isa_object(self, kind, ome_object, identifier, commands):
+        # the digest of the commands that have been applied
+        with self._lock:
+            self.data[kind][f"{ome_object.OMERO_CLASS}:{ome_object.getId()}"] = {
+                "identifier": identifier,
+                "commands": commands_digest(commands),
+            }
+
+    def isa_object_status(self, kind, ome_object, identifier, commands):
+        """Returns the status of the study (kind="studies") or assay
+        (kind="assays") of ome_object in the ARC:
+
+        * "new": it has not been created yet (or under another
+          identifier).
+        * "changed": it has been created from other ISA metadata.
+        * "current": it is up to date.
+        """
+        entry = self._isa_object(kind, ome_object)
+        if entry is None or entry["identifier"] != identifier:
+            return "new"
+        if entry["commands"] != commands_digest(commands):
+            return "changed"
+        return "current"
+
+    def record_study(self, ome_project, identifier, commands):
+        self._record_isa_object("studies", ome_project, identifier, commands)
+
+    def record_assay(self, ome_dataset, identifier, commands):
+        self._record_isa_object("assays", ome_dataset, identifier, commands)
+
+    def is_file_current(self, relpath, ome_object, path_to_arc_repo, fingerprint=None):
+        """Returns True if the file at relpath has been exported from the
+        current version of ome_object and is unchanged on disk.
+
+        Files exported from several objects (e.g. the original metadata
+        of all images of a dataset in one file) are recorded with a
+        fingerprint of these objects, which must match as well.
+        """
+        entry = self.data["files"].get(str(relpath))
+        if entry is None:
+            return False
+        if entry.get("fingerprint") != fingerprint:
+            return False
+        if entry["object"] != f"{ome_object.OMERO_CLASS}:{ome_object.getId()}":
+            return False
+        if entry["updated"] != update_timestamp(ome_object):
+            return False
+        path = Path(path_to_arc_repo) / relpath
+        return path.exists() and path.stat().st_size == entry["size"]
+
+    def is_file_recorded(self, relpath):
+        with self._lock:
+            return str(relpath) in self.data["files"]
+
+    def changed_files(self, prefix, path_to_arc_repo):
+        """Returns the relative paths of the recorded files starting with
+        prefix that are missing or changed in size on disk."""
+        with self._lock:
+            entries = [
+                (relpath, entry)
+                for relpath, entry in self.data["files"].items()
+                if relpath.startswith(str(prefix))
+            ]
+        changed = []
+        for relpath, entry in entries:
+            path = Path(path_to_arc_repo) / relpath
+            if not path.exists() or path.stat().st_size != entry["size"]:
+                changed.append(relpath)
+        return changed
+
+    def record_file(
+        self, relpath, ome_object, path_to_arc_repo, sha256=None, fingerprint=None
+    ):
+        """Records an exported file. Pass the sha256 if it is known, e.g.
+        from staging, otherwise the file is read to compute it."""
+        path = Path(path_to_arc_repo) / relpath
+        if sha256 is None:
+            sha256 = sha256_file(path)
+        entry = {
+            "object": f"{ome_object.OMERO_CLASS}:{ome_object.getId()}",
+            "updated": update_timestamp(ome_object),
+            "size": path.stat().st_size,
+            "sha256": sha256,
+        }
+        if fingerprint is not None:
+            entry["fingerprint"] = fingerprint
+        with self._lock:
+            self.data["files"][str(relpath)] = entry
+
+    def dataset_fingerprint(self, ome_dataset, images):
+        """Returns a digest of the update timestamps of a dataset and
+        its images, e.g. for files that hold data of all images."""
+        return hashlib.sha256(
+            json.dumps(
+                [update_timestamp(ome_dataset)]
+                + [[image.getId(), update_timestamp(image)] for image in images]
+            ).encode()
+        ).hexdigest()
+
+    def are_sheets_current(self, assay_identifier, fingerprint):
+        return self.data["sheets"].get(assay_identifier) == fingerprint
+
+    def record_sheets(self, assay_identifier, fingerprint):
+        with self._lock:
+            self.data["sheets"][assay_identifier] = fingerprint
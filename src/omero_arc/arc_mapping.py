@@ -1,581 +1,346 @@
-import importlib
-from copy import deepcopy
-from functools import lru_cache
-
-if importlib.util.find_spec("pandas"):
-    import pandas as pd
-else:
-    raise ImportError(
-        "Could not import pandas library. Make sure to "
-        "install omero-cli-transfer with the optional "
-        "[arc] addition"
-    )
+from collections import defaultdict
+
+from omero_arc.arc_instrumentation import get_instrumentation
+from omero_arc.arc_mapping_schema import isa_mapping
+from omero_arc.arc_model import IsaBlock, IsaTable
+from omero_arc.arc_pixels import PixelsTable, load_pixels
+
+
+class AnnotationStore:
+    """Annotations of an omero object, indexed by namespace."""
+
+    def __init__(self, annotations):
+        self._by_namespace = defaultdict(list)
+        for annotation in annotations:
+            self._by_namespace[annotation.getNs()].append(annotation)
+
+    @classmethod
+    def for_object(cls, ome_object, snapshot=None, instrumentation=None):
+        """Creates the store from the annotations of a ProjectSnapshot
+        (bulk loaded) or queries the annotations of ome_object."""
+        if snapshot is not None:
+            return cls(snapshot.annotations(ome_object))
+        get_instrumentation(instrumentation).server_call("listAnnotations")
+        return cls(ome_object.listAnnotations())
+
+    def annotations(self, namespace):
+        return self._by_namespace.get(namespace, [])
+
+    def annotation_data(self, namespace):
+        return [dict(a.getValue()) for a in self.annotations(namespace)]
 
 
 class AbstractIsaMapper:
-    @lru_cache
-    def _all_annotatation_objects(self):
-        return [a for a in self.obj.listAnnotations()]
+    """Maps data of an omero object to isa attributes of an ARC.
+
+    The mapping of each value is defined in
+    omero_arc.arc_mapping_schema. Values are stored in Omero as mapped
+    annotations linked to the omero object. If no mapped annotation is
+    found for an annotation type, default values are bound to the
+    omero object (e.g. the name of its owner).
+
+    If a ProjectSnapshot is given, annotations are read from the
+    snapshot instead of being queried from the server. Owners are read
+    from experimenters (an ExperimenterCache), if given.
+
+    Server calls are counted with instrumentation (see
+    omero_arc.arc_instrumentation).
+    """
+
+    # key of the mapper in omero_arc.arc_mapping_schema.ISA_MAPPING
+    mapping_kind = None
+
+    def __init__(
+        self, ome_object, snapshot=None, instrumentation=None, experimenters=None
+    ):
+        self.obj = ome_object
+        self.snapshot = snapshot
+        self.instrumentation = get_instrumentation(instrumentation)
+        self.experimenters = experimenters
+        self.isa_mapping = isa_mapping()[self.mapping_kind]
+        self._owner = None
+        self._create_isa_attributes()
+
+    def owner(self):
+        if self._owner is None:
+            if self.experimenters is not None:
+                self._owner = self.experimenters.owner(self.obj)
+            else:
+                self._owner = self.obj.getOwner()
+        return self._owner
+
+    def annotation_store(self):
+        # created per mapper instance and released with it
+        if getattr(self, "_annotation_store", None) is None:
+            self._annotation_store = AnnotationStore.for_object(
+                self.obj, self.snapshot, self.instrumentation
+            )
+        return self._annotation_store
 
     def _annotation_data(self, annotation_type):
-        namespace = self.isa_attribute_config[annotation_type]["namespace"]
-        annotation_data = []
-        for annotation in self._all_annotatation_objects():
-            if annotation.getNs() == namespace:
-                annotation_data.append(dict(annotation.getValue()))
-        return annotation_data
+        for spec in self.isa_mapping:
+            if spec.annotation_type == annotation_type:
+                return self.annotation_store().annotation_data(spec.namespace)
+        raise KeyError(annotation_type)
 
     def arccommander_commands(self):
         cmds = []
-        for annotation_type in self.isa_attributes:
-            isa_attributes = deepcopy(self.isa_attributes[annotation_type])
-
-            for d in isa_attributes["values"]:
-                cmd = isa_attributes.get("command", []).copy()
-                for key in d:
-                    command_options = isa_attributes["command_options"]
-                    command_option = command_options.get(key, None)
-                    if command_option is not None:
-                        value = d[key]
-                        cmd.append(command_option)
-                        cmd.append(value)
-                cmds.append(cmd)
+        for block in self.isa_attributes.values():
+            cmds.extend(block.arccommander_commands())
         return cmds
 
     def _create_isa_attributes(self):
-        isa_attributes = {}
-        for annotation_type in self.isa_attribute_config:
-            annotation_data = self._annotation_data(annotation_type)
-            config = self.isa_attribute_config[annotation_type]
-
-            isa_attributes[annotation_type] = {}
+        """Builds self.isa_attributes: annotation type -> IsaBlock."""
+        self.isa_attributes = {}
+        for spec in self.isa_mapping:
+            annotation_data = self.annotation_store().annotation_data(spec.namespace)
 
-            if annotation_type == "metadata":
+            if spec.annotation_type == "metadata":
                 assert (
                     len(annotation_data) <= 1
-                ), f"only one annotation allowed for {config['namespace']}"
-                command = config.get("command", [])
-
-            command = []
-            for arg in config.get("command", []):
-                if callable(arg):
-                    arg = arg()
-                command.append(arg)
-
-            isa_attributes[annotation_type]["values"] = []
-            isa_attributes[annotation_type]["command"] = command
-            isa_attributes[annotation_type]["command_options"] = config[
-                "command_options"
-            ]
+                ), f"only one annotation allowed for {spec.namespace}"
+
+            command = spec.bind_command(self)
+
+            values = []
             values_to_set = {}
             if len(annotation_data) == 0:
                 # set defaults if no annotations available
-                for key in config["default_values"]:
-                    value = config["default_values"][key]
-                    if value is not None:
-                        values_to_set[key] = value
+                for key, value in spec.default_values(self):
+                    values_to_set[key] = value
                 if len(values_to_set) > 0:
-                    isa_attributes[annotation_type]["values"].append(values_to_set)
+                    values.append(spec.item_type.from_labels(values_to_set))
             else:
                 # set annotation value if key is
-                # registered in config["default_values"]
+                # registered in the default values
                 for annotation in annotation_data:
-                    for key in config["default_values"]:
+                    for key in spec.keys:
                         value = annotation.get(key, None)
                         if value is not None:
                             values_to_set[key] = value
                     if len(values_to_set) > 0:
-                        isa_attributes[annotation_type]["values"].append(
-                            values_to_set.copy()
-                        )
-            if len(isa_attributes[annotation_type]["values"]) == 0:
-                del isa_attributes[annotation_type]
-
-            self.isa_attributes = isa_attributes
+                        values.append(spec.item_type.from_labels(values_to_set))
+            if len(values) > 0:
+                self.isa_attributes[spec.annotation_type] = IsaBlock(
+                    command, spec.fields, values
+                )
 
 
 class AbstractIsaAssaySheetMapper:
-    def __init__(self, ome_dataset):
+    """Maps the images of an omero dataset to the rows of an assay
+    sheet. Subclasses define the sheet_name, the columns and
+    isa_column_values, which returns the values of one image in column
+    order."""
+
+    def __init__(self, ome_dataset, snapshot=None, instrumentation=None):
         self.ome_dataset = ome_dataset
+        self.snapshot = snapshot
+        self.instrumentation = get_instrumentation(instrumentation)
 
-    def tbl(self, conn):
+    def _objs(self, conn):
+        if self.snapshot is not None:
+            return self.snapshot.images(self.ome_dataset.getId())
+        self.instrumentation.server_call("getObjects")
         objs = conn.getObjects(
             self.obj_type, opts={"dataset": self.ome_dataset.getId()}
         )
-        objs = [obj for obj in objs]
-
-        rows = [self.isa_column_mapping(obj) for obj in objs]
-        df = pd.DataFrame(rows)
-        df.name = self.sheet_name
-        return df
+        return [obj for obj in objs]
+
+    def isa_column_mapping(self, obj):
+        """Returns one dict (column -> value) for obj."""
+        return dict(zip(self.columns, self.isa_column_values(obj)))
+
+    def rows(self, conn, objs=None):
+        """Yields one dict (column -> value) per object. objs are the
+        images of the dataset, if already known."""
+        if objs is None:
+            objs = self._objs(conn)
+        for obj in objs:
+            yield self.isa_column_mapping(obj)
+
+    def table(self, conn, objs=None):
+        """Returns the sheet as IsaTable with one row per object."""
+        if objs is None:
+            objs = self._objs(conn)
+        table = IsaTable(self.sheet_name, self.columns)
+        for obj in objs:
+            table.append(self.isa_column_values(obj))
+        return table
+
+    def tbl(self, conn, table=None):
+        """Returns the sheet as pandas DataFrame."""
+        if table is None:
+            table = self.table(conn)
+        return table.to_pandas()
 
 
 class IsaInvestigationMapper(AbstractIsaMapper):
-    def __init__(self, ome_project):
-        """Maps data of an omero project to isa investigation attributes of
-        an ARC.
-
-        The mapping of each value is defined in isa_attribute_config.
-        Values are stored in Omero
-        as mapped annotations linked to the omero project.
-
-        * namespace: Mapped annotations are be identified by their
-            namespace. Only annotations that match the specified
-            namespace are assigned to the respective ARC key-values.
-        * default_values: Defines all keys that can be transfered
-           from the mapped annotation to the ARC and defines default values,
-           if the value is not set in a mapped annotation.
-        * command: ARCs are manipulated with the ARCCommander CLI.
-           command defines the ARCommander command that is executed to write
-            the data from the mapped annotation to the ARC repository.
-
-
-
-        """
-        self.obj = ome_project
-        owner = ome_project.getOwner()  # used to set default values below
-        # annotation
-        self.isa_attribute_config = {
-            "investigation": {
-                "namespace": "ARC:ISA:INVESTIGATION:INVESTIGATION",
-                "default_values": {
-                    "Investigation Identifier": "default-investigation-id",
-                    "Investigation Title": None,
-                    "Investigation Description": None,
-                    "Investigation Submission Date": None,
-                    "Investigation Public Release Date": None,
-                },
-                "command": ["arc", "investigation", "create"],
-                "command_options": {
-                    "Investigation Identifier": "--identifier",
-                    "Investigation Title": "--title",
-                    "Investigation Description": "--description",
-                    "Investigation Submission Date": "--submissiondate",
-                    "Investigation Public Release Date": "--publicreleasedate",
-                },
-            },
-            "publications": {
-                "namespace": ("ARC:ISA:INVESTIGATION:INVESTIGATION PUBLICATIONS"),
-                "default_values": {
-                    "Investigation Publication DOI": None,
-                    "Investigation Publication PubMed ID": None,
-                    "Investigation Publication Author List": None,
-                    "Investigation Publication Title": None,
-                    "Investigation Publication Status": None,
-                    ("Investigation Publication Status " "Term Accession Number"): None,
-                    "Investigation Publication Status Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "investigation",
-                    "publication",
-                    "register",
-                ],
-                "command_options": {
-                    "Investigation Publication DOI": "--doi",
-                    "Investigation Publication PubMed ID": "--pubmedid",
-                    "Investigation Publication Author List": "--authorlist",
-                    "Investigation Publication Title": "--title",
-                    "Investigation Publication Status": "--status",
-                    (
-                        "Investigation Publication Status " "Term Accession Number"
-                    ): "--statustermaccessionnumber",
-                    (
-                        "Investigation Publication Status " "Term Source REF"
-                    ): "--statustermsourceref",
-                },
-            },
-            "contacts": {
-                "namespace": "ARC:ISA:INVESTIGATION:INVESTIGATION CONTACTS",
-                "default_values": {
-                    "Investigation Person Last Name": owner.getLastName(),
-                    "Investigation Person First Name": owner.getFirstName(),
-                    "Investigation Person Email": owner.getEmail(),
-                    "Investigation Person Phone": None,
-                    "Investigation Person Fax": None,
-                    "Investigation Person Address": None,
-                    "Investigation Person Affiliation": None,
-                    "Investigation Person orcid": None,
-                    "Investigation Person Roles": None,
-                    "Investigation Person Roles Term Accession Number": None,
-                    "Investigation Person Roles Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "investigation",
-                    "person",
-                    "register",
-                ],
-                "command_options": {
-                    "Investigation Person Last Name": "--lastname",
-                    "Investigation Person First Name": "--firstname",
-                    "Investigation Person Mid Initials": "--midinitials",
-                    "Investigation Person Email": "--email",
-                    "Investigation Person Phone": "--phone",
-                    "Investigation Person Fax": "--fax",
-                    "Investigation Person Address": "--address",
-                    "Investigation Person Affiliation": "--affiliation",
-                    "Investigation Person orcid": "--orcid",
-                    "Investigation Person Roles": "--roles",
-                    (
-                        "Investigation Person Roles " "Term Accession Number"
-                    ): "--rolestermaccessionnumber",
-                    (
-                        "Investigation Person Roles " "Term Source REF"
-                    ): "--rolestermsourceref",
-                },
-            },
-        }
+    mapping_kind = "investigation"
 
-        self._create_isa_attributes()
+    def __init__(
+        self, ome_project, snapshot=None, instrumentation=None, experimenters=None
+    ):
+        """Maps data of an omero project to isa investigation attributes of
+        an ARC."""
+        super().__init__(
+            ome_project,
+            snapshot=snapshot,
+            instrumentation=instrumentation,
+            experimenters=experimenters,
+        )
 
 
 class IsaStudyMapper(AbstractIsaMapper):
-    def study_identifier(self):
-        return self.isa_attributes["metadata"]["values"][0]["Study Identifier"]
-
-    def __init__(self, ome_project):
-        self.obj = ome_project
-        owner = ome_project.getOwner()
-        # annotation
-        self.isa_attribute_config = {
-            "metadata": {
-                "namespace": "ARC:ISA:STUDY:STUDY",
-                "default_values": {
-                    "Study Identifier": ome_project.getName().lower().replace(" ", "-"),
-                    "Study Title": ome_project.getName(),
-                    "Study Description": ome_project.getDescription(),
-                    "Study Submission Date": None,
-                    "Study Public Release Date": None,
-                },
-                "command": ["arc", "study", "add"],
-                "command_options": {
-                    "Study Identifier": "--identifier",
-                    "Study Title": "--title",
-                    "Study Description": "--description",
-                    "Study Submission Date": "--submissiondate",
-                    "Study Public Release Date": "--publicreleasedate",
-                },
-            },
-            "publications": {
-                "namespace": "ARC:ISA:STUDY:STUDY PUBLICATIONS",
-                "default_values": {
-                    "Study Publication DOI": None,
-                    "Study Publication PubMed ID": None,
-                    "Study Publication Author List": None,
-                    "Study Publication Title": None,
-                    "Study Publication Status": None,
-                    "Study Publication Status Term Accession Number": None,
-                    "Study Publication Status Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "study",
-                    "publication",
-                    "register",
-                    "--studyidentifier",
-                    self.study_identifier,
-                ],
-                "command_options": {
-                    "Study Publication DOI": "--doi",
-                    "Study Publication PubMed ID": "--pubmedid",
-                    "Study Publication Author List": "--authorlist",
-                    "Study Publication Title": "--title",
-                    "Study Publication Status": "--status",
-                    "Study Publication Status Term Accession Number": (
-                        "--statustermaccessionnumber"
-                    ),
-                    "Study Publication Status Term Source REF": (
-                        "--statustermsourceref"
-                    ),
-                },
-            },
-            "design": {
-                "namespace": "ARC:ISA:STUDY:STUDY DESIGN DESCRIPTORS",
-                "default_values": {
-                    "Study Design Type": None,
-                    "Study Design Type Term Accession Number": None,
-                    "Study Design Type Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "study",
-                    "design",
-                    "register",
-                    "--studyidentifier",
-                    self.study_identifier,
-                ],
-                "command_options": {
-                    "Study Design Type": "--designtype",
-                    "Study Design Type Term Accession Number": (
-                        "--typetermaccessionnumber"
-                    ),
-                    "Study Design Type Term Source REF": "--typetermsourceref",
-                },
-            },
-            "factors": {
-                "namespace": "ARC:ISA:STUDY:STUDY FACTORS",
-                "default_values": {
-                    "Study Factor Name": None,
-                    "Study Factor Type": None,
-                    "Study Factor Type Term Accession Number": None,
-                    "Study Factor Type Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "study",
-                    "factor",
-                    "register",
-                    "--studyidentifier",
-                    self.study_identifier,
-                ],
-                "command_options": {
-                    "Study Factor Name": "--name",
-                    "Study Factor Type": "--factortype",
-                    "Study Factor Type Term Accession Number": (
-                        "--typetermaccessionnumber"
-                    ),
-                    "Study Factor Type Term Source REF": "--typetermsourceref",
-                },
-            },
-            "protocols": {
-                "namespace": "ARC:ISA:STUDY:STUDY PROTOCOLS",
-                "default_values": {
-                    "Study Protocol Name": None,
-                    "Study Protocol Type": None,
-                    "Study Protocol Type Term Accession Number": None,
-                    "Study Protocol Type Term Source REF": None,
-                    "Study Protocol Description": None,
-                    "Study Protocol URI": None,
-                    "Study Protocol Version": None,
-                    "Study Protocol Parameters Name": None,
-                    "Study Protocol Parameters Term Accession Number": None,
-                    "Study Protocol Parameters Term Source REF": None,
-                    "Study Protocol Components Name": None,
-                    "Study Protocol Components Type": None,
-                    ("Study Protocol Components " "Type Term Accession Number"): None,
-                    "Study Protocol Components Type Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "study",
-                    "protocol",
-                    "register",
-                    "--studyidentifier",
-                    self.study_identifier,
-                ],
-                "command_options": {
-                    "Study Protocol Name": "--name",
-                    "Study Protocol Type": "--protocoltype",
-                    "Study Protocol Type Term Accession Number": (
-                        "--typetermaccessionnumber"
-                    ),
-                    "Study Protocol Type Term Source REF": ("--typetermsourceref"),
-                    "Study Protocol Description": "--description",
-                    "Study Protocol URI": "--uri",
-                    "Study Protocol Version": "--version",
-                    "Study Protocol Parameters Name": "--parametersname",
-                    "Study Protocol Parameters Term Accession Number": (
-                        "--parameterstermaccessionnumber"
-                    ),
-                    "Study Protocol Parameters Term Source REF": (
-                        "--parameterstermsourceref"
-                    ),
-                    "Study Protocol Components Name": "--componentsname",
-                    "Study Protocol Components Type": "--componentstype",
-                    "Study Protocol Components Type Term Accession Number": (
-                        "--componentstypetermaccessionnumber"
-                    ),
-                    "Study Protocol Components Type Term Source REF": (
-                        "--componentstypetermsourceref"
-                    ),
-                },
-            },
-            "contacts": {
-                "namespace": "ARC:ISA:STUDY:STUDY CONTACTS",
-                "default_values": {
-                    "Study Person Last Name": owner.getLastName(),
-                    "Study Person First Name": owner.getFirstName(),
-                    "Study Person Email": owner.getEmail(),
-                    "Study Person Phone": None,
-                    "Study Person Fax": None,
-                    "Study Person Address": None,
-                    "Study Person Affiliation": None,
-                    "Study Person orcid": None,
-                    "Study Person Roles": None,
-                    "Study Person Roles Term Accession Number": None,
-                    "Study Person Roles Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "study",
-                    "person",
-                    "register",
-                    "--studyidentifier",
-                    self.study_identifier,
-                ],
-                "command_options": {
-                    "Study Person Last Name": "--lastname",
-                    "Study Person First Name": "--firstname",
-                    "Study Person Mid Initials": "--midinitials",
-                    "Study Person Email": "--email",
-                    "Study Person Phone": "--phone",
-                    "Study Person Fax": "--fax",
-                    "Study Person Address": "--address",
-                    "Study Person Affiliation": "--affiliation",
-                    "Study Person orcid": "--orcid",
-                    "Study Person Roles": "--roles",
-                    "Study Person Roles Term Accession Number": (
-                        "--rolestermaccessionnumber"
-                    ),
-                    "Study Person Roles Term Source REF": ("--rolestermsourceref"),
-                },
-            },
-        }
+    mapping_kind = "study"
 
-        self._create_isa_attributes()
+    def study_identifier(self):
+        return self.isa_attributes["metadata"].values[0].identifier
+
+    def __init__(
+        self, ome_project, snapshot=None, instrumentation=None, experimenters=None
+    ):
+        """Maps data of an omero project to isa study attributes of an
+        ARC."""
+        super().__init__(
+            ome_project,
+            snapshot=snapshot,
+            instrumentation=instrumentation,
+            experimenters=experimenters,
+        )
 
 
 class IsaAssayMapper(AbstractIsaMapper):
+    mapping_kind = "assay"
+
     def assay_identifier(self):
-        return self.isa_attributes["metadata"]["values"][0]["Assay Identifier"]
+        return self.isa_attributes["metadata"].values[0].identifier
 
     def study_identifier(self):
-        return self.isa_attributes["metadata"]["values"][0]["Study Identifier"]
-
-    def __init__(self, ome_dataset, study_identifier, image_filename_getter):
+        return self._study_identifier
+
+    def __init__(
+        self,
+        ome_dataset,
+        study_identifier,
+        image_filename_getter,
+        snapshot=None,
+        instrumentation=None,
+        experimenters=None,
+    ):
+        """Maps data of an omero dataset to isa assay attributes of an
+        ARC and the images of the dataset to assay sheets."""
         self.image_filename_getter = image_filename_getter
+        self._study_identifier = study_identifier
+        super().__init__(
+            ome_dataset,
+            snapshot=snapshot,
+            instrumentation=instrumentation,
+            experimenters=experimenters,
+        )
 
-        self.obj = ome_dataset
-        owner = ome_dataset.getOwner()
-
-        self.isa_attribute_config = {
-            "metadata": {
-                "namespace": "ARC:ISA:ASSAY:ASSAY",
-                "default_values": {
-                    "Assay Identifier": ome_dataset.getName().lower().replace(" ", "-"),
-                    "Measurement Type": None,
-                    "Measurement Type Term Accession Number": None,
-                    "Measurement Type Term Source REF": None,
-                    "Technology Type": None,
-                    "Technology Type Term Accession Number": None,
-                    "Technology Type Term Source Ref": None,
-                    "Technolology Platform": None,
-                },
-                "command": [
-                    "arc",
-                    "assay",
-                    "add",
-                    "--studyidentifier",
-                    study_identifier,
-                ],
-                "command_options": {
-                    "Assay Identifier": "--assayidentifier",
-                    "Measurement Type": "--measurementtype",
-                    # mixed up on purpose to deal with arc commander bug
-                    # https://github.com/nfdi4plants/ARCCommander/issues/232
-                    "Measurement Type Term Accession Number": (
-                        "--measurementtypetermsourceref"
-                    ),
-                    "Measurement Type Term Source REF": (
-                        "--measurementtypetermaccessionnumber"
-                    ),
-                    "Technology Type": "--technologytype",
-                    # mixed up on purpose to deal with arc commander bug
-                    "Technology Type Term Accession Number": (
-                        "--technologytypetermsourceref"
-                    ),
-                    "Technology Type Term Source Ref": (
-                        "--technologytypetermaccessionnumber"
-                    ),
-                    "Technolology Platform": "--technologyplatform",
-                },
-            },
-            "contacts": {
-                "namespace": "ARC:ISA:ASSAY:ASSAY PERFORMERS",
-                "default_values": {
-                    "Last Name": owner.getLastName(),
-                    "First Name": owner.getFirstName(),
-                    "Email": owner.getEmail(),
-                    "Phone": None,
-                    "Fax": None,
-                    "Address": None,
-                    "Affiliation": None,
-                    "orcid": None,
-                    "Roles": None,
-                    "Roles Term Accession Number": None,
-                    "Roles Term Source REF": None,
-                },
-                "command": [
-                    "arc",
-                    "assay",
-                    "person",
-                    "register",
-                    "--assayidentifier",
-                    self.assay_identifier,
-                ],
-                "command_options": {
-                    "Last Name": "--lastname",
-                    "First Name": "--firstname",
-                    "Mid Initials": "--midinitials",
-                    "Email": "--email",
-                    "Phone": "--phone",
-                    "Fax": "--fax",
-                    "Address": "--address",
-                    "Affiliation": "--affiliation",
-                    "orcid": "--orcid",
-                    "Roles": "--roles",
-                    "Roles " "Term Accession Number": "--rolestermaccessionnumber",
-                    "Roles " "Term Source REF": "--rolestermsourceref",
-                },
-            },
-        }
-        self._create_isa_attributes()
         self.isa_sheets = [
-            IsaAssaySheetImageFilesMapper(ome_dataset, self.image_filename_getter),
-            IsaAssaySheetImageMetadataMapper(ome_dataset),
+            IsaAssaySheetImageFilesMapper(
+                ome_dataset,
+                self.image_filename_getter,
+                snapshot=snapshot,
+                instrumentation=instrumentation,
+            ),
+            IsaAssaySheetImageMetadataMapper(
+                ome_dataset, snapshot=snapshot, instrumentation=instrumentation
+            ),
         ]
 
 
 class IsaAssaySheetImageFilesMapper(AbstractIsaAssaySheetMapper):
-    def __init__(self, ome_dataset, image_filename_getter):
+    columns = ("Image ID", "Name", "Description", "Filename")
+
+    def __init__(
+        self,
+        ome_dataset,
+        image_filename_getter,
+        snapshot=None,
+        instrumentation=None,
+    ):
         self.obj_type = "Image"
         self.sheet_name = "Image Files"
         self.image_filename_getter = image_filename_getter
 
-        super().__init__(ome_dataset)
+        super().__init__(
+            ome_dataset, snapshot=snapshot, instrumentation=instrumentation
+        )
 
-    def isa_column_mapping(self, image):
-        isa_column_mapping = {
-            "Image ID": image.getId(),
-            "Name": image.getName(),
-            "Description": image.getDescription(),
-            "Filename": self.image_filename_getter(image.getId(), abspath=False).name,
-        }
-        return isa_column_mapping
+    def isa_column_values(self, image):
+        return (
+            image.getId(),
+            image.getName(),
+            image.getDescription(),
+            self.image_filename_getter(image.getId(), abspath=False).name,
+        )
 
 
 class IsaAssaySheetImageMetadataMapper(AbstractIsaAssaySheetMapper):
-    def __init__(self, ome_dataset):
+    columns = (
+        "Image ID",
+        "Image Size X",
+        "Image Size Y",
+        "Image Size Z",
+        "Pixel Size X",
+        "Pixel Size Y",
+        "Pixel Size Z",
+        "Pixel Size Unit",
+        "Image Size C",
+        "Image Size T",
+        "Pixel Type",
+    )
+
+    # PixelsTable column of every sheet column after "Image ID"
+    pixels_columns = (
+        "size_x",
+        "size_y",
+        "size_z",
+        "physical_size_x",
+        "physical_size_y",
+        "physical_size_z",
+        "unit",
+        "size_c",
+        "size_t",
+        "pixel_type",
+    )
+
+    def __init__(self, ome_dataset, snapshot=None, instrumentation=None):
         self.obj_type = "Image"
         self.sheet_name = "Image Metadata"
-        super().__init__(ome_dataset)
-
-    def isa_column_mapping(self, image):
-        def _pixel_unit(image):
-            pix = image.getPixelSizeX(units=True)
-            if pix is None:
-                return
-            return pix.getUnit()
-
-        isa_column_mapping = {
-            "Image ID": image.getId(),
-            "Image Size X": image.getSizeX(),
-            "Image Size Y": image.getSizeY(),
-            "Image Size Z": image.getSizeZ(),
-            "Pixel Size X": image.getPixelSizeX(),
-            "Pixel Size Y": image.getPixelSizeY(),
-            "Pixel Size Z": image.getPixelSizeZ(),
-            "Pixel Size Unit": _pixel_unit(image),
-        }
-        return isa_column_mapping
+        super().__init__(
+            ome_dataset, snapshot=snapshot, instrumentation=instrumentation
+        )
+
+    def _pixels(self, conn):
+        dataset_id = self.ome_dataset.getId()
+        if self.snapshot is not None:
+            return self.snapshot.pixels(dataset_id)
+        return load_pixels(conn, [dataset_id], instrumentation=self.instrumentation)[
+            dataset_id
+        ]
+
+    def table(self, conn, objs=None):
+        """Returns the sheet as IsaTable. Its columns are taken from the
+        columns of one PixelsTable instead of the image wrappers."""
+        if objs is None:
+            objs = self._objs(conn)
+        pixels = self._pixels(conn)
+        missing = [obj for obj in objs if obj.getId() not in pixels]
+        if len(missing) > 0:
+            pixels = PixelsTable.concat([pixels, PixelsTable.from_images(missing)])
+        image_ids = [obj.getId() for obj in objs]
+        return IsaTable(
+            self.sheet_name,
+            self.columns,
+            [image_ids]
+            + [pixels.column(name, image_ids) for name in self.pixels_columns],
+        )
+
+    def isa_column_values(self, image):
+        pixels = PixelsTable.from_images([image])
+        return (image.getId(),) + tuple(
+            pixels.column(name, [image.getId()])[0] for name in self.pixels_columns
+        )
@@ -0,0 +1,534 @@
+"""Mapping of omero map annotations to ISA attributes of an ARC.
+
+ISA_MAPPING defines for each mapper ("investigation", "study",
+"assay") and each annotation type:
+
+* namespace: Mapped annotations are identified by their namespace.
+    Only annotations that match the namespace are assigned to the
+    respective ARC key-values.
+* item_type: class of omero_arc.arc_model that holds the values. Its
+    LABELS map the keys to the fields of the item.
+* default_values: Defines all keys that can be transfered from the
+    mapped annotation to the ARC and the default values, if no
+    mapped annotation exists.
+* command: the ARCCommander command that writes the values to the
+    ARC repository.
+* command_options: ISA key -> ARCCommander option.
+
+Values of the form "{placeholder}" in default_values and command are
+bound to the mapped omero object when they are needed
+(see PLACEHOLDERS).
+
+Sites can supply their own mapping as json file with the same
+structure in the OMERO_ARC_MAPPING environment variable. Entries of
+the file replace the respective keys of an annotation type, new
+annotation types are added.
+
+The mapping is compiled once per process and shared by all mappers.
+"""
+
+import json
+import os
+import re
+
+from omero_arc import arc_model
+
+MAPPING_ENV_VARIABLE = "OMERO_ARC_MAPPING"
+
+_PLACEHOLDER = re.compile(r"^\{(\w+)\}$")
+
+
+def fmt_identifier(title: str) -> str:
+    return title.lower().replace(" ", "-")
+
+
+PLACEHOLDERS = {
+    "name": lambda mapper: mapper.obj.getName(),
+    "identifier": lambda mapper: fmt_identifier(mapper.obj.getName()),
+    "description": lambda mapper: mapper.obj.getDescription(),
+    "owner_last_name": lambda mapper: mapper.owner().getLastName(),
+    "owner_first_name": lambda mapper: mapper.owner().getFirstName(),
+    "owner_email": lambda mapper: mapper.owner().getEmail(),
+    "study_identifier": lambda mapper: mapper.study_identifier(),
+    "assay_identifier": lambda mapper: mapper.assay_identifier(),
+}
+
+ISA_MAPPING = {
+    "investigation": {
+        "investigation": {
+            "namespace": "ARC:ISA:INVESTIGATION:INVESTIGATION",
+            "item_type": "Investigation",
+            "default_values": {
+                "Investigation Identifier": "default-investigation-id",
+                "Investigation Title": None,
+                "Investigation Description": None,
+                "Investigation Submission Date": None,
+                "Investigation Public Release Date": None,
+            },
+            "command": [
+                "arc",
+                "investigation",
+                "create",
+            ],
+            "command_options": {
+                "Investigation Identifier": "--identifier",
+                "Investigation Title": "--title",
+                "Investigation Description": "--description",
+                "Investigation Submission Date": "--submissiondate",
+                "Investigation Public Release Date": "--publicreleasedate",
+            },
+        },
+        "publications": {
+            "namespace": "ARC:ISA:INVESTIGATION:INVESTIGATION PUBLICATIONS",
+            "item_type": "Publication",
+            "default_values": {
+                "Investigation Publication DOI": None,
+                "Investigation Publication PubMed ID": None,
+                "Investigation Publication Author List": None,
+                "Investigation Publication Title": None,
+                "Investigation Publication Status": None,
+                "Investigation Publication Status Term Accession Number": None,
+                "Investigation Publication Status Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "investigation",
+                "publication",
+                "register",
+            ],
+            "command_options": {
+                "Investigation Publication DOI": "--doi",
+                "Investigation Publication PubMed ID": "--pubmedid",
+                "Investigation Publication Author List": "--authorlist",
+                "Investigation Publication Title": "--title",
+                "Investigation Publication Status": "--status",
+                "Investigation Publication Status Term Accession Number": (
+                    "--statustermaccessionnumber"
+                ),
+                "Investigation Publication Status Term Source REF": (
+                    "--statustermsourceref"
+                ),
+            },
+        },
+        "contacts": {
+            "namespace": "ARC:ISA:INVESTIGATION:INVESTIGATION CONTACTS",
+            "item_type": "Person",
+            "default_values": {
+                "Investigation Person Last Name": "{owner_last_name}",
+                "Investigation Person First Name": "{owner_first_name}",
+                "Investigation Person Email": "{owner_email}",
+                "Investigation Person Phone": None,
+                "Investigation Person Fax": None,
+                "Investigation Person Address": None,
+                "Investigation Person Affiliation": None,
+                "Investigation Person orcid": None,
+                "Investigation Person Roles": None,
+                "Investigation Person Roles Term Accession Number": None,
+                "Investigation Person Roles Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "investigation",
+                "person",
+                "register",
+            ],
+            "command_options": {
+                "Investigation Person Last Name": "--lastname",
+                "Investigation Person First Name": "--firstname",
+                "Investigation Person Mid Initials": "--midinitials",
+                "Investigation Person Email": "--email",
+                "Investigation Person Phone": "--phone",
+                "Investigation Person Fax": "--fax",
+                "Investigation Person Address": "--address",
+                "Investigation Person Affiliation": "--affiliation",
+                "Investigation Person orcid": "--orcid",
+                "Investigation Person Roles": "--roles",
+                "Investigation Person Roles Term Accession Number": (
+                    "--rolestermaccessionnumber"
+                ),
+                "Investigation Person Roles Term Source REF": "--rolestermsourceref",
+            },
+        },
+    },
+    "study": {
+        "metadata": {
+            "namespace": "ARC:ISA:STUDY:STUDY",
+            "item_type": "Study",
+            "default_values": {
+                "Study Identifier": "{identifier}",
+                "Study Title": "{name}",
+                "Study Description": "{description}",
+                "Study Submission Date": None,
+                "Study Public Release Date": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "add",
+            ],
+            "command_options": {
+                "Study Identifier": "--identifier",
+                "Study Title": "--title",
+                "Study Description": "--description",
+                "Study Submission Date": "--submissiondate",
+                "Study Public Release Date": "--publicreleasedate",
+            },
+        },
+        "publications": {
+            "namespace": "ARC:ISA:STUDY:STUDY PUBLICATIONS",
+            "item_type": "Publication",
+            "default_values": {
+                "Study Publication DOI": None,
+                "Study Publication PubMed ID": None,
+                "Study Publication Author List": None,
+                "Study Publication Title": None,
+                "Study Publication Status": None,
+                "Study Publication Status Term Accession Number": None,
+                "Study Publication Status Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "publication",
+                "register",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Study Publication DOI": "--doi",
+                "Study Publication PubMed ID": "--pubmedid",
+                "Study Publication Author List": "--authorlist",
+                "Study Publication Title": "--title",
+                "Study Publication Status": "--status",
+                "Study Publication Status Term Accession Number": (
+                    "--statustermaccessionnumber"
+                ),
+                "Study Publication Status Term Source REF": "--statustermsourceref",
+            },
+        },
+        "design": {
+            "namespace": "ARC:ISA:STUDY:STUDY DESIGN DESCRIPTORS",
+            "item_type": "DesignDescriptor",
+            "default_values": {
+                "Study Design Type": None,
+                "Study Design Type Term Accession Number": None,
+                "Study Design Type Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "design",
+                "register",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Study Design Type": "--designtype",
+                "Study Design Type Term Accession Number": "--typetermaccessionnumber",
+                "Study Design Type Term Source REF": "--typetermsourceref",
+            },
+        },
+        "factors": {
+            "namespace": "ARC:ISA:STUDY:STUDY FACTORS",
+            "item_type": "Factor",
+            "default_values": {
+                "Study Factor Name": None,
+                "Study Factor Type": None,
+                "Study Factor Type Term Accession Number": None,
+                "Study Factor Type Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "factor",
+                "register",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Study Factor Name": "--name",
+                "Study Factor Type": "--factortype",
+                "Study Factor Type Term Accession Number": "--typetermaccessionnumber",
+                "Study Factor Type Term Source REF": "--typetermsourceref",
+            },
+        },
+        "protocols": {
+            "namespace": "ARC:ISA:STUDY:STUDY PROTOCOLS",
+            "item_type": "Protocol",
+            "default_values": {
+                "Study Protocol Name": None,
+                "Study Protocol Type": None,
+                "Study Protocol Type Term Accession Number": None,
+                "Study Protocol Type Term Source REF": None,
+                "Study Protocol Description": None,
+                "Study Protocol URI": None,
+                "Study Protocol Version": None,
+                "Study Protocol Parameters Name": None,
+                "Study Protocol Parameters Term Accession Number": None,
+                "Study Protocol Parameters Term Source REF": None,
+                "Study Protocol Components Name": None,
+                "Study Protocol Components Type": None,
+                "Study Protocol Components Type Term Accession Number": None,
+                "Study Protocol Components Type Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "protocol",
+                "register",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Study Protocol Name": "--name",
+                "Study Protocol Type": "--protocoltype",
+                "Study Protocol Type Term Accession Number": (
+                    "--typetermaccessionnumber"
+                ),
+                "Study Protocol Type Term Source REF": "--typetermsourceref",
+                "Study Protocol Description": "--description",
+                "Study Protocol URI": "--uri",
+                "Study Protocol Version": "--version",
+                "Study Protocol Parameters Name": "--parametersname",
+                "Study Protocol Parameters Term Accession Number": (
+                    "--parameterstermaccessionnumber"
+                ),
+                "Study Protocol Parameters Term Source REF": (
+                    "--parameterstermsourceref"
+                ),
+                "Study Protocol Components Name": "--componentsname",
+                "Study Protocol Components Type": "--componentstype",
+                "Study Protocol Components Type Term Accession Number": (
+                    "--componentstypetermaccessionnumber"
+                ),
+                "Study Protocol Components Type Term Source REF": (
+                    "--componentstypetermsourceref"
+                ),
+            },
+        },
+        "contacts": {
+            "namespace": "ARC:ISA:STUDY:STUDY CONTACTS",
+            "item_type": "Person",
+            "default_values": {
+                "Study Person Last Name": "{owner_last_name}",
+                "Study Person First Name": "{owner_first_name}",
+                "Study Person Email": "{owner_email}",
+                "Study Person Phone": None,
+                "Study Person Fax": None,
+                "Study Person Address": None,
+                "Study Person Affiliation": None,
+                "Study Person orcid": None,
+                "Study Person Roles": None,
+                "Study Person Roles Term Accession Number": None,
+                "Study Person Roles Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "study",
+                "person",
+                "register",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Study Person Last Name": "--lastname",
+                "Study Person First Name": "--firstname",
+                "Study Person Mid Initials": "--midinitials",
+                "Study Person Email": "--email",
+                "Study Person Phone": "--phone",
+                "Study Person Fax": "--fax",
+                "Study Person Address": "--address",
+                "Study Person Affiliation": "--affiliation",
+                "Study Person orcid": "--orcid",
+                "Study Person Roles": "--roles",
+                "Study Person Roles Term Accession Number": (
+                    "--rolestermaccessionnumber"
+                ),
+                "Study Person Roles Term Source REF": "--rolestermsourceref",
+            },
+        },
+    },
+    "assay": {
+        "metadata": {
+            "namespace": "ARC:ISA:ASSAY:ASSAY",
+            "item_type": "Assay",
+            "default_values": {
+                "Assay Identifier": "{identifier}",
+                "Measurement Type": None,
+                "Measurement Type Term Accession Number": None,
+                "Measurement Type Term Source REF": None,
+                "Technology Type": None,
+                "Technology Type Term Accession Number": None,
+                "Technology Type Term Source Ref": None,
+                "Technolology Platform": None,
+            },
+            "command": [
+                "arc",
+                "assay",
+                "add",
+                "--studyidentifier",
+                "{study_identifier}",
+            ],
+            "command_options": {
+                "Assay Identifier": "--assayidentifier",
+                "Measurement Type": "--measurementtype",
+                # mixed up on purpose to deal with arc commander bug
+                # https://github.com/nfdi4plants/ARCCommander/issues/232
+                "Measurement Type Term Accession Number": (
+                    "--measurementtypetermsourceref"
+                ),
+                "Measurement Type Term Source REF": (
+                    "--measurementtypetermaccessionnumber"
+                ),
+                "Technology Type": "--technologytype",
+                # mixed up on purpose to deal with arc commander bug
+                "Technology Type Term Accession Number": (
+                    "--technologytypetermsourceref"
+                ),
+                "Technology Type Term Source Ref": (
+                    "--technologytypetermaccessionnumber"
+                ),
+                "Technolology Platform": "--technologyplatform",
+            },
+        },
+        "contacts": {
+            "namespace": "ARC:ISA:ASSAY:ASSAY PERFORMERS",
+            "item_type": "Person",
+            "default_values": {
+                "Last Name": "{owner_last_name}",
+                "First Name": "{owner_first_name}",
+                "Email": "{owner_email}",
+                "Phone": None,
+                "Fax": None,
+                "Address": None,
+                "Affiliation": None,
+                "orcid": None,
+                "Roles": None,
+                "Roles Term Accession Number": None,
+                "Roles Term Source REF": None,
+            },
+            "command": [
+                "arc",
+                "assay",
+                "person",
+                "register",
+                "--assayidentifier",
+                "{assay_identifier}",
+            ],
+            "command_options": {
+                "Last Name": "--lastname",
+                "First Name": "--firstname",
+                "Mid Initials": "--midinitials",
+                "Email": "--email",
+                "Phone": "--phone",
+                "Fax": "--fax",
+                "Address": "--address",
+                "Affiliation": "--affiliation",
+                "orcid": "--orcid",
+                "Roles": "--roles",
+                "Roles Term Accession Number": "--rolestermaccessionnumber",
+                "Roles Term Source REF": "--rolestermsourceref",
+            },
+        },
+    },
+}
+
+
+def _placeholder(value):
+    if not isinstance(value, str):
+        return None
+    match = _PLACEHOLDER.match(value)
+    if match is None:
+        return None
+    name = match.group(1)
+    if name not in PLACEHOLDERS:
+        raise ValueError(
+            f"Unknown placeholder {value} in isa mapping. "
+            f"Choose from {', '.join(PLACEHOLDERS)}."
+        )
+    return name
+
+
+class CompiledAnnotationType:
+    """Lookup structures for one annotation type of a mapper."""
+
+    __slots__ = (
+        "annotation_type",
+        "namespace",
+        "item_type",
+        "keys",
+        "defaults",
+        "command",
+        "command_options",
+        "fields",
+    )
+
+    def __init__(self, annotation_type, spec):
+        self.annotation_type = annotation_type
+        self.namespace = spec["namespace"]
+        self.item_type = getattr(arc_model, spec["item_type"])
+        self.keys = tuple(spec["default_values"])
+        # (key, value, placeholder), None defaults are never set
+        self.defaults = tuple(
+            (key, value, _placeholder(value))
+            for key, value in spec["default_values"].items()
+            if value is not None
+        )
+        self.command = tuple(
+            (arg, _placeholder(arg)) for arg in spec.get("command", [])
+        )
+        self.command_options = dict(spec["command_options"])
+        # (ISA label, command option) in the order of the keys
+        self.fields = tuple((key, self.command_options.get(key)) for key in self.keys)
+
+    def default_values(self, mapper):
+        """Yields the default (key, value) pairs bound to mapper."""
+        for key, value, placeholder in self.defaults:
+            if placeholder is not None:
+                value = PLACEHOLDERS[placeholder](mapper)
+            if value is not None:
+                yield key, value
+
+    def bind_command(self, mapper):
+        return [
+            arg if placeholder is None else PLACEHOLDERS[placeholder](mapper)
+            for arg, placeholder in self.command
+        ]
+
+
+def merge_mapping(mapping, site_mapping):
+    merged = {kind: dict(specs) for kind, specs in mapping.items()}
+    for kind, specs in site_mapping.items():
+        merged.setdefault(kind, {})
+        for annotation_type, spec in specs.items():
+            merged[kind][annotation_type] = dict(
+                merged[kind].get(annotation_type, {}), **spec
+            )
+    return merged
+
+
+def compile_mapping(mapping):
+    """Returns mapper kind -> tuple of CompiledAnnotationType."""
+    return {
+        kind: tuple(
+            CompiledAnnotationType(annotation_type, spec)
+            for annotation_type, spec in specs.items()
+        )
+        for kind, specs in mapping.items()
+    }
+
+
+_compiled = {}
+
+
+def isa_mapping():
+    """Returns the compiled mapping, including the site mapping file
+    set in OMERO_ARC_MAPPING."""
+    path = os.environ.get(MAPPING_ENV_VARIABLE) or None
+    if path not in _compiled:
+        mapping = ISA_MAPPING
+        if path is not None:
+            with open(path) as f:
+                mapping = merge_mapping(mapping, json.load(f))
+        _compiled[path] = compile_mapping(mapping)
+    return _compiled[path]
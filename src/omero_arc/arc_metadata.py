@@ -0,0 +1,140 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from omero_arc.arc_instrumentation import get_instrumentation
+from omero_arc.arc_metadata_formats import global_metadata_digest
+
+
+def original_image_metadata(image):
+    _, series_metadata, global_metadata = image.loadOriginalMetadata()
+
+    series_metadata = (
+        dict(series_metadata) if len(series_metadata) > 0 else None
+    )
+    global_metadata = (
+        dict(global_metadata) if len(global_metadata) > 0 else None
+    )
+
+    out = {
+        "series_metadata": series_metadata,
+        "global_metadata": global_metadata,
+    }
+
+    return out
+
+
+class GlobalMetadataDigests:
+    """Splits the global metadata off the original metadata of images.
+
+    All series (images) of a fileset share the global metadata of the
+    fileset. Its digest is computed once per fileset and reused for
+    the other images of the fileset. Images without a known fileset
+    are hashed one by one.
+
+    The digests can be shared by packers running in several threads.
+    """
+
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def split(self, metadata, fileset_id=None):
+        """Replaces global_metadata of metadata with its digest
+        (global_metadata_sha256) and returns the global metadata."""
+        global_metadata = metadata.pop("global_metadata")
+        digest = None
+        if global_metadata is not None:
+            if fileset_id is not None:
+                with self._lock:
+                    digest = self._digests.get(fileset_id)
+            if digest is None:
+                # outside the lock, the metadata may be large
+                digest = global_metadata_digest(global_metadata)
+                if fileset_id is not None:
+                    with self._lock:
+                        digest = self._digests.setdefault(fileset_id, digest)
+        metadata["global_metadata_sha256"] = digest
+        return global_metadata
+
+
+class OriginalMetadataFetcher:
+    """Loads the original metadata of images on a bounded thread pool.
+
+    Each worker thread joins the session of conn with its own
+    BlitzGateway connection, so that the blocking loadOriginalMetadata
+    calls run in parallel. With max_workers=1, conn is used directly.
+
+    The worker threads and their connections are kept until close()
+    is called, so that one fetcher can serve many fetch calls, also
+    from several threads at once.
+    """
+
+    def __init__(self, conn, max_workers=4, instrumentation=None):
+        self.conn = conn
+        self.max_workers = max_workers
+        self.instrumentation = get_instrumentation(instrumentation)
+        self._local = threading.local()
+        self._worker_conns = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _worker_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.conn.clone()
+            self.instrumentation.server_call("connect")
+            conn.connect(sUuid=self.conn.c.getSessionId())
+            self._local.conn = conn
+            with self._lock:
+                self._worker_conns.append(conn)
+        return conn
+
+    def _original_metadata(self, image):
+        self.instrumentation.server_call("loadOriginalMetadata")
+        with self.instrumentation.span("loadOriginalMetadata"):
+            return original_image_metadata(image)
+
+    def _load(self, image):
+        image = image.__class__(self._worker_conn(), image._obj)
+        return self._original_metadata(image)
+
+    def fetch(self, images):
+        """Yields (image, metadata) tuples in the order of images, so
+        that files written from the results do not depend on the order
+        the requests complete. At most 2 * max_workers requests are in
+        flight."""
+        if self.max_workers <= 1:
+            for image in images:
+                yield image, self._original_metadata(image)
+            return
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+        pending = deque()
+        try:
+            for image in images:
+                pending.append((image, executor.submit(self._load, image)))
+                if len(pending) >= 2 * self.max_workers:
+                    image, future = pending.popleft()
+                    yield image, future.result()
+            while len(pending) > 0:
+                image, future = pending.popleft()
+                yield image, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._worker_conns:
+                # keep the session alive, it is shared with self.conn
+                conn.close(hard=False)
+            self._worker_conns = []
+        self._local = threading.local()
@@ -0,0 +1,440 @@
+"""File formats for the original metadata of the images of an assay.
+
+The format is selected with a spec "<format>[.<compression>]":
+
+* json: one file protocols/ImageID<id>_metadata.json per image (the
+    default). Uncompressed files are pretty-printed.
+* jsonl: one file protocols/original_metadata.jsonl per assay with one
+    json object per line and the index
+    protocols/original_metadata.index.json (image id -> byte range of
+    its line). Compressed lines are written as separate gzip members or
+    zstd frames, so that a single line can be read and decompressed
+    on its own.
+* parquet: one file protocols/original_metadata.parquet per assay with
+    the columns image_id, image_filename, series_metadata and
+    global_metadata_sha256 (json strings), in small row groups.
+    Requires pyarrow.
+
+The global metadata is the same for all series (images) of a
+fileset. It is stored once per assay and digest and the images refer
+to it with global_metadata_sha256: in files
+global_metadata_<sha256>.json for format json, in
+original_metadata.global.jsonl (indexed like the images) for jsonl
+and in original_metadata.global.parquet for parquet.
+
+Compressions are gz (gzip) and zst (zstd, requires zstandard), e.g.
+"jsonl.zst" or "json.gz". The default of the packer can be set with
+the OMERO_ARC_METADATA_FORMAT environment variable.
+
+Json is encoded with orjson if it is installed.
+
+read_original_metadata loads the metadata of one image from a
+protocols folder, whatever format it has been written in.
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+METADATA_FORMAT_ENV_VARIABLE = "OMERO_ARC_METADATA_FORMAT"
+
+FORMATS = ("json", "jsonl", "parquet")
+COMPRESSIONS = (None, "gz", "zst")
+
+CONSOLIDATED_BASENAME = "original_metadata"
+INDEX_FILENAME = f"{CONSOLIDATED_BASENAME}.index.json"
+GLOBAL_BASENAME = f"{CONSOLIDATED_BASENAME}.global"
+
+# images per parquet row group; reading one image only decodes its group
+PARQUET_ROW_GROUP_SIZE = 64
+
+
+def _dumps(obj, pretty=False):
+    """Encodes obj as json bytes."""
+    if pretty:
+        return json.dumps(obj, indent=4, default=str).encode()
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+def global_metadata_digest(global_metadata):
+    """Returns the sha256 of the global metadata of an image, None if
+    there is none."""
+    if global_metadata is None:
+        return None
+    if orjson is not None:
+        data = orjson.dumps(
+            global_metadata,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS,
+        )
+    else:
+        data = json.dumps(
+            global_metadata, separators=(",", ":"), sort_keys=True, default=str
+        ).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def _loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _suffix(compression):
+    if compression is None:
+        return ""
+    return f".{compression}"
+
+
+def image_metadata_filename(image_id, compression=None):
+    """Returns the name of the file of an image in format json."""
+    return f"ImageID{image_id}_metadata.json{_suffix(compression)}"
+
+
+def global_metadata_filename(digest, compression=None):
+    """Returns the name of a global metadata file in format json."""
+    return f"global_metadata_{digest}.json{_suffix(compression)}"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Could not import zstandard library, "
+            "which is needed for zstd compressed original metadata. "
+            "Install it with pip install zstandard."
+        ) from e
+    return zstandard
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Could not import pyarrow library, "
+            "which is needed for original metadata in parquet format. "
+            "Install it with pip install pyarrow."
+        ) from e
+    return pyarrow
+
+
+def _compress(data, compression):
+    if compression == "gz":
+        return gzip.compress(data)
+    if compression == "zst":
+        return _zstandard().ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data, compression):
+    if compression == "gz":
+        return gzip.decompress(data)
+    if compression == "zst":
+        return _zstandard().ZstdDecompressor().decompress(data)
+    return data
+
+
+class OriginalMetadataFormat:
+    """A format and compression of original metadata files."""
+
+    def __init__(self, name="json", compression=None):
+        if name not in FORMATS:
+            raise ValueError(
+                f"unknown original metadata format {name}, "
+                f"choose one of {', '.join(FORMATS)}"
+            )
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"unknown compression {compression}, "
+                f"choose one of {', '.join(c for c in COMPRESSIONS if c)}"
+            )
+        self.name = name
+        self.compression = compression
+        # fail early if optional dependencies are missing
+        if compression == "zst" and name != "parquet":
+            _zstandard()
+        if name == "parquet":
+            _pyarrow()
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Creates the format of a spec, e.g. "jsonl.gz"."""
+        if isinstance(spec, cls):
+            return spec
+        name, _, compression = spec.partition(".")
+        return cls(name, compression or None)
+
+    @classmethod
+    def from_env(cls, default="json"):
+        return cls.from_spec(os.environ.get(METADATA_FORMAT_ENV_VARIABLE) or default)
+
+    @property
+    def spec(self):
+        if self.compression is None:
+            return self.name
+        return f"{self.name}.{self.compression}"
+
+    @property
+    def per_image(self):
+        """True if each image gets its own file."""
+        return self.name == "json"
+
+    def filename(self, image_id=None):
+        """Returns the name of the file of an image (format json) or of
+        the consolidated file of an assay."""
+        if self.per_image:
+            return image_metadata_filename(image_id, self.compression)
+        if self.name == "parquet":
+            # parquet compresses its pages itself
+            return f"{CONSOLIDATED_BASENAME}.parquet"
+        return f"{CONSOLIDATED_BASENAME}.jsonl{_suffix(self.compression)}"
+
+    def _write_file(self, path, obj):
+        data = _dumps(obj, pretty=self.compression is None)
+        with open(path, "wb") as f:
+            f.write(_compress(data, self.compression))
+
+    def write_image_file(self, folder, metadata, global_metadata=None):
+        """Writes the metadata of one image to folder (format json).
+
+        metadata refers to its global metadata with
+        global_metadata_sha256. The global metadata is written unless
+        a file of the digest exists. Returns the path of the global
+        metadata file, None if the image has no global metadata.
+        """
+        folder = Path(folder)
+        digest = metadata["global_metadata_sha256"]
+        path = None
+        if digest is not None and global_metadata is not None:
+            path = folder / global_metadata_filename(digest, self.compression)
+            if not path.exists():
+                self._write_file(path, global_metadata)
+        self._write_file(folder / self.filename(metadata["image_id"]), metadata)
+        return path
+
+    def writer(self, path):
+        """Returns a writer of the consolidated file at path. Use it as
+        context manager and add the metadata of each image with
+        write(metadata, global_metadata), see write_image_file. The
+        other files it writes (global metadata, index) are listed in
+        its attribute other_paths."""
+        if self.name == "parquet":
+            return _ParquetWriter(path, self.compression)
+        return _JsonLinesWriter(path, self.compression)
+
+
+class _JsonLinesWriter:
+    def __init__(self, path, compression):
+        self.path = Path(path)
+        self.global_path = self.path.with_name(
+            GLOBAL_BASENAME + self.path.name[len(CONSOLIDATED_BASENAME):]
+        )
+        self.compression = compression
+        self.other_paths = [self.global_path, self.path.with_name(INDEX_FILENAME)]
+        self._index = {}
+        self._global_index = {}
+
+    def __enter__(self):
+        self._file = open(self.path, "wb")
+        self._global_file = open(self.global_path, "wb")
+        return self
+
+    def _write_line(self, f, obj):
+        data = _compress(_dumps(obj) + b"\n", self.compression)
+        entry = [f.tell(), len(data)]
+        f.write(data)
+        return entry
+
+    def write(self, metadata, global_metadata=None):
+        digest = metadata["global_metadata_sha256"]
+        if (
+            digest is not None
+            and global_metadata is not None
+            and digest not in self._global_index
+        ):
+            self._global_index[digest] = self._write_line(
+                self._global_file, global_metadata
+            )
+        self._index[str(metadata["image_id"])] = self._write_line(
+            self._file, metadata
+        )
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+        self._global_file.close()
+        index = {
+            "file": self.path.name,
+            "images": self._index,
+            "global_file": self.global_path.name,
+            "global": self._global_index,
+        }
+        with open(self.path.with_name(INDEX_FILENAME), "w") as f:
+            json.dump(index, f)
+        return False
+
+
+class _ParquetWriter:
+    def __init__(self, path, compression):
+        self.path = Path(path)
+        self.global_path = self.path.with_name(f"{GLOBAL_BASENAME}.parquet")
+        self.other_paths = [self.global_path]
+        self.compression = {None: "none", "gz": "gzip", "zst": "zstd"}[compression]
+        self._rows = []
+        self._global_rows = {}
+
+    def __enter__(self):
+        pa = _pyarrow()
+        self._schema = pa.schema(
+            [
+                ("image_id", pa.int64()),
+                ("image_filename", pa.string()),
+                ("series_metadata", pa.string()),
+                ("global_metadata_sha256", pa.string()),
+            ]
+        )
+        self._writer = pa.parquet.ParquetWriter(
+            self.path, self._schema, compression=self.compression
+        )
+        return self
+
+    def write(self, metadata, global_metadata=None):
+        digest = metadata["global_metadata_sha256"]
+        if (
+            digest is not None
+            and global_metadata is not None
+            and digest not in self._global_rows
+        ):
+            self._global_rows[digest] = _dumps(global_metadata).decode()
+        self._rows.append(
+            {
+                "image_id": metadata["image_id"],
+                "image_filename": metadata.get("image_filename"),
+                "series_metadata": _dumps(metadata["series_metadata"]).decode(),
+                "global_metadata_sha256": digest,
+            }
+        )
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        # sorted row groups keep the image id statistics tight
+        rows = sorted(self._rows, key=lambda row: row["image_id"])
+        self._rows = []
+        table = _pyarrow().Table.from_pylist(rows, schema=self._schema)
+        self._writer.write_table(table)
+
+    def _write_global(self):
+        pa = _pyarrow()
+        table = pa.table(
+            {
+                "global_metadata_sha256": list(self._global_rows.keys()),
+                "global_metadata": list(self._global_rows.values()),
+            },
+            schema=pa.schema(
+                [("global_metadata_sha256", pa.string()), ("global_metadata", pa.string())]
+            ),
+        )
+        pa.parquet.write_table(table, self.global_path, compression=self.compression)
+
+    def __exit__(self, exc_type, *exc_info):
+        try:
+            if exc_type is None:
+                if len(self._rows) > 0:
+                    self._write_row_group()
+                self._write_global()
+        finally:
+            self._writer.close()
+        return False
+
+
+def _compression_of(path):
+    return path.suffix[1:] if path.suffix in (".gz", ".zst") else None
+
+
+def _read_range(path, entry):
+    offset, length = entry
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return _loads(_decompress(data, _compression_of(path)))
+
+
+def _read_json(folder, image_id, compression):
+    with open(folder / image_metadata_filename(image_id, compression), "rb") as f:
+        metadata = _loads(_decompress(f.read(), compression))
+    digest = metadata.get("global_metadata_sha256")
+    if digest is not None:
+        path = folder / global_metadata_filename(digest, compression)
+        with open(path, "rb") as f:
+            metadata["global_metadata"] = _loads(_decompress(f.read(), compression))
+    return metadata
+
+
+def _read_json_lines(folder, image_id):
+    with open(folder / INDEX_FILENAME) as f:
+        index = json.load(f)
+    entry = index["images"].get(str(image_id))
+    if entry is None:
+        raise KeyError(image_id)
+    metadata = _read_range(folder / index["file"], entry)
+    digest = metadata.get("global_metadata_sha256")
+    if digest is not None:
+        metadata["global_metadata"] = _read_range(
+            folder / index["global_file"], index["global"][digest]
+        )
+    return metadata
+
+
+def _read_parquet(folder, image_id):
+    pa = _pyarrow()
+    table = pa.parquet.read_table(
+        folder / f"{CONSOLIDATED_BASENAME}.parquet",
+        filters=[("image_id", "==", image_id)],
+    )
+    rows = table.to_pylist()
+    if len(rows) == 0:
+        raise KeyError(image_id)
+    metadata = rows[0]
+    metadata["series_metadata"] = _loads(metadata["series_metadata"])
+    digest = metadata["global_metadata_sha256"]
+    if digest is not None:
+        table = pa.parquet.read_table(
+            folder / f"{GLOBAL_BASENAME}.parquet",
+            filters=[("global_metadata_sha256", "==", digest)],
+        )
+        metadata["global_metadata"] = _loads(table.to_pylist()[0]["global_metadata"])
+    return metadata
+
+
+def read_original_metadata(protocols_folder, image_id):
+    """Returns the original metadata of an image (a dict with
+    series_metadata, global_metadata, global_metadata_sha256, image_id
+    and image_filename) from the protocols folder of an assay. Only the
+    parts of consolidated files that hold the image are read. Raises
+    KeyError if there is no metadata of the image."""
+    folder = Path(protocols_folder)
+    metadata = None
+    for compression in COMPRESSIONS:
+        if (folder / image_metadata_filename(image_id, compression)).exists():
+            metadata = _read_json(folder, image_id, compression)
+            break
+    else:
+        if (folder / INDEX_FILENAME).exists():
+            metadata = _read_json_lines(folder, image_id)
+        elif (folder / f"{CONSOLIDATED_BASENAME}.parquet").exists():
+            metadata = _read_parquet(folder, image_id)
+        else:
+            raise KeyError(image_id)
+    metadata.setdefault("global_metadata", None)
+    return metadata
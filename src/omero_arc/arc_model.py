@@ -0,0 +1,362 @@
+def _labels(prefix, fields):
+    return {f"{prefix}{suffix}": field for suffix, field in fields.items()}
+
+
+class IsaItem:
+    """Values of one ISA item (e.g. a study, a person or a
+    publication).
+
+    Every entity has one slot per ISA field. LABELS maps the ISA labels
+    of the mapping schema to the slots; values of labels without a
+    slot (e.g. Comment[...] rows of a site mapping) are kept in
+    comments. Values are read by slot (item.title) or by ISA label
+    (item["Study Title"]).
+    """
+
+    __slots__ = ("comments",)
+
+    # ISA label -> slot
+    LABELS = {}
+
+    def __init__(self, comments=None, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.pop(field, None))
+        if len(fields) > 0:
+            raise TypeError(
+                f"{self.__class__.__name__} has no fields {', '.join(fields)}"
+            )
+        self.comments = comments
+
+    @classmethod
+    def from_labels(cls, values):
+        """Creates an item from a dict ISA label -> value."""
+        fields = {}
+        comments = None
+        for label, value in values.items():
+            field = cls.LABELS.get(label)
+            if field is not None:
+                fields[field] = value
+            else:
+                if comments is None:
+                    comments = {}
+                comments[label] = value
+        return cls(comments=comments, **fields)
+
+    def value(self, label):
+        """Returns the value of an ISA label, None if it is not set."""
+        field = self.LABELS.get(label)
+        if field is not None:
+            return getattr(self, field)
+        if self.comments is None:
+            return None
+        return self.comments.get(label)
+
+    def __getitem__(self, label):
+        if label not in self.LABELS and label not in (self.comments or {}):
+            raise KeyError(label)
+        return self.value(label)
+
+    def _fields(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._fields() == other._fields() and self.comments == other.comments
+
+    def __repr__(self):
+        values = ", ".join(
+            f"{field}={value!r}"
+            for field, value in zip(self.__slots__, self._fields())
+            if value is not None
+        )
+        return f"{self.__class__.__name__}({values})"
+
+
+class Investigation(IsaItem):
+    __slots__ = (
+        "identifier",
+        "title",
+        "description",
+        "submission_date",
+        "public_release_date",
+    )
+
+    LABELS = _labels(
+        "Investigation ",
+        {
+            "Identifier": "identifier",
+            "Title": "title",
+            "Description": "description",
+            "Submission Date": "submission_date",
+            "Public Release Date": "public_release_date",
+        },
+    )
+
+
+class Study(IsaItem):
+    __slots__ = (
+        "identifier",
+        "title",
+        "description",
+        "submission_date",
+        "public_release_date",
+        "file_name",
+    )
+
+    LABELS = _labels(
+        "Study ",
+        {
+            "Identifier": "identifier",
+            "Title": "title",
+            "Description": "description",
+            "Submission Date": "submission_date",
+            "Public Release Date": "public_release_date",
+            "File Name": "file_name",
+        },
+    )
+
+
+class Assay(IsaItem):
+    __slots__ = (
+        "identifier",
+        "measurement_type",
+        "measurement_type_term_accession_number",
+        "measurement_type_term_source_ref",
+        "technology_type",
+        "technology_type_term_accession_number",
+        "technology_type_term_source_ref",
+        "technology_platform",
+    )
+
+    LABELS = {
+        "Assay Identifier": "identifier",
+        "Measurement Type": "measurement_type",
+        "Measurement Type Term Accession Number": (
+            "measurement_type_term_accession_number"
+        ),
+        "Measurement Type Term Source REF": "measurement_type_term_source_ref",
+        "Technology Type": "technology_type",
+        "Technology Type Term Accession Number": (
+            "technology_type_term_accession_number"
+        ),
+        "Technology Type Term Source REF": "technology_type_term_source_ref",
+        "Technology Platform": "technology_platform",
+        # spelling of the assay mapping schema
+        "Technology Type Term Source Ref": "technology_type_term_source_ref",
+        "Technolology Platform": "technology_platform",
+    }
+
+
+_PERSON_FIELDS = {
+    "Last Name": "last_name",
+    "First Name": "first_name",
+    "Mid Initials": "mid_initials",
+    "Email": "email",
+    "Phone": "phone",
+    "Fax": "fax",
+    "Address": "address",
+    "Affiliation": "affiliation",
+    "orcid": "orcid",
+    "Roles": "roles",
+    "Roles Term Accession Number": "roles_term_accession_number",
+    "Roles Term Source REF": "roles_term_source_ref",
+}
+
+
+class Person(IsaItem):
+    __slots__ = tuple(_PERSON_FIELDS.values())
+
+    # investigation contacts, study contacts and assay performers
+    LABELS = {
+        **_labels("Investigation Person ", _PERSON_FIELDS),
+        **_labels("Study Person ", _PERSON_FIELDS),
+        **_labels("", _PERSON_FIELDS),
+    }
+
+
+_PUBLICATION_FIELDS = {
+    "Publication DOI": "doi",
+    "Publication PubMed ID": "pubmed_id",
+    "Publication Author List": "author_list",
+    "Publication Title": "title",
+    "Publication Status": "status",
+    "Publication Status Term Accession Number": "status_term_accession_number",
+    "Publication Status Term Source REF": "status_term_source_ref",
+}
+
+
+class Publication(IsaItem):
+    __slots__ = tuple(_PUBLICATION_FIELDS.values())
+
+    LABELS = {
+        **_labels("Investigation ", _PUBLICATION_FIELDS),
+        **_labels("Study ", _PUBLICATION_FIELDS),
+    }
+
+
+class DesignDescriptor(IsaItem):
+    __slots__ = ("type", "type_term_accession_number", "type_term_source_ref")
+
+    LABELS = _labels(
+        "Study Design ",
+        {
+            "Type": "type",
+            "Type Term Accession Number": "type_term_accession_number",
+            "Type Term Source REF": "type_term_source_ref",
+        },
+    )
+
+
+class Factor(IsaItem):
+    __slots__ = (
+        "name",
+        "type",
+        "type_term_accession_number",
+        "type_term_source_ref",
+    )
+
+    LABELS = _labels(
+        "Study Factor ",
+        {
+            "Name": "name",
+            "Type": "type",
+            "Type Term Accession Number": "type_term_accession_number",
+            "Type Term Source REF": "type_term_source_ref",
+        },
+    )
+
+
+_PROTOCOL_FIELDS = {
+    "Name": "name",
+    "Type": "type",
+    "Type Term Accession Number": "type_term_accession_number",
+    "Type Term Source REF": "type_term_source_ref",
+    "Description": "description",
+    "URI": "uri",
+    "Version": "version",
+    "Parameters Name": "parameters_name",
+    "Parameters Term Accession Number": "parameters_term_accession_number",
+    "Parameters Term Source REF": "parameters_term_source_ref",
+    "Components Name": "components_name",
+    "Components Type": "components_type",
+    "Components Type Term Accession Number": (
+        "components_type_term_accession_number"
+    ),
+    "Components Type Term Source REF": "components_type_term_source_ref",
+}
+
+
+class Protocol(IsaItem):
+    __slots__ = tuple(_PROTOCOL_FIELDS.values())
+
+    LABELS = _labels("Study Protocol ", _PROTOCOL_FIELDS)
+
+
+class IsaBlock:
+    """All items of one annotation type of a mapper (e.g. the contacts
+    of a study) and the ARCCommander command that writes each item.
+
+    * command: the command without options, e.g. ("arc", "study", "add")
+    * fields: tuple of (ISA label, command line option) in the order
+        the options are written, the option is None for labels that
+        are not written
+    * values: tuple of IsaItem
+    """
+
+    __slots__ = ("command", "fields", "values")
+
+    def __init__(self, command, fields, values):
+        self.command = tuple(command)
+        self.fields = tuple(fields)
+        self.values = tuple(values)
+
+    def arccommander_commands(self):
+        """Yields one command per item."""
+        for item in self.values:
+            cmd = list(self.command)
+            for label, command_option in self.fields:
+                if command_option is None:
+                    continue
+                value = item.value(label)
+                if value is not None:
+                    cmd.append(command_option)
+                    cmd.append(value)
+            yield cmd
+
+
+class IsaTable:
+    """Columnar table of an assay sheet (e.g. "Image Files").
+
+    * name: the sheet name
+    * columns: tuple of column names
+    * data: one list of values per column
+
+    Rows are appended as sequences in column order. The xlsx writer
+    streams the rows without converting the table; use to_pandas for a
+    DataFrame.
+    """
+
+    __slots__ = ("name", "columns", "data")
+
+    def __init__(self, name, columns, data=None):
+        self.name = name
+        self.columns = tuple(columns)
+        if data is None:
+            data = [[] for _ in self.columns]
+        self.data = [list(values) for values in data]
+        assert len(self.data) == len(self.columns)
+
+    @classmethod
+    def from_rows(cls, name, rows, columns=None):
+        """Creates a table from dicts that map column names to values.
+        columns default to the keys of the first row."""
+        table = None
+        if columns is not None:
+            table = cls(name, columns)
+        for row in rows:
+            if table is None:
+                table = cls(name, row.keys())
+            table.append([row.get(column) for column in table.columns])
+        if table is None:
+            table = cls(name, ())
+        return table
+
+    def __len__(self):
+        if len(self.data) == 0:
+            return 0
+        return len(self.data[0])
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.name!r}, "
+            f"columns={self.columns!r}, rows={len(self)})"
+        )
+
+    def append(self, values):
+        for column_values, value in zip(self.data, values):
+            column_values.append(value)
+
+    def column(self, name):
+        return self.data[self.columns.index(name)]
+
+    def rows(self):
+        """Yields one tuple per row."""
+        return zip(*self.data)
+
+    def to_pandas(self):
+        """Returns the table as pandas DataFrame, named like the
+        sheet."""
+        try:
+            import pandas
+        except ImportError as e:
+            raise ImportError(
+                "Could not import pandas library. Make sure to "
+                "install omero-cli-transfer with the optional "
+                "[arc] addition"
+            ) from e
+        df = pandas.DataFrame(
+            dict(zip(self.columns, self.data)), columns=list(self.columns)
+        )
+        df.name = self.name
+        return df
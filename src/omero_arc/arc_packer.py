@@ -1,20 +1,38 @@
-import json
 import os
-import shutil
-import subprocess
+import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from omero.model import Project
-import pandas as pd
 
+from omero_arc.arc_backend import create_isa_backend, update_command
+from omero_arc.arc_checksums import write_assay_checksums
+from omero_arc.arc_experimenters import ExperimenterCache
+from omero_arc.arc_git_stores import create_git_store
+from omero_arc.arc_instrumentation import (
+    BYTES_COPIED,
+    FILES_COPIED,
+    get_instrumentation,
+    instrumentation_from_env,
+)
+from omero_arc.arc_manifest import ArcManifest
 from omero_arc.arc_mapping import (
     IsaAssayMapper,
     IsaInvestigationMapper,
     IsaStudyMapper,
 )
-
-
-def fmt_identifier(title: str) -> str:
-    return title.lower().replace(" ", "-")
+from omero_arc.arc_mapping_schema import fmt_identifier  # noqa: F401
+from omero_arc.arc_metadata import (  # noqa: F401
+    GlobalMetadataDigests,
+    OriginalMetadataFetcher,
+    original_image_metadata,
+)
+from omero_arc.arc_metadata_formats import OriginalMetadataFormat
+from omero_arc.arc_pipeline import END_OF_STREAM, PIPELINE_QUEUE_SIZE, Pipeline
+from omero_arc.arc_plan import IsaCommandPlan
+from omero_arc.arc_progress import PackProgress, ProgressBar
+from omero_arc.arc_snapshot import ProjectSnapshot
+from omero_arc.arc_staging import STAGING_STRATEGIES, FileStager, StagingSummary
+from omero_arc.arc_xlsx import write_sheets_streaming
 
 
 def is_arc_repo(path: Path) -> bool:
@@ -23,36 +41,74 @@ def is_arc_repo(path: Path) -> bool:
     return False
 
 
-def original_image_metadata(image):
-    _, series_metadata, global_metadata = image.loadOriginalMetadata()
+# marks the end of the images of an assay in the metadata queue
+_END_OF_ASSAY = object()
+
 
-    series_metadata = (
-        dict(series_metadata) if len(series_metadata) > 0 else None
-    )
-    global_metadata = (
-        dict(global_metadata) if len(global_metadata) > 0 else None
-    )
+class AssayContext:
+    """The mapper, the images and the assay sheet tables of one dataset.
 
-    out = {
-        "series_metadata": series_metadata,
-        "global_metadata": global_metadata,
-    }
+    Created once per dataset when the assays are mapped and reused by
+    all later packing stages (file copy, original metadata, sheets).
+    """
 
-    return out
+    def __init__(self, mapper, images):
+        self.mapper = mapper
+        self.dataset = mapper.obj
+        self.assay_identifier = mapper.assay_identifier()
+        self.images = list(images)
+        self._sheet_tables = None
+
+    def sheet_tables(self, conn):
+        """Returns the IsaTable of each assay sheet, mapped on first
+        access."""
+        if self._sheet_tables is None:
+            self._sheet_tables = [
+                sheet_mapper.table(conn, objs=self.images)
+                for sheet_mapper in self.mapper.isa_sheets
+            ]
+        return self._sheet_tables
 
 
 def pack_arc(ome_object,
              destination_path,
              tmp_path,
              image_filenames_mapping,
-             conn):
+             conn,
+             **kwargs):
+    """Packs ome_object into an ARC at destination_path.
+
+    If no instrumentation is passed, it is selected with the
+    OMERO_ARC_TRACE environment variable. A summary of enabled
+    instrumentation is printed at the end.
+
+    If no progress_callback is passed and stderr is a terminal, a
+    progress bar is drawn and the throughput per assay is printed at
+    the end.
+    """
+    instrumentation = kwargs.pop("instrumentation", None)
+    if instrumentation is None:
+        instrumentation = instrumentation_from_env()
+    progress_callback = kwargs.pop("progress_callback", None)
+    if progress_callback is None and sys.stderr.isatty():
+        progress_callback = ProgressBar()
 
     packer = ArcPacker(ome_object,
                        destination_path,
                        tmp_path,
                        image_filenames_mapping,
-                       conn)
-    packer.pack()
+                       conn,
+                       instrumentation=instrumentation,
+                       progress_callback=progress_callback,
+                       **kwargs)
+    try:
+        packer.pack()
+    finally:
+        if isinstance(progress_callback, ProgressBar):
+            print(packer.progress.summary())
+        if instrumentation.enabled:
+            print(instrumentation.summary())
+        instrumentation.close()
 
 
 class ArcPacker(object):
@@ -63,7 +119,62 @@ class ArcPacker(object):
         tmp_path,
         image_filenames_mapping,
         conn,
+        isa_backend="xlsx",
+        staging_workers=4,
+        staging_strategies=STAGING_STRATEGIES,
+        staging_mode=None,
+        metadata_workers=4,
+        metadata_format=None,
+        pipeline_queue_size=PIPELINE_QUEUE_SIZE,
+        snapshot=None,
+        instrumentation=None,
+        progress_callback=None,
     ):
+        """Packs an omero project into an ARC repository.
+
+        isa_backend selects how the isa files are written:
+        "xlsx" writes them in-process, "arccommander" runs
+        one ARCCommander subprocess per command.
+
+        Image files are staged into the ARC with staging_workers
+        threads, trying the staging_strategies in order
+        (see omero_arc.arc_staging.FileStager). With staging_mode
+        "lfs" or "annex", the files are staged into the object store of
+        git-lfs or git-annex of the ARC and only pointer files or
+        symlinks are written to the assays
+        (see omero_arc.arc_git_stores). It defaults to the
+        OMERO_ARC_STAGING_MODE environment variable or "files".
+
+        Original metadata is fetched with up to metadata_workers
+        parallel connections to the omero server and written in
+        metadata_format, a spec like "jsonl.gz" (see
+        omero_arc.arc_metadata_formats). It defaults to the
+        OMERO_ARC_METADATA_FORMAT environment variable or "json".
+
+        The image files, original metadata and assay sheets of all
+        assays are exported in a pipeline: one stage iterates the
+        images, the others copy files, fetch and write original metadata
+        and write assay sheets concurrently. The stages are connected by
+        queues of pipeline_queue_size items. With pipeline_queue_size=0
+        the assays are exported one stage after the other.
+
+        Exported objects are recorded in a manifest (see
+        omero_arc.arc_manifest.ArcManifest). Packing into an ARC again
+        only exports new or changed objects.
+
+        snapshot is an optional ProjectSnapshot of ome_object. If it is
+        not given, it is loaded from the server when packing starts.
+
+        instrumentation receives timing spans of all packing stages and
+        counters of server calls, copied bytes and spawned subprocesses
+        (see omero_arc.arc_instrumentation). It is disabled by default.
+
+        progress_callback is called with an
+        omero_arc.arc_progress.ProgressEvent for every exported image
+        file, original metadata and assay sheet. The events hold the
+        totals of the pack and an ETA. self.progress.summary() returns
+        the throughput per assay.
+        """
 
         assert ome_object.OMERO_CLASS == "Project"
         self.obj = ome_object  # must be a project
@@ -71,77 +182,387 @@ class ArcPacker(object):
         self.conn = conn
         self.image_filenames_mapping = image_filenames_mapping
         self.path_to_image_files = tmp_path
+        self.instrumentation = get_instrumentation(instrumentation)
+        self.isa_backend = create_isa_backend(
+            isa_backend, destination_path, instrumentation=self.instrumentation
+        )
+        self.file_stager = FileStager(
+            max_workers=staging_workers,
+            strategies=staging_strategies,
+            store=create_git_store(staging_mode, destination_path),
+        )
+        self.staging_summary = StagingSummary()
+        self.metadata_workers = metadata_workers
+        self.metadata_fetcher = None
+        if metadata_format is None:
+            self.metadata_format = OriginalMetadataFormat.from_env()
+        else:
+            self.metadata_format = OriginalMetadataFormat.from_spec(metadata_format)
+        self.global_metadata_digests = GlobalMetadataDigests()
+        self.pipeline_queue_size = pipeline_queue_size
+        self.manifest = ArcManifest(destination_path)
+        self.experimenters = ExperimenterCache(self.instrumentation)
+        self._experimenters_prefetched = False
+        self.progress = PackProgress(
+            callbacks=[] if progress_callback is None else [progress_callback]
+        )
 
+        self.assay_contexts = {}
         self.isa_assay_mappers = []
         self.ome_dataset_for_isa_assay = {}
+        self.isa_command_plan = None
+        self.snapshot = snapshot
 
-    def pack(self):
-        if is_arc_repo(self.path_to_arc_repo):
-            self.add_data_to_arc_repo()
-        elif not self.path_to_arc_repo.exists():
+    def pack(self, dry_run=False):
+        if dry_run:
+            return self.dry_run()
+        with self.instrumentation.span("pack"):
+            self._pack()
+
+    def _pack(self):
+        if self._creates_arc_repo():
             self.create_arc_repo()
         else:
-            msg = (f"Could not create ARC at {self.path_to_arc_repo}. "
-                    "Either specifiy a not existing directory "
-                    "to build a new ARC or specify a path to an "
-                    "existing ARC repository.")
-            raise ValueError(msg)
+            self.add_data_to_arc_repo()
+
+    def _creates_arc_repo(self):
+        """Returns True if the pack creates a new ARC, False if it adds
+        to an existing ARC."""
+        if is_arc_repo(self.path_to_arc_repo):
+            return False
+        if not self.path_to_arc_repo.exists():
+            return True
+        msg = (f"Could not create ARC at {self.path_to_arc_repo}. "
+                "Either specify a not existing directory "
+                "to build a new ARC or specify a path to an "
+                "existing ARC repository.")
+        raise ValueError(msg)
+
+    def dry_run(self):
+        """Prints the isa command plan of the pack and its estimated
+        cost without writing anything."""
+        self.project_snapshot()
+        with self.batched_isa_commands(execute=False) as plan:
+            if not is_arc_repo(self.path_to_arc_repo):
+                self._create_investigation()
+            self._create_study()
+            self._create_assays()
+        print(plan.describe(self.isa_backend))
+        return plan
+
+    @contextmanager
+    def batched_isa_commands(self, execute=True):
+        """Collects all isa commands issued within the context and
+        runs them as one batch at exit."""
+        plan = IsaCommandPlan()
+        self.isa_command_plan = plan
+        try:
+            yield plan
+        finally:
+            self.isa_command_plan = None
+        if execute:
+            with self.instrumentation.span("isa commands"):
+                plan.execute(self.isa_backend)
+
+    def project_snapshot(self):
+        """Returns the snapshot of the packed project. The snapshot is
+        loaded from the server on first access."""
+        if self.snapshot is None:
+            with self.instrumentation.span("snapshot"):
+                self.snapshot = ProjectSnapshot.load(
+                    self.conn, self.obj, instrumentation=self.instrumentation
+                )
+        if not self._experimenters_prefetched:
+            # owners of the project and datasets, used for contact defaults
+            self.experimenters.prefetch(
+                self.conn, [self.obj] + self.snapshot.datasets
+            )
+            self._experimenters_prefetched = True
+        return self.snapshot
 
+    def _run_isa_commands(self, commands):
+        if self.isa_command_plan is not None:
+            self.isa_command_plan.add(commands)
+        else:
+            self.isa_backend.run_all(commands)
 
     def create_arc_repo(self):
-        self.initialize_arc_repo()
-        self.add_data_to_arc_repo()
+        self.project_snapshot()
+        with self.batched_isa_commands():
+            self.initialize_arc_repo()
+            self._create_study()
+            self._create_assays()
+        self._record_isa_objects()
+        self._add_assay_data()
 
     def add_data_to_arc_repo(self):
-        self._create_study()
-        self._create_assays()
-        for assay_mapper in self.isa_assay_mappers:
-            assay_identifier = assay_mapper.assay_identifier()
-            self._add_image_data_for_assay(assay_identifier)
-            self._add_original_metadata_for_assay(assay_identifier)
-        self._add_isa_assay_sheets()
+        with self.batched_isa_commands():
+            self._create_study()
+            self._create_assays()
+        self._record_isa_objects()
+        self._add_assay_data()
+
+    def _record_isa_objects(self):
+        self.manifest.record_study(
+            self.obj,
+            self.study_mapper.study_identifier(),
+            self.study_mapper.arccommander_commands(),
+        )
+        for mapper in self.isa_assay_mappers:
+            self.manifest.record_assay(
+                mapper.obj, mapper.assay_identifier(), mapper.arccommander_commands()
+            )
+        self.manifest.save()
+
+    def _add_assay_data(self):
+        self.progress.start(self._progress_totals())
+        try:
+            with self._original_metadata_fetcher():
+                if self.pipeline_queue_size > 0:
+                    self._add_assay_data_pipelined()
+                else:
+                    for assay_identifier in self.assay_contexts:
+                        self._add_data_for_assay(assay_identifier)
+            self._write_checksums()
+        finally:
+            self.progress.finish()
+
+    def _write_checksums(self):
+        """Writes the checksum index of every assay (see
+        omero_arc.arc_checksums)."""
+        write_assay_checksums(
+            self.path_to_arc_repo, self.manifest, self.assay_contexts
+        )
+
+    def _progress_totals(self):
+        """Returns the image files, bytes, original metadata and sheets
+        of all assays, as if nothing was up to date."""
+        totals = {}
+        for assay_identifier, context in self.assay_contexts.items():
+            files = {}
+            for image in context.images:
+                src = self.image_filename(image.getId(), abspath=True)
+                files[src.name] = src
+            totals[assay_identifier] = {
+                "images": len(files),
+                "bytes": sum(os.path.getsize(src) for src in files.values()),
+                "metadata": len(context.images),
+                "sheets": 1,
+            }
+        return totals
+
+    def _add_assay_data_pipelined(self):
+        """Exports the data of all assays with the stages
+
+        * images: puts the files to copy and the images without
+            original metadata into the queues of the next stages,
+            image by image
+        * copy: stages files with staging_workers threads
+        * metadata: fetches and writes original metadata
+        * sheets: writes the sheets of an assay once all of its images
+            have been queued
+
+        so that disk I/O, server requests and xlsx generation overlap.
+        """
+        pipeline = Pipeline(self.pipeline_queue_size)
+        copy_queue = pipeline.queue()
+        metadata_queue = pipeline.queue()
+        sheet_queue = pipeline.queue()
+        summary = StagingSummary()
+        copy_workers = max(self.file_stager.max_workers, 1)
+        start = time.perf_counter()
+
+        def _iterate_images():
+            for assay_identifier, context in self.assay_contexts.items():
+                staged_files = self._image_files_to_stage(assay_identifier)
+                self._set_image_files_total(assay_identifier, staged_files)
+                files = {
+                    image.getId(): (assay_identifier, src, dst, image)
+                    for src, dst, image in staged_files
+                }
+                metadata_image_ids = {
+                    image.getId()
+                    for image in self._images_without_metadata(assay_identifier)
+                }
+                self.progress.set_total(
+                    "metadata", assay_identifier, len(metadata_image_ids)
+                )
+                if len(metadata_image_ids) > 0:
+                    pipeline.put(metadata_queue, assay_identifier)
+                for image in context.images:
+                    if image.getId() in files:
+                        pipeline.put(copy_queue, files[image.getId()])
+                    if image.getId() in metadata_image_ids:
+                        pipeline.put(metadata_queue, image)
+                if len(metadata_image_ids) > 0:
+                    pipeline.put(metadata_queue, _END_OF_ASSAY)
+                pipeline.put(sheet_queue, assay_identifier)
+            for _ in range(copy_workers):
+                pipeline.put(copy_queue, END_OF_STREAM)
+            pipeline.put(metadata_queue, END_OF_STREAM)
+            pipeline.put(sheet_queue, END_OF_STREAM)
+
+        def _copy():
+            while True:
+                item = pipeline.get(copy_queue)
+                if item is END_OF_STREAM:
+                    return
+                assay_identifier, src, dst, image = item
+                with self.instrumentation.span("image copy"):
+                    sha256 = self.file_stager.stage_into(src, dst, summary)
+                self._image_file_staged(assay_identifier, src, dst, image, sha256)
+
+        def _images_of_assay():
+            while True:
+                item = pipeline.get(metadata_queue)
+                if item is _END_OF_ASSAY:
+                    return
+                yield item
+
+        def _write_metadata():
+            while True:
+                item = pipeline.get(metadata_queue)
+                if item is END_OF_STREAM:
+                    return
+                self._write_original_metadata(item, _images_of_assay())
+
+        def _write_sheets():
+            while True:
+                item = pipeline.get(sheet_queue)
+                if item is END_OF_STREAM:
+                    return
+                self._add_isa_assay_sheet(item)
+
+        pipeline.stage("images", _iterate_images)
+        pipeline.stage("copy", _copy, workers=copy_workers)
+        pipeline.stage("metadata", _write_metadata)
+        pipeline.stage("sheets", _write_sheets)
+        try:
+            pipeline.join()
+        finally:
+            summary.seconds = time.perf_counter() - start
+            self.staging_summary.update(summary)
+            self.manifest.save()
+
+    def _add_data_for_assay(self, assay_identifier):
+        self._add_image_data_for_assay(assay_identifier)
+        self._add_original_metadata_for_assay(assay_identifier)
+        self._add_isa_assay_sheet(assay_identifier)
+
+    @contextmanager
+    def _original_metadata_fetcher(self):
+        """Provides self.metadata_fetcher within the context. A fetcher
+        that has been set from outside (e.g. shared by a batch) is
+        used as is."""
+        fetcher = self._open_metadata_fetcher()
+        try:
+            yield self.metadata_fetcher
+        finally:
+            self._close_metadata_fetcher(fetcher)
+
+    def _open_metadata_fetcher(self):
+        """Sets self.metadata_fetcher if it has not been set from
+        outside. Returns the fetcher that has been created, None if the
+        fetcher from outside is used."""
+        if self.metadata_fetcher is not None:
+            return None
+        fetcher = OriginalMetadataFetcher(
+            self.conn,
+            max_workers=self.metadata_workers,
+            instrumentation=self.instrumentation,
+        )
+        self.metadata_fetcher = fetcher
+        return fetcher
+
+    def _close_metadata_fetcher(self, fetcher):
+        """Closes a fetcher returned by _open_metadata_fetcher. Waits
+        for its workers and closes their connections."""
+        if fetcher is None:
+            return
+        self.metadata_fetcher = None
+        fetcher.close()
 
     def initialize_arc_repo(self):
         os.makedirs(self.path_to_arc_repo, exist_ok=False)
 
-        subprocess.run(["arc", "init"], cwd=self.path_to_arc_repo)
-        ome_project = self.obj
-        mapper = IsaInvestigationMapper(ome_project)
-        for command in mapper.arccommander_commands():
-            if len(command) > 0:
-                subprocess.run(command, cwd=self.path_to_arc_repo)
+        self.isa_backend.init_arc()
+        self._create_investigation()
+
+    def _create_investigation(self):
+        with self.instrumentation.span("investigation"):
+            mapper = IsaInvestigationMapper(
+                self.obj,
+                snapshot=self.snapshot,
+                instrumentation=self.instrumentation,
+                experimenters=self.experimenters,
+            )
+            self._run_isa_commands(mapper.arccommander_commands())
 
     def _create_study(self):
         ome_project = self.obj
-
-        mapper = IsaStudyMapper(ome_project)
-        for command in mapper.arccommander_commands():
-            if len(command) > 0:
-                subprocess.run(command, cwd=self.path_to_arc_repo)
+        snapshot = self.project_snapshot()
+
+        with self.instrumentation.span("study"):
+            mapper = IsaStudyMapper(
+                ome_project,
+                snapshot=snapshot,
+                instrumentation=self.instrumentation,
+                experimenters=self.experimenters,
+            )
+            self._run_isa_commands(
+                self._isa_object_commands(
+                    "studies",
+                    ome_project,
+                    mapper.study_identifier(),
+                    mapper.arccommander_commands(),
+                )
+            )
         self.study_mapper = mapper
 
-    def _create_assays(self):
-        ome_project = self.obj
-        project_id = ome_project.getId()
-
-        def _filename_for_image(image_id):
-            return self.image_filenames_mapping[f"Image:{image_id}"].name
-
-        ome_datasets = self.conn.getObjects(
-            "Dataset", opts={"project": project_id}
+    def _isa_object_commands(self, kind, ome_object, identifier, commands):
+        """Returns the commands to create a study or assay, the commands
+        to update it if its ISA metadata changed since the last pack and
+        none if it is up to date."""
+        status = self.manifest.isa_object_status(
+            kind, ome_object, identifier, commands
         )
-        for dataset in ome_datasets:
-            mapper = IsaAssayMapper(
-                dataset,
-                study_identifier=self.study_mapper.study_identifier(),
-                image_filename_getter=_filename_for_image,
-            )
-            self.isa_assay_mappers.append(mapper)
-            for command in mapper.arccommander_commands():
-                if len(command) > 0:
-                    subprocess.run(command, cwd=self.path_to_arc_repo)
+        if status == "new":
+            return commands
+        if status == "changed":
+            return [
+                update_command(command) for command in commands if len(command) > 0
+            ]
+        return []
+
+    def _create_assays(self):
+        snapshot = self.project_snapshot()
+        self.assay_contexts = {}
+        self.isa_assay_mappers = []
+        self.ome_dataset_for_isa_assay = {}
 
-            self.ome_dataset_for_isa_assay[mapper.assay_identifier()] = dataset
+        with self.instrumentation.span("assays"):
+            for dataset in snapshot.datasets:
+                mapper = IsaAssayMapper(
+                    dataset,
+                    study_identifier=self.study_mapper.study_identifier(),
+                    image_filename_getter=self.image_filename,
+                    snapshot=snapshot,
+                    instrumentation=self.instrumentation,
+                    experimenters=self.experimenters,
+                )
+                self._run_isa_commands(
+                    self._isa_object_commands(
+                        "assays",
+                        dataset,
+                        mapper.assay_identifier(),
+                        mapper.arccommander_commands(),
+                    )
+                )
+
+                context = AssayContext(mapper, snapshot.images(dataset.getId()))
+                self.assay_contexts[context.assay_identifier] = context
+                self.isa_assay_mappers.append(mapper)
+                self.ome_dataset_for_isa_assay[context.assay_identifier] = dataset
 
     def isa_assay_filename(self, assay_identifier):
         assert assay_identifier in self.assay_identifiers
@@ -160,70 +581,233 @@ class ArcPacker(object):
             return rel_path
         return self.path_to_image_files / rel_path
 
-    def _add_image_data_for_assay(self, assay_identifier):
-        # ome_dataset_id = self.assay_identifiers[assay_identifier]
-
-        assert assay_identifier in self.ome_dataset_for_isa_assay
+    def _image_files_to_stage(self, assay_identifier):
+        """Returns (src, dst, image) of the image files of an assay that
+        are not up to date in the ARC."""
+        assert assay_identifier in self.assay_contexts
         dest_image_folder = (
             self.path_to_arc_repo / f"assays/{assay_identifier}/dataset"
         )
-        ds = self.ome_dataset_for_isa_assay[assay_identifier]
+        context = self.assay_contexts[assay_identifier]
 
-        for image in self.conn.getObjects(
-            "Image", opts={"dataset": ds.getId()}
-        ):
+        files = {}
+        for image in context.images:
             img_filepath_abs = self.image_filename(image.getId(), abspath=True)
             img_fileppath_rel = self.image_filename(
                 image.getId(), abspath=False
             )
             target_path = dest_image_folder / img_fileppath_rel.name
-            os.makedirs(target_path.parent, exist_ok=True)
-            shutil.copy2(img_filepath_abs, target_path)
-
-    def isa_assay_tables(self, assay_identifier):
-        dataset = self.ome_dataset_for_isa_assay[assay_identifier]
-        assay_mapper = IsaAssayMapper(
-            dataset, self.study_mapper.study_identifier(), self.image_filename
+            # images of a multi-series file share the same file
+            if target_path in files:
+                continue
+            files[target_path] = (img_filepath_abs, image)
+
+        return [
+            (src, target_path, image)
+            for target_path, (src, image) in files.items()
+            if not self.manifest.is_file_current(
+                target_path.relative_to(self.path_to_arc_repo),
+                image,
+                self.path_to_arc_repo,
+            )
+        ]
+
+    def _set_image_files_total(self, assay_identifier, files):
+        """Sets the image files (src, dst, image) of an assay that are
+        staged as progress total."""
+        self.progress.set_total(
+            "images",
+            assay_identifier,
+            len(files),
+            sum(os.path.getsize(src) for src, _, _ in files),
         )
-        tables = []
-        images = self.conn.getObjects(
-            "Image", opts={"dataset": dataset.getId()}
+
+    def _image_file_staged(self, assay_identifier, src, dst, image, sha256):
+        """Records an image file that has been staged from src to dst
+        with the sha256 computed while staging."""
+        # dst may be an lfs pointer
+        nbytes = os.path.getsize(src)
+        self.manifest.record_file(
+            dst.relative_to(self.path_to_arc_repo),
+            image,
+            self.path_to_arc_repo,
+            sha256=sha256,
         )
-        images = [im for im in images]
-        for sheet_mapper in assay_mapper.isa_sheets:
-            tables.append(sheet_mapper.tbl(self.conn))
-        return tables
+        self.instrumentation.count(FILES_COPIED)
+        self.instrumentation.count(BYTES_COPIED, nbytes)
+        self.progress.advance("images", assay_identifier, nbytes=nbytes)
 
-    def _add_isa_assay_sheets(self):
-        for assay_identifier in self.ome_dataset_for_isa_assay.keys():
-            isa_assay_file = (
-                self.path_to_arc_repo
-                / f"assays/{assay_identifier}/isa.assay.xlsx"
+    def _add_image_data_for_assay(self, assay_identifier):
+        files = self._image_files_to_stage(assay_identifier)
+        self._set_image_files_total(assay_identifier, files)
+        images = {dst: image for _, dst, image in files}
+
+        def _staged(src, dst, sha256):
+            self._image_file_staged(assay_identifier, src, dst, images[dst], sha256)
+
+        with self.instrumentation.span("image copy"):
+            summary = self.file_stager.stage(
+                [(src, dst) for src, dst, _ in files], callback=_staged
             )
-            with pd.ExcelWriter(
-                isa_assay_file, engine="openpyxl", mode="a"
-            ) as writer:
-                tables = self.isa_assay_tables(assay_identifier)
-                for table in tables:
-                    table.to_excel(writer, sheet_name=table.name, index=False)
+        self.staging_summary.update(summary)
+        self.manifest.save()
+        return summary
 
-    def _add_original_metadata_for_assay(self, assay_identifier):
-        """writes json files with original metadata"""
+    def _isa_sheet_mappers(self, assay_identifier):
+        return self.assay_contexts[assay_identifier].mapper.isa_sheets
 
-        dataset = self.ome_dataset_for_isa_assay[assay_identifier]
-        images = self.conn.getObjects(
-            "Image", opts={"dataset": dataset.getId()}
+    def isa_assay_sheet_tables(self, assay_identifier):
+        """Returns the assay sheets of an assay as IsaTable."""
+        return self.assay_contexts[assay_identifier].sheet_tables(self.conn)
+
+    def isa_assay_tables(self, assay_identifier):
+        """Returns the assay sheets of an assay as pandas DataFrames."""
+        return [
+            table.to_pandas()
+            for table in self.isa_assay_sheet_tables(assay_identifier)
+        ]
+
+    def _add_isa_assay_sheets(self):
+        for assay_identifier in self.assay_contexts:
+            self._add_isa_assay_sheet(assay_identifier)
+
+    def _add_isa_assay_sheet(self, assay_identifier):
+        context = self.assay_contexts[assay_identifier]
+        fingerprint = self.manifest.dataset_fingerprint(
+            context.dataset, context.images
+        )
+        if self.manifest.are_sheets_current(assay_identifier, fingerprint):
+            self.progress.set_total("sheets", assay_identifier, 0)
+            return
+        isa_assay_file = (
+            self.path_to_arc_repo / f"assays/{assay_identifier}/isa.assay.xlsx"
+        )
+        with self.instrumentation.span("sheets"):
+            write_sheets_streaming(isa_assay_file, context.sheet_tables(self.conn))
+        self.manifest.record_sheets(assay_identifier, fingerprint)
+        self.manifest.save()
+        self.progress.advance("sheets", assay_identifier)
+
+    def _add_original_metadata_for_assay(self, assay_identifier):
+        """writes the original metadata of the images to protocols/"""
+        images = self._images_without_metadata(assay_identifier)
+        self.progress.set_total("metadata", assay_identifier, len(images))
+        self._write_original_metadata(assay_identifier, images)
+        self.manifest.save()
+
+    def _metadata_relpath(self, assay_identifier, image=None):
+        image_id = None if image is None else image.getId()
+        return Path(
+            f"assays/{assay_identifier}/protocols/"
+            + self.metadata_format.filename(image_id)
         )
-        for image in images:
-            metadata = original_image_metadata(image)
+
+    def _metadata_fingerprint(self, assay_identifier):
+        context = self.assay_contexts[assay_identifier]
+        return self.manifest.dataset_fingerprint(context.dataset, context.images)
+
+    def _images_without_metadata(self, assay_identifier):
+        """Returns the images of an assay whose original metadata has to
+        be written. A file with the metadata of all images is written
+        again for all images if any of them changed."""
+        context = self.assay_contexts[assay_identifier]
+        if self.metadata_format.per_image:
+            global_prefix = (
+                self._metadata_relpath(assay_identifier).parent / "global_metadata_"
+            )
+            if self.manifest.changed_files(global_prefix, self.path_to_arc_repo):
+                # which images refer to a changed global metadata file is
+                # only known from their files, so all of them are rewritten
+                return list(context.images)
+            return [
+                image
+                for image in context.images
+                if not self.manifest.is_file_current(
+                    self._metadata_relpath(assay_identifier, image),
+                    image,
+                    self.path_to_arc_repo,
+                )
+            ]
+        relpath = self._metadata_relpath(assay_identifier)
+        writer = self.metadata_format.writer(self.path_to_arc_repo / relpath)
+        fingerprint = self._metadata_fingerprint(assay_identifier)
+        for path in [relpath] + [
+            relpath.parent / path.name for path in writer.other_paths
+        ]:
+            if not self.manifest.is_file_current(
+                path, context.dataset, self.path_to_arc_repo, fingerprint=fingerprint
+            ):
+                return list(context.images)
+        return []
+
+    def _original_metadata(self, fetcher, images):
+        """Yields (image, metadata, global metadata). metadata holds the
+        image id and filename and refers to the global metadata by its
+        digest."""
+        snapshot = self.project_snapshot()
+        for image, metadata in fetcher.fetch(images):
+            global_metadata = self.global_metadata_digests.split(
+                metadata, fileset_id=snapshot.fileset_id(image.getId())
+            )
             metadata["image_id"] = image.getId()
             metadata["image_filename"] = self.image_filename(
                 image.getId(), abspath=False
             ).name
-
-            savepath = self.path_to_arc_repo / (
-                f"assays/{assay_identifier}"
-                f"/protocols/ImageID{image.getId()}_metadata.json"
+            yield image, metadata, global_metadata
+
+    def _write_original_metadata(self, assay_identifier, images):
+        """Fetches and writes the original metadata of images, an
+        iterable that may be consumed lazily."""
+        with self._original_metadata_fetcher() as fetcher:
+            with self.instrumentation.span("original metadata"):
+                if self.metadata_format.per_image:
+                    self._write_original_metadata_files(
+                        assay_identifier, fetcher, images
+                    )
+                else:
+                    self._write_original_metadata_file(
+                        assay_identifier, fetcher, images
+                    )
+
+    def _write_original_metadata_files(self, assay_identifier, fetcher, images):
+        """writes one file per image"""
+        for image, metadata, global_metadata in self._original_metadata(
+            fetcher, images
+        ):
+            relpath = self._metadata_relpath(assay_identifier, image)
+            global_path = self.metadata_format.write_image_file(
+                self.path_to_arc_repo / relpath.parent, metadata, global_metadata
+            )
+            self.manifest.record_file(relpath, image, self.path_to_arc_repo)
+            if global_path is not None:
+                # the file of a digest does not change once recorded
+                global_relpath = relpath.parent / global_path.name
+                if not self.manifest.is_file_recorded(global_relpath):
+                    self.manifest.record_file(
+                        global_relpath, image, self.path_to_arc_repo
+                    )
+            self.progress.advance("metadata", assay_identifier)
+
+    def _write_original_metadata_file(self, assay_identifier, fetcher, images):
+        """writes one file for all images"""
+        results = self._original_metadata(fetcher, images)
+        first = next(results, None)
+        if first is None:
+            return
+        relpath = self._metadata_relpath(assay_identifier)
+        with self.metadata_format.writer(self.path_to_arc_repo / relpath) as writer:
+            writer.write(*first[1:])
+            self.progress.advance("metadata", assay_identifier)
+            for _, metadata, global_metadata in results:
+                writer.write(metadata, global_metadata)
+                self.progress.advance("metadata", assay_identifier)
+        fingerprint = self._metadata_fingerprint(assay_identifier)
+        for path in [relpath] + [
+            relpath.parent / path.name for path in writer.other_paths
+        ]:
+            self.manifest.record_file(
+                path,
+                self.assay_contexts[assay_identifier].dataset,
+                self.path_to_arc_repo,
+                fingerprint=fingerprint,
             )
-            with open(savepath, "w") as f:
-                json.dump(metadata, f, indent=4)
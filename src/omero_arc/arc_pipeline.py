@@ -0,0 +1,79 @@
+import queue
+import threading
+
+# items in flight between two stages
+PIPELINE_QUEUE_SIZE = 64
+
+# seconds between checks whether another stage failed
+_POLL_SECONDS = 0.1
+
+# put into a queue to tell the consuming stage that no items follow
+END_OF_STREAM = object()
+
+
+class PipelineAborted(Exception):
+    """Raised in a stage when another stage has failed."""
+
+
+class Pipeline:
+    """Stages running in threads, connected by bounded queues.
+
+    Stages put items into queues created with queue() and get them with
+    get(). A put blocks while the queue is full, so that a fast stage
+    waits for the slower ones instead of buffering (backpressure). When
+    a stage raises, all other stages are aborted and join() raises the
+    first exception.
+    """
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._threads = []
+        self._errors = []
+        self._failed = threading.Event()
+
+    def queue(self):
+        return queue.Queue(maxsize=self.queue_size)
+
+    def put(self, q, item):
+        while True:
+            if self._failed.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, q):
+        while True:
+            if self._failed.is_set():
+                raise PipelineAborted()
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+    def stage(self, name, function, *args, workers=1):
+        """Runs function(*args) in workers threads."""
+
+        def _run():
+            try:
+                function(*args)
+            except PipelineAborted:
+                pass
+            except BaseException as e:
+                self._errors.append(e)
+                self._failed.set()
+
+        for i in range(workers):
+            thread = threading.Thread(
+                target=_run, name=f"{name}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        if len(self._errors) > 0:
+            raise self._errors[0]
@@ -0,0 +1,160 @@
+from array import array
+
+from omero_arc.arc_instrumentation import get_instrumentation
+from omero_arc.arc_snapshot import _chunks
+
+# pixels of all images of the datasets, as columns of one projection
+# query instead of loading a Pixels object per image
+PIXELS_QUERY = (
+    "select l.parent.id, i.id, "
+    "p.sizeX, p.sizeY, p.sizeZ, p.sizeC, p.sizeT, "
+    "p.physicalSizeX.value, p.physicalSizeY.value, p.physicalSizeZ.value, "
+    "p.physicalSizeX.unit, pt.value "
+    "from DatasetImageLink l "
+    "join l.child i "
+    "join i.pixels p "
+    "join p.pixelsType pt "
+    "where l.parent.id in (:ids) "
+    "order by i.id"
+)
+
+# columns of PixelsTable, in the order of the query
+SIZE_COLUMNS = ("size_x", "size_y", "size_z", "size_c", "size_t")
+PHYSICAL_SIZE_COLUMNS = ("physical_size_x", "physical_size_y", "physical_size_z")
+
+
+def _unit_name(unit):
+    if unit is None:
+        return None
+    return str(unit)
+
+
+class PixelsTable:
+    """Pixels of the images of a dataset in columns.
+
+    Sizes are stored in integer arrays (0 for unknown), physical sizes
+    in float arrays (nan for unknown), the unit of physical size X and
+    the pixel type in lists. Rows are ordered like the images they were
+    added for; values(image_id) returns the row of an image.
+    """
+
+    __slots__ = ("image_ids", "columns", "units", "pixel_types", "_rows")
+
+    def __init__(self):
+        self.image_ids = array("q")
+        self.columns = {name: array("q") for name in SIZE_COLUMNS}
+        self.columns.update({name: array("d") for name in PHYSICAL_SIZE_COLUMNS})
+        self.units = []
+        self.pixel_types = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __contains__(self, image_id):
+        return image_id in self._rows
+
+    def append(self, image_id, sizes, physical_sizes, unit, pixel_type):
+        """Adds the pixels of an image. sizes are x, y, z, c, t,
+        physical_sizes x, y, z."""
+        self._rows[image_id] = len(self.image_ids)
+        self.image_ids.append(image_id)
+        for name, value in zip(SIZE_COLUMNS, sizes):
+            self.columns[name].append(0 if value is None else value)
+        for name, value in zip(PHYSICAL_SIZE_COLUMNS, physical_sizes):
+            self.columns[name].append(float("nan") if value is None else value)
+        self.units.append(_unit_name(unit))
+        self.pixel_types.append(pixel_type)
+
+    def values(self, image_id):
+        """Returns a dict column -> value for an image. Unknown values
+        are None."""
+        row = self._rows[image_id]
+        values = {}
+        for name in SIZE_COLUMNS:
+            value = self.columns[name][row]
+            values[name] = value if value != 0 else None
+        for name in PHYSICAL_SIZE_COLUMNS:
+            value = self.columns[name][row]
+            values[name] = value if value == value else None
+        values["unit"] = self.units[row]
+        values["pixel_type"] = self.pixel_types[row]
+        return values
+
+    def column(self, name, image_ids):
+        """Returns the values of a column (or of "unit" or
+        "pixel_type") for images, in the order of image_ids. Unknown
+        values are None."""
+        rows = [self._rows[image_id] for image_id in image_ids]
+        if name == "unit":
+            return [self.units[row] for row in rows]
+        if name == "pixel_type":
+            return [self.pixel_types[row] for row in rows]
+        values = self.columns[name]
+        if name in SIZE_COLUMNS:
+            return [values[row] or None for row in rows]
+        return [values[row] if values[row] == values[row] else None for row in rows]
+
+    @classmethod
+    def concat(cls, tables):
+        """Returns a table with the rows of tables, which hold different
+        images."""
+        table = cls()
+        for other in tables:
+            offset = len(table.image_ids)
+            table._rows.update(
+                (image_id, offset + row) for image_id, row in other._rows.items()
+            )
+            table.image_ids.extend(other.image_ids)
+            for name, values in other.columns.items():
+                table.columns[name].extend(values)
+            table.units.extend(other.units)
+            table.pixel_types.extend(other.pixel_types)
+        return table
+
+    @classmethod
+    def from_images(cls, images):
+        """Creates the table from image wrappers with loaded pixels."""
+        table = cls()
+        for image in images:
+            unit = image.getPixelSizeX(units=True)
+            if unit is not None:
+                unit = unit.getUnit()
+            table.append(
+                image.getId(),
+                (
+                    image.getSizeX(),
+                    image.getSizeY(),
+                    image.getSizeZ(),
+                    image.getSizeC(),
+                    image.getSizeT(),
+                ),
+                (
+                    image.getPixelSizeX(),
+                    image.getPixelSizeY(),
+                    image.getPixelSizeZ(),
+                ),
+                unit,
+                image.getPixelsType(),
+            )
+        return table
+
+
+def load_pixels(conn, dataset_ids, instrumentation=None):
+    """Returns dataset id -> PixelsTable of all images of the datasets,
+    fetched with one projection query per chunk of datasets."""
+    from omero.rtypes import unwrap
+    from omero.sys import ParametersI
+
+    instrumentation = get_instrumentation(instrumentation)
+    qs = conn.getQueryService()
+    tables = {dataset_id: PixelsTable() for dataset_id in dataset_ids}
+    for chunk in _chunks(tables):
+        params = ParametersI()
+        params.addIds(chunk)
+        instrumentation.server_call("projection")
+        for row in qs.projection(PIXELS_QUERY, params, conn.SERVICE_OPTS):
+            row = unwrap(row)
+            dataset_id, image_id = row[0], row[1]
+            tables[dataset_id].append(image_id, row[2:7], row[7:10], row[10], row[11])
+    return tables
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+from omero_arc.arc_backend import command_workbooks, parse_arccommander_command
+
+
+# commands that create the objects other commands register into
+# must run first
+_COMMAND_RANK = {
+    ("investigation", "create"): 0,
+    ("study", "add"): 1,
+    ("assay", "add"): 2,
+}
+
+
+class IsaCommandPlan:
+    """Collects the ARCCommander commands of a whole pack before
+    they are executed.
+
+    Identical commands are only executed once and the commands are
+    ordered by their target isa file, so that backends can apply the
+    changes of each workbook in a single load/save cycle.
+    """
+
+    def __init__(self):
+        self.commands = []
+        self._seen = set()
+
+    def add(self, commands):
+        for command in commands:
+            if len(command) == 0:
+                continue
+            key = tuple(command)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.commands.append(list(command))
+
+    def __len__(self):
+        return len(self.commands)
+
+    def ordered_commands(self):
+        def _sort_key(command):
+            subcommand, _ = parse_arccommander_command(command)
+            return (_COMMAND_RANK.get(subcommand, 3), command_workbooks(command)[0])
+
+        # sorted is stable, registrations keep their original order
+        return sorted(self.commands, key=_sort_key)
+
+    def commands_by_workbook(self):
+        out = OrderedDict()
+        for command in self.ordered_commands():
+            out.setdefault(command_workbooks(command)[0], []).append(command)
+        return out
+
+    def execute(self, isa_backend):
+        isa_backend.run_batch(self.ordered_commands())
+
+    def describe(self, isa_backend):
+        """Returns a human readable summary of the plan and its
+        estimated cost."""
+        lines = ["ISA command plan:"]
+        for workbook, commands in self.commands_by_workbook().items():
+            lines.append(f"  {workbook} ({len(commands)} commands)")
+            for command in commands:
+                lines.append("    " + " ".join(str(arg) for arg in command))
+        cost = isa_backend.estimated_cost(self.ordered_commands())
+        lines.append(
+            f"{len(self.commands)} commands, "
+            f"{cost['processes']} processes, "
+            f"{cost['workbook_rewrites']} workbook load/save cycles"
+        )
+        return "\n".join(lines)
@@ -0,0 +1,266 @@
+import sys
+import threading
+import time
+from collections import namedtuple
+
+PROGRESS_STAGES = ("images", "metadata", "sheets")
+
+# stage: "start", one of PROGRESS_STAGES or "end"
+# assay_identifier: the assay of the finished item, None for start and end
+# completed, total: finished and total items of the stage in the whole
+#     pack (image files, images with original metadata, assay sheets)
+# bytes_completed, bytes_total: bytes of the image files
+# fraction: finished fraction of all work of the pack, 0 to 1
+# eta: estimated seconds until the pack is finished, None if unknown
+ProgressEvent = namedtuple(
+    "ProgressEvent",
+    [
+        "stage",
+        "assay_identifier",
+        "completed",
+        "total",
+        "bytes_completed",
+        "bytes_total",
+        "fraction",
+        "eta",
+    ],
+)
+
+
+class _AssayProgress:
+    def __init__(self, images=0, nbytes=0, metadata=0, sheets=0):
+        self.total = {"images": images, "metadata": metadata, "sheets": sheets}
+        self.completed = {stage: 0 for stage in PROGRESS_STAGES}
+        self.bytes_total = nbytes
+        self.bytes_completed = 0
+        self.first = None
+        self.last = None
+
+
+class PackProgress:
+    """Counts the work of a pack and publishes a ProgressEvent to all
+    callbacks for every finished item.
+
+    The totals of all assays are set with start() when the data export
+    begins, from the images of the project snapshot. Items that turn
+    out to be up to date are removed from the totals with set_total(),
+    so that they do not distort the throughput and the ETA.
+
+    Callbacks are called in the thread that finished the item, after
+    the counters have been released. They may be called from several
+    threads at once, and events of different threads may arrive out of
+    order.
+    """
+
+    def __init__(self, callbacks=None, clock=time.monotonic):
+        self.callbacks = list(callbacks or [])
+        self.clock = clock
+        self.assays = {}
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.RLock()
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def start(self, totals):
+        """totals: dict assay identifier -> dict with the number of
+        "images" (files), their "bytes" and the number of "metadata"
+        and "sheets" items to export."""
+        with self._lock:
+            self.assays = {
+                assay_identifier: _AssayProgress(
+                    total.get("images", 0),
+                    total.get("bytes", 0),
+                    total.get("metadata", 0),
+                    total.get("sheets", 0),
+                )
+                for assay_identifier, total in totals.items()
+            }
+            self.start_time = self.clock()
+            self.end_time = None
+            event = self._event("start", None)
+        self._publish(event)
+
+    def set_total(self, stage, assay_identifier, total, nbytes=None):
+        """Sets the items of a stage that are actually exported for an
+        assay, e.g. after skipping up to date files."""
+        with self._lock:
+            assay = self.assays.get(assay_identifier)
+            if assay is None:
+                return
+            if assay.first is None:
+                assay.first = self.clock()
+            assay.total[stage] = assay.completed[stage] + total
+            if nbytes is not None:
+                assay.bytes_total = assay.bytes_completed + nbytes
+
+    def advance(self, stage, assay_identifier, count=1, nbytes=0):
+        with self._lock:
+            assay = self.assays.get(assay_identifier)
+            if assay is None:
+                return
+            now = self.clock()
+            if assay.first is None:
+                assay.first = now
+            assay.last = now
+            assay.completed[stage] += count
+            assay.bytes_completed += nbytes
+            event = self._event(stage, assay_identifier)
+        self._publish(event)
+
+    def finish(self):
+        with self._lock:
+            self.end_time = self.clock()
+            event = self._event("end", None)
+        self._publish(event)
+
+    def _sum(self, stage):
+        completed = sum(a.completed[stage] for a in self.assays.values())
+        total = sum(a.total[stage] for a in self.assays.values())
+        return completed, total
+
+    def bytes(self):
+        return (
+            sum(a.bytes_completed for a in self.assays.values()),
+            sum(a.bytes_total for a in self.assays.values()),
+        )
+
+    def fraction(self):
+        """Returns the finished fraction of the pack. Each stage counts
+        equally, the image files by their bytes."""
+        with self._lock:
+            fractions = []
+            for stage in PROGRESS_STAGES:
+                completed, total = self._sum(stage)
+                if stage == "images":
+                    bytes_completed, bytes_total = self.bytes()
+                    if bytes_total > 0:
+                        completed, total = bytes_completed, bytes_total
+                if total > 0:
+                    fractions.append(min(completed / total, 1.0))
+            if len(fractions) == 0:
+                return 1.0
+            return sum(fractions) / len(fractions)
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.clock() if self.end_time is None else self.end_time
+        return end - self.start_time
+
+    def eta(self):
+        """Returns the estimated seconds until the pack is finished,
+        extrapolated from the throughput so far. None if nothing has
+        been finished yet."""
+        fraction = self.fraction()
+        if fraction >= 1.0:
+            return 0.0
+        if fraction == 0.0:
+            return None
+        return self.elapsed() * (1.0 - fraction) / fraction
+
+    def _event(self, stage, assay_identifier):
+        # called with the lock held
+        counted_stage = stage if stage in PROGRESS_STAGES else "images"
+        completed, total = self._sum(counted_stage)
+        bytes_completed, bytes_total = self.bytes()
+        return ProgressEvent(
+            stage,
+            assay_identifier,
+            completed,
+            total,
+            bytes_completed,
+            bytes_total,
+            self.fraction(),
+            self.eta(),
+        )
+
+    def _publish(self, event):
+        # without the lock, so that a slow callback (e.g. a terminal)
+        # does not block the threads that advance the progress
+        for callback in self.callbacks:
+            callback(event)
+
+    def summary(self):
+        """Returns a table of the exported items and the throughput per
+        assay (dataset)."""
+        lines = [
+            f"{'assay':<30}{'images':>8}{'MiB':>10}{'metadata':>10}"
+            f"{'sheets':>8}{'seconds':>10}{'MiB/s':>8}{'images/s':>10}"
+        ]
+        with self._lock:
+            for assay_identifier, assay in self.assays.items():
+                seconds = 0.0
+                if assay.last is not None:
+                    seconds = assay.last - assay.first
+                mib = assay.bytes_completed / 2**20
+                images = assay.completed["images"]
+                mib_per_second = mib / seconds if seconds > 0 else 0.0
+                images_per_second = images / seconds if seconds > 0 else 0.0
+                lines.append(
+                    f"{assay_identifier:<30}{images:>8}{mib:>10.1f}"
+                    f"{assay.completed['metadata']:>10}"
+                    f"{assay.completed['sheets']:>8}{seconds:>10.1f}"
+                    f"{mib_per_second:>8.1f}{images_per_second:>10.1f}"
+                )
+            lines.append(f"packed in {self.elapsed():.1f} s")
+        return "\n".join(lines)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressBar:
+    """Progress callback that draws a single line progress bar, e.g.
+    for the command line.
+
+    [#########-----------]  45% images 120/1000 1.2/3.4 GiB ETA 0:05:12
+    """
+
+    def __init__(self, stream=None, width=30, min_interval=0.2, clock=time.monotonic):
+        self.stream = sys.stderr if stream is None else stream
+        self.width = width
+        self.min_interval = min_interval
+        self.clock = clock
+        self._last = None
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        final = event.stage == "end"
+        # an event of another thread is being drawn, skip this one
+        if not self._lock.acquire(blocking=final):
+            return
+        try:
+            self._draw(event, final)
+        finally:
+            self._lock.release()
+
+    def _draw(self, event, final):
+        now = self.clock()
+        if not final and self._last is not None:
+            if now - self._last < self.min_interval:
+                return
+        self._last = now
+        filled = int(event.fraction * self.width)
+        bar = "#" * filled + "-" * (self.width - filled)
+        if event.stage in ("start", "images", "end"):
+            label = (
+                f"images {event.completed}/{event.total} "
+                f"{event.bytes_completed / 2**30:.1f}/"
+                f"{event.bytes_total / 2**30:.1f} GiB"
+            )
+        else:
+            label = f"{event.stage} {event.completed}/{event.total}"
+        line = (
+            f"\r[{bar}] {event.fraction * 100:>3.0f}% {label} "
+            f"ETA {format_seconds(event.eta)}"
+        )
+        self.stream.write(line.ljust(80))
+        if final:
+            self.stream.write("\n")
+        self.stream.flush()
@@ -0,0 +1,223 @@
+from collections import defaultdict, namedtuple
+
+from omero_arc.arc_instrumentation import get_instrumentation
+
+# ids per query, keeps the parameter lists of the queries bounded
+QUERY_CHUNK_SIZE = 1000
+
+DATASET_QUERY = (
+    "select d from Dataset d "
+    "join fetch d.details.owner "
+    "join fetch d.details.group "
+    "join fetch d.details.updateEvent "
+    "where d.id in "
+    "(select l.child.id from ProjectDatasetLink l where l.parent.id = :id) "
+    "order by d.id"
+)
+
+IMAGE_QUERY = (
+    "select distinct l from DatasetImageLink l "
+    "join fetch l.child i "
+    "join fetch i.details.owner "
+    "join fetch i.details.group "
+    "join fetch i.details.updateEvent "
+    "where l.parent.id in (:ids) "
+    "order by i.id"
+)
+
+ANNOTATION_QUERY = (
+    "select l from {}AnnotationLink l "
+    "join fetch l.child a "
+    "where l.parent.id in (:ids) "
+    "order by l.id"
+)
+
+
+# the classes ProjectSnapshot.load wraps the query results with, and the
+# model class of map annotations
+GatewayClasses = namedtuple(
+    "GatewayClasses",
+    ["dataset", "image", "map_annotation", "map_annotation_object"],
+)
+
+
+def gateway_classes():
+    """Returns the GatewayClasses of the BlitzGateway."""
+    from omero.gateway import (
+        DatasetWrapper,
+        ImageWrapper,
+        MapAnnotationWrapper,
+    )
+    from omero.model import MapAnnotationI
+
+    return GatewayClasses(
+        DatasetWrapper, ImageWrapper, MapAnnotationWrapper, MapAnnotationI
+    )
+
+
+def _chunks(ids, size=QUERY_CHUNK_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i: i + size]
+
+
+class ProjectSnapshot:
+    """In-memory model of an omero project with all of its datasets,
+    images, pixels and map annotations.
+
+    Pixels are kept as one PixelsTable per dataset (see arc_pixels)
+    rather than as Pixels objects of the image wrappers.
+
+    Use ProjectSnapshot.load to fetch the graph with a few joined
+    HQL queries instead of one server round trip per object.
+    """
+
+    def __init__(
+        self, project, datasets, images, annotations, pixels=None, filesets=None
+    ):
+        """
+        * project: the omero project (BlitzGateway wrapper)
+        * datasets: list of dataset wrappers
+        * images: dict dataset id -> list of image wrappers
+        * annotations: dict (OMERO_CLASS, object id) -> list of map
+            annotation wrappers
+        * pixels: dict dataset id -> PixelsTable. If None, the tables
+            are created from the image wrappers on first access.
+        * filesets: dict image id -> fileset id
+        """
+        self.project = project
+        self.datasets = list(datasets)
+        self._images = images
+        self._annotations = annotations
+        self._pixels = {} if pixels is None else pixels
+        self._filesets = {} if filesets is None else filesets
+        self._image_by_id = {
+            image.getId(): image
+            for dataset_images in images.values()
+            for image in dataset_images
+        }
+
+    @classmethod
+    def load(cls, conn, project, instrumentation=None, classes=None):
+        """Loads the snapshot of project. classes are the GatewayClasses
+        to wrap the query results with, those of the BlitzGateway if
+        None."""
+        from omero.sys import ParametersI
+
+        from omero_arc.arc_pixels import load_pixels
+
+        instrumentation = get_instrumentation(instrumentation)
+        if classes is None:
+            classes = gateway_classes()
+        qs = conn.getQueryService()
+
+        def _find_all(query, ids):
+            out = []
+            for chunk in _chunks(ids):
+                params = ParametersI()
+                params.addIds(chunk)
+                instrumentation.server_call("findAllByQuery")
+                out.extend(qs.findAllByQuery(query, params, conn.SERVICE_OPTS))
+            return out
+
+        params = ParametersI()
+        params.addId(project.getId())
+        instrumentation.server_call("findAllByQuery")
+        datasets = [
+            classes.dataset(conn, obj)
+            for obj in qs.findAllByQuery(DATASET_QUERY, params, conn.SERVICE_OPTS)
+        ]
+        dataset_ids = [dataset.getId() for dataset in datasets]
+
+        images = {dataset_id: [] for dataset_id in dataset_ids}
+        image_wrappers = {}
+        filesets = {}
+        for link in _find_all(IMAGE_QUERY, dataset_ids):
+            image_obj = link.getChild()
+            image_id = image_obj.getId().getValue()
+            if image_id not in image_wrappers:
+                image_wrappers[image_id] = classes.image(conn, image_obj)
+                # unloaded, only the id is known
+                fileset = image_obj.getFileset()
+                if fileset is not None:
+                    filesets[image_id] = fileset.getId().getValue()
+            images[link.getParent().getId().getValue()].append(
+                image_wrappers[image_id]
+            )
+
+        annotations = defaultdict(list)
+        for omero_class, ids in [
+            ("Project", [project.getId()]),
+            ("Dataset", dataset_ids),
+            ("Image", list(image_wrappers.keys())),
+        ]:
+            query = ANNOTATION_QUERY.format(omero_class)
+            for link in _find_all(query, ids):
+                child = link.getChild()
+                if not isinstance(child, classes.map_annotation_object):
+                    continue
+                key = (omero_class, link.getParent().getId().getValue())
+                annotations[key].append(classes.map_annotation(conn, child))
+
+        pixels = load_pixels(conn, dataset_ids, instrumentation=instrumentation)
+
+        return cls(
+            project,
+            datasets,
+            images,
+            dict(annotations),
+            pixels=pixels,
+            filesets=filesets,
+        )
+
+    def dataset(self, dataset_id):
+        for dataset in self.datasets:
+            if dataset.getId() == dataset_id:
+                return dataset
+        raise KeyError(dataset_id)
+
+    def images(self, dataset_id):
+        """Returns all images of a dataset, ordered by id."""
+        return self._images.get(dataset_id, [])
+
+    def pixels(self, dataset_id):
+        """Returns the PixelsTable of the images of a dataset."""
+        if dataset_id not in self._pixels:
+            from omero_arc.arc_pixels import PixelsTable
+
+            self._pixels[dataset_id] = PixelsTable.from_images(
+                self.images(dataset_id)
+            )
+        return self._pixels[dataset_id]
+
+    def fileset_id(self, image_id):
+        """Returns the id of the fileset of an image, None if unknown."""
+        return self._filesets.get(image_id)
+
+    def image(self, image_id):
+        return self._image_by_id[image_id]
+
+    def all_images(self):
+        return list(self._image_by_id.values())
+
+    def annotations(self, ome_object):
+        """Returns the map annotations of a project, dataset or image.
+
+        Objects that are not part of the snapshot are queried from
+        the server.
+        """
+        key = (ome_object.OMERO_CLASS, ome_object.getId())
+        if key in self._annotations:
+            return self._annotations[key]
+        if self._contains(*key):
+            return []
+        return [a for a in ome_object.listAnnotations()]
+
+    def _contains(self, omero_class, object_id):
+        if omero_class == "Project":
+            return object_id == self.project.getId()
+        if omero_class == "Dataset":
+            return object_id in self._images
+        if omero_class == "Image":
+            return object_id in self._image_by_id
+        return False
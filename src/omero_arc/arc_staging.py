@@ -0,0 +1,266 @@
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from omero_arc.arc_checksums import sha256_file
+
+# ioctl request code to clone a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+STAGING_STRATEGIES = ("hardlink", "reflink", "copy")
+
+# errors that tell that a strategy is not available for a file pair
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EPERM,
+    errno.ENOTTY,
+    errno.EMLINK,
+}
+
+
+class StrategyNotSupported(Exception):
+    pass
+
+
+def unique_destinations(files):
+    """Returns the (src, dst) pairs of files without repeated pairs,
+    e.g. the file of a multi-series image that is listed for every
+    series. Raises ValueError if different sources have the same
+    destination."""
+    sources = {}
+    pairs = []
+    for src, dst in files:
+        key = os.path.abspath(dst)
+        if key in sources:
+            if os.path.abspath(sources[key]) != os.path.abspath(src):
+                raise ValueError(
+                    f"{src} and {sources[key]} are both staged to {dst}."
+                )
+            continue
+        sources[key] = src
+        pairs.append((src, dst))
+    return pairs
+
+
+class StagingSummary:
+    """Counts files and bytes staged per strategy."""
+
+    def __init__(self):
+        self.files = {strategy: 0 for strategy in STAGING_STRATEGIES}
+        self.bytes = {strategy: 0 for strategy in STAGING_STRATEGIES}
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, strategy, nbytes):
+        with self._lock:
+            self.files[strategy] += 1
+            self.bytes[strategy] += nbytes
+
+    def update(self, other):
+        with self._lock:
+            for strategy in STAGING_STRATEGIES:
+                self.files[strategy] += other.files[strategy]
+                self.bytes[strategy] += other.bytes[strategy]
+            self.seconds += other.seconds
+
+    def total_bytes(self):
+        return sum(self.bytes.values())
+
+    def throughput(self):
+        """Staged bytes per second."""
+        if self.seconds == 0:
+            return 0.0
+        return self.total_bytes() / self.seconds
+
+    def __str__(self):
+        lines = [f"{'strategy':<10}{'files':>8}{'MiB':>12}"]
+        for strategy in STAGING_STRATEGIES:
+            mib = self.bytes[strategy] / 2**20
+            lines.append(f"{strategy:<10}{self.files[strategy]:>8}{mib:>12.1f}")
+        lines.append(
+            f"staged {self.total_bytes() / 2**20:.1f} MiB in {self.seconds:.1f} s "
+            f"({self.throughput() / 2**20:.1f} MiB/s)"
+        )
+        return "\n".join(lines)
+
+
+def _raise_if_unsupported(e):
+    if e.errno in _UNSUPPORTED_ERRNOS:
+        raise StrategyNotSupported(str(e)) from e
+    raise e
+
+
+def hardlink(src, dst):
+    if os.stat(src).st_dev != os.stat(os.path.dirname(dst)).st_dev:
+        raise StrategyNotSupported("source and destination on different devices")
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        _raise_if_unsupported(e)
+
+
+def reflink(src, dst):
+    """Clones src with FICLONE or lets the kernel copy it with
+    copy_file_range (no round trip of the data through user space)."""
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+        if not hasattr(os, "copy_file_range"):
+            raise StrategyNotSupported("copy_file_range not available")
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            try:
+                copied = os.copy_file_range(
+                    fsrc.fileno(), fdst.fileno(), min(remaining, 2**30)
+                )
+            except OSError as e:
+                _raise_if_unsupported(e)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def copy_chunked(src, dst, chunk_size=8 * 2**20, hasher=None):
+    """Copies src to dst. If hasher is given, it is updated with the
+    copied data, so that the checksum needs no second read."""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        while True:
+            n = fsrc.readinto(buffer)
+            if n == 0:
+                break
+            if hasher is not None:
+                hasher.update(view[:n])
+            fdst.write(view[:n])
+
+
+_STRATEGY_FUNCTIONS = {
+    "hardlink": hardlink,
+    "reflink": reflink,
+    "copy": copy_chunked,
+}
+
+
+class FileStager:
+    """Stages files into an ARC.
+
+    Every file is staged with the first strategy of strategies that
+    works for it:
+
+    * hardlink: if source and destination are on the same file system.
+    * reflink: clone (copy on write) or in-kernel copy_file_range.
+    * copy: chunked copy.
+
+    Files are staged concurrently on a thread pool with max_workers
+    threads.
+
+    The sha256 of every file is computed while it is staged: copied
+    files are hashed in the copy loop, hardlinked and reflinked files
+    (which share their data with the source) by reading the source.
+
+    With a store (see omero_arc.arc_git_stores), files are staged into
+    the object store of git-lfs or git-annex, and only a reference is
+    written to the destination.
+    """
+
+    def __init__(self, max_workers=4, strategies=STAGING_STRATEGIES, store=None):
+        for strategy in strategies:
+            if strategy not in _STRATEGY_FUNCTIONS:
+                raise ValueError(
+                    f"Unknown staging strategy {strategy}. "
+                    f"Choose from {', '.join(STAGING_STRATEGIES)}."
+                )
+        self.max_workers = max_workers
+        self.store = store
+        self.strategies = list(strategies)
+        if "copy" not in self.strategies:
+            self.strategies.append("copy")
+
+    def stage_file(self, src, dst, hasher=None):
+        """Stages a single file and returns the strategy used. If hasher
+        is given, it is updated with the content of the file.
+
+        The file is staged to a temporary name next to dst and then
+        replaced into place, so that dst is never missing or partially
+        written."""
+        tmp_dst = f"{dst}.{uuid.uuid4().hex}.tmp"
+        try:
+            for strategy in self.strategies:
+                if os.path.lexists(tmp_dst):
+                    os.remove(tmp_dst)
+                try:
+                    if strategy == "copy":
+                        copy_chunked(src, tmp_dst, hasher=hasher)
+                    else:
+                        _STRATEGY_FUNCTIONS[strategy](src, tmp_dst)
+                except StrategyNotSupported:
+                    continue
+                if strategy != "hardlink":
+                    shutil.copystat(src, tmp_dst)
+                if hasher is not None and strategy != "copy":
+                    sha256_file(src, hasher=hasher)
+                os.replace(tmp_dst, dst)
+                return strategy
+        finally:
+            if os.path.lexists(tmp_dst):
+                os.remove(tmp_dst)
+        raise RuntimeError(f"could not stage {src}")
+
+    def stage_into(self, src, dst, summary):
+        """Stages a single file, creating the folder of dst, adds it
+        to summary and returns its sha256."""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        hasher = hashlib.sha256()
+        if self.store is None:
+            strategy = self.stage_file(src, dst, hasher=hasher)
+            summary.add(strategy, os.path.getsize(dst))
+            return hasher.hexdigest()
+        tmp_path = self.store.tmp_path()
+        strategy = self.stage_file(src, tmp_path, hasher=hasher)
+        summary.add(strategy, os.path.getsize(tmp_path))
+        self.store.add(tmp_path, dst, hasher.hexdigest())
+        return hasher.hexdigest()
+
+    def stage(self, files, callback=None):
+        """Stages (src, dst) pairs and returns a StagingSummary. Pairs
+        with the same destination are staged once, see
+        unique_destinations.
+
+        callback(src, dst, sha256) is called in the staging thread after
+        each file."""
+        summary = StagingSummary()
+        start = time.perf_counter()
+        files = unique_destinations(files)
+
+        def _stage(pair):
+            src, dst = pair
+            sha256 = self.stage_into(src, dst, summary)
+            if callback is not None:
+                callback(src, dst, sha256)
+
+        if self.max_workers <= 1:
+            for pair in files:
+                _stage(pair)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # consume results to raise exceptions of workers
+                for _ in executor.map(_stage, files):
+                    pass
+        summary.seconds = time.perf_counter() - start
+        return summary
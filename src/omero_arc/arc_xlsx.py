@@ -0,0 +1,363 @@
+import datetime
+import os
+from pathlib import Path
+
+import openpyxl
+
+from omero_arc.arc_model import IsaTable
+from omero_arc.arc_xlsx_package import replace_sheets
+
+
+INVESTIGATION_SECTIONS = {
+    "ONTOLOGY SOURCE REFERENCE": [
+        "Term Source Name",
+        "Term Source File",
+        "Term Source Version",
+        "Term Source Description",
+    ],
+    "INVESTIGATION": [
+        "Investigation Identifier",
+        "Investigation Title",
+        "Investigation Description",
+        "Investigation Submission Date",
+        "Investigation Public Release Date",
+    ],
+    "INVESTIGATION PUBLICATIONS": [
+        "Investigation Publication PubMed ID",
+        "Investigation Publication DOI",
+        "Investigation Publication Author List",
+        "Investigation Publication Title",
+        "Investigation Publication Status",
+        "Investigation Publication Status Term Accession Number",
+        "Investigation Publication Status Term Source REF",
+    ],
+    "INVESTIGATION CONTACTS": [
+        "Investigation Person Last Name",
+        "Investigation Person First Name",
+        "Investigation Person Mid Initials",
+        "Investigation Person Email",
+        "Investigation Person Phone",
+        "Investigation Person Fax",
+        "Investigation Person Address",
+        "Investigation Person Affiliation",
+        "Investigation Person Roles",
+        "Investigation Person Roles Term Accession Number",
+        "Investigation Person Roles Term Source REF",
+    ],
+}
+
+STUDY_SECTIONS = {
+    "STUDY": [
+        "Study Identifier",
+        "Study Title",
+        "Study Description",
+        "Study Submission Date",
+        "Study Public Release Date",
+        "Study File Name",
+    ],
+    "STUDY DESIGN DESCRIPTORS": [
+        "Study Design Type",
+        "Study Design Type Term Accession Number",
+        "Study Design Type Term Source REF",
+    ],
+    "STUDY PUBLICATIONS": [
+        "Study Publication PubMed ID",
+        "Study Publication DOI",
+        "Study Publication Author List",
+        "Study Publication Title",
+        "Study Publication Status",
+        "Study Publication Status Term Accession Number",
+        "Study Publication Status Term Source REF",
+    ],
+    "STUDY FACTORS": [
+        "Study Factor Name",
+        "Study Factor Type",
+        "Study Factor Type Term Accession Number",
+        "Study Factor Type Term Source REF",
+    ],
+    "STUDY ASSAYS": [
+        "Study Assay Measurement Type",
+        "Study Assay Measurement Type Term Accession Number",
+        "Study Assay Measurement Type Term Source REF",
+        "Study Assay Technology Type",
+        "Study Assay Technology Type Term Accession Number",
+        "Study Assay Technology Type Term Source REF",
+        "Study Assay Technology Platform",
+        "Study Assay File Name",
+    ],
+    "STUDY PROTOCOLS": [
+        "Study Protocol Name",
+        "Study Protocol Type",
+        "Study Protocol Type Term Accession Number",
+        "Study Protocol Type Term Source REF",
+        "Study Protocol Description",
+        "Study Protocol URI",
+        "Study Protocol Version",
+        "Study Protocol Parameters Name",
+        "Study Protocol Parameters Term Accession Number",
+        "Study Protocol Parameters Term Source REF",
+        "Study Protocol Components Name",
+        "Study Protocol Components Type",
+        "Study Protocol Components Type Term Accession Number",
+        "Study Protocol Components Type Term Source REF",
+    ],
+    "STUDY CONTACTS": [
+        "Study Person Last Name",
+        "Study Person First Name",
+        "Study Person Mid Initials",
+        "Study Person Email",
+        "Study Person Phone",
+        "Study Person Fax",
+        "Study Person Address",
+        "Study Person Affiliation",
+        "Study Person Roles",
+        "Study Person Roles Term Accession Number",
+        "Study Person Roles Term Source REF",
+    ],
+}
+
+ASSAY_SECTIONS = {
+    "ASSAY": [
+        "Measurement Type",
+        "Measurement Type Term Accession Number",
+        "Measurement Type Term Source REF",
+        "Technology Type",
+        "Technology Type Term Accession Number",
+        "Technology Type Term Source REF",
+        "Technology Platform",
+        "File Name",
+    ],
+    "ASSAY PERFORMERS": [
+        "Last Name",
+        "First Name",
+        "Mid Initials",
+        "Email",
+        "Phone",
+        "Fax",
+        "Address",
+        "Affiliation",
+        "Roles",
+        "Roles Term Accession Number",
+        "Roles Term Source REF",
+    ],
+}
+
+SECTION_NAMES = set(INVESTIGATION_SECTIONS) | set(STUDY_SECTIONS) | set(
+    ASSAY_SECTIONS
+)
+
+
+class IsaSection:
+    """A block of an ISA key-value sheet.
+
+    Every row holds one label followed by one value per registered item
+    (e.g. one column per publication or per contact).
+    """
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = list(labels)
+        self.columns = []
+
+    def _register_labels(self, values):
+        for label in values:
+            if label not in self.labels:
+                self.labels.append(label)
+
+    def set(self, values):
+        """Sets values of the first (and usually only) item."""
+        self._register_labels(values)
+        if len(self.columns) == 0:
+            self.columns.append({})
+        self.columns[0].update(values)
+
+    def append(self, values):
+        """Registers a new item, e.g. a person or a publication."""
+        self._register_labels(values)
+        self.columns.append(dict(values))
+
+    def update(self, key, values, overwrite=True):
+        """Sets values of the item whose values match key, registers a
+        new item if there is none. With overwrite=False, an existing
+        item is left as it is."""
+        for column in self.columns:
+            if all(column.get(label) == value for label, value in key.items()):
+                if overwrite:
+                    self._register_labels(values)
+                    column.update(values)
+                return
+        self.append(values)
+
+    def rows(self):
+        yield [self.name]
+        for label in self.labels:
+            yield [label] + [column.get(label) for column in self.columns]
+
+
+class IsaSheet:
+    """In-memory representation of an ISA key-value worksheet as written
+    by ARCCommander (isa.investigation.xlsx, isa.study.xlsx, and the
+    "Assay" sheet of isa.assay.xlsx).
+    """
+
+    def __init__(self, title, sections=None):
+        self.title = title
+        self.sections = sections if sections is not None else []
+
+    @classmethod
+    def new(cls, title, section_layout):
+        sections = [
+            IsaSection(name, labels) for name, labels in section_layout.items()
+        ]
+        return cls(title, sections)
+
+    @classmethod
+    def load(cls, path: Path, title):
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            if title not in wb.sheetnames:
+                return None
+            sheet = cls(title)
+            section = None
+            for row in wb[title].iter_rows(values_only=True):
+                if len(row) == 0 or row[0] is None:
+                    continue
+                label = str(row[0])
+                if label in SECTION_NAMES:
+                    section = IsaSection(label)
+                    sheet.sections.append(section)
+                    continue
+                if section is None:
+                    section = IsaSection(None)
+                    sheet.sections.append(section)
+                section.labels.append(label)
+                for i, value in enumerate(row[1:]):
+                    if value is None:
+                        continue
+                    while len(section.columns) <= i:
+                        section.columns.append({})
+                    section.columns[i][label] = value
+        finally:
+            wb.close()
+        return sheet
+
+    def section(self, name, block=None):
+        sections = self.sections if block is None else block
+        for section in sections:
+            if section.name == name:
+                return section
+        raise KeyError(name)
+
+    def study_blocks(self):
+        """Yields the sections of every study as a list of IsaSection."""
+        block = None
+        for section in self.sections:
+            if section.name == "STUDY":
+                if block is not None:
+                    yield block
+                block = []
+            if block is not None:
+                block.append(section)
+        if block is not None:
+            yield block
+
+    def study_block(self, study_identifier):
+        for block in self.study_blocks():
+            study = self.section("STUDY", block)
+            for column in study.columns:
+                if column.get("Study Identifier") == study_identifier:
+                    return block
+        return None
+
+    def add_study_block(self):
+        block = [IsaSection(name, labels) for name, labels in STUDY_SECTIONS.items()]
+        self.sections.extend(block)
+        return block
+
+    def rows(self):
+        for section in self.sections:
+            if section.name is None:
+                yield from list(section.rows())[1:]
+            else:
+                yield from section.rows()
+
+    def save(self, path: Path):
+        """Writes the sheet to path. Other sheets of an existing workbook
+        are kept, see write_sheets_streaming."""
+        write_rows_streaming(path, [(self.title, self.rows())])
+
+
+_CELL_TYPES = (str, int, float, bool, datetime.date, datetime.datetime)
+
+
+def _cell_value(value):
+    if value is None or isinstance(value, _CELL_TYPES):
+        return value
+    return str(value)
+
+
+def _table_sheet(table):
+    def _rows():
+        if len(table.columns) > 0:
+            yield table.columns
+        yield from table.rows()
+
+    return table.name, _rows()
+
+
+def _dict_sheet(title, rows):
+    def _rows():
+        columns = None
+        for row in rows:
+            if columns is None:
+                columns = list(row.keys())
+                yield columns
+            yield [row.get(column) for column in columns]
+
+    return title, _rows()
+
+
+def write_sheets_streaming(path: Path, sheets):
+    """Adds sheets to the workbook at path without loading the whole
+    workbook into memory.
+
+    sheets is an iterable of IsaTable or of (title, rows), where rows is
+    an iterable of dicts that map column names to values. Rows are
+    consumed lazily and written with an openpyxl write-only workbook.
+    The sheets are then copied into the package of the existing
+    workbook (see omero_arc.arc_xlsx_package), so that its other
+    sheets keep their styles, column widths, merged cells and tables.
+    Existing sheets with the same title are replaced.
+    """
+    write_rows_streaming(
+        path,
+        [
+            _table_sheet(sheet) if isinstance(sheet, IsaTable) else _dict_sheet(*sheet)
+            for sheet in sheets
+        ],
+    )
+
+
+def write_rows_streaming(path: Path, sheets):
+    """Like write_sheets_streaming for sheets given as (title, rows),
+    where rows is an iterable of lists of cell values."""
+    out = openpyxl.Workbook(write_only=True)
+    for title, rows in sheets:
+        ws = out.create_sheet(title)
+        for row in rows:
+            ws.append([_cell_value(value) for value in row])
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    if not path.exists():
+        out.save(tmp_path)
+        os.replace(tmp_path, path)
+        return
+    sheets_path = path.with_name(path.name + ".sheets.tmp")
+    try:
+        out.save(sheets_path)
+        replace_sheets(path, sheets_path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (sheets_path, tmp_path):
+            if leftover.exists():
+                os.remove(leftover)
@@ -0,0 +1,432 @@
+"""Replacing worksheets in the zip package of an xlsx file.
+
+openpyxl rewrites a whole workbook when it is saved and its read-only
+and write-only modes keep cell values only. To add sheets to a
+workbook that ARCCommander (or a user) created without losing cell
+styles, column widths, merged cells or tables, the sheets are written
+to a separate workbook and their worksheet parts are copied into the
+package of the existing workbook:
+
+* A sheet with the title of an existing sheet replaces the worksheet
+  part of that sheet, so that the sheet order and references to the
+  sheet by title stay valid. Parts referenced only by the old
+  worksheet (tables, drawings, ...) and the built-in defined names of
+  the sheet (print area, filters) are removed.
+* Other sheets are added behind the existing sheets.
+* The worksheets of the other sheets and all other parts are copied
+  unchanged. Only the workbook, its relationships, the content types
+  and the styles are parsed and written again.
+
+The cell formats of the new sheets (number formats of dates) are
+merged into the styles of the existing workbook; a format that exists
+already is reused, so that writing the same sheets again does not grow
+the styles.
+"""
+import io
+import posixpath
+import re
+import shutil
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_OFFICE_RELATIONSHIPS = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+
+CONTENT_TYPES_PART = "[Content_Types].xml"
+WORKSHEET_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+)
+STYLES_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"
+)
+OFFICE_DOCUMENT_REL_TYPE = f"{_OFFICE_RELATIONSHIPS}/officeDocument"
+WORKSHEET_REL_TYPE = f"{_OFFICE_RELATIONSHIPS}/worksheet"
+STYLES_REL_TYPE = f"{_OFFICE_RELATIONSHIPS}/styles"
+CALC_CHAIN_REL_TYPE = f"{_OFFICE_RELATIONSHIPS}/calcChain"
+
+# ids below are built-in number formats
+_FIRST_CUSTOM_NUMBER_FORMAT = 164
+_DEFAULT_XF_IDS = ("fontId", "fillId", "borderId", "xfId")
+
+# style attribute of the cells in worksheets written by openpyxl, which
+# writes the attributes in the order r, s, t and no formulas
+_CELL_STYLE = re.compile(rb'(<c r="[A-Z]+[0-9]+" s=")([0-9]+)(")')
+
+_CHUNK_SIZE = 2**20
+
+# ElementTree keeps namespace prefixes in a global registry
+_NAMESPACE_LOCK = threading.Lock()
+# stands in for the default namespace, see XmlPart.to_bytes
+_DEFAULT_PREFIX = "omeroarcdefault"
+
+
+def _main(tag):
+    return f"{{{MAIN_NS}}}{tag}"
+
+
+class XmlPart:
+    """A parsed xml part of a package that is written with the
+    namespace prefixes of the original part."""
+
+    def __init__(self, data):
+        self.namespaces = []
+        self.root = None
+        for event, item in ET.iterparse(io.BytesIO(data), events=("start-ns", "end")):
+            if event == "start-ns":
+                if item not in self.namespaces:
+                    self.namespaces.append(item)
+            else:
+                self.root = item
+
+    def _used_namespaces(self):
+        used = set()
+        for element in self.root.iter():
+            for name in [element.tag, *element.attrib]:
+                if name.startswith("{"):
+                    used.add(name[1:].split("}")[0])
+        return used
+
+    def to_bytes(self):
+        # ElementTree cannot write a default namespace next to attributes
+        # without namespace, it is written with a prefix that is removed
+        # afterwards. Declarations of unused prefixes are kept, they may
+        # be referenced by mc:Ignorable.
+        used = self._used_namespaces()
+        declarations = {}
+        with _NAMESPACE_LOCK:
+            for prefix, uri in self.namespaces:
+                if uri in used:
+                    if re.match(r"ns\d+$", prefix):
+                        # reserved by ElementTree, which picks another one
+                        continue
+                    ET.register_namespace(prefix or _DEFAULT_PREFIX, uri)
+                elif prefix != "":
+                    declarations[f"xmlns:{prefix}"] = uri
+            self.root.attrib.update(declarations)
+            try:
+                data = ET.tostring(self.root, encoding="UTF-8", xml_declaration=True)
+            finally:
+                for name in declarations:
+                    del self.root.attrib[name]
+        return (
+            data.replace(f"<{_DEFAULT_PREFIX}:".encode(), b"<")
+            .replace(f"</{_DEFAULT_PREFIX}:".encode(), b"</")
+            .replace(f"xmlns:{_DEFAULT_PREFIX}=".encode(), b"xmlns=")
+        )
+
+
+def rels_part(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, "_rels", f"{name}.rels")
+
+
+def _resolve(part, target):
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def _relationships(package, part):
+    """Returns the relationship elements of a part."""
+    path = rels_part(part)
+    if path not in package.namelist():
+        return []
+    return list(XmlPart(package.read(path)).root)
+
+
+def _internal_targets(package, part, rel_type=None):
+    return [
+        _resolve(part, rel.get("Target"))
+        for rel in _relationships(package, part)
+        if rel.get("TargetMode") != "External"
+        and (rel_type is None or rel.get("Type") == rel_type)
+    ]
+
+
+def _workbook_part(package):
+    targets = _internal_targets(package, "", OFFICE_DOCUMENT_REL_TYPE)
+    if len(targets) == 0:
+        raise ValueError("not an xlsx package")
+    return targets[0]
+
+
+def sheet_parts(package):
+    """Returns a list of (title, worksheet part) of an xlsx package in
+    the order of the sheets."""
+    workbook = _workbook_part(package)
+    targets = {
+        rel.get("Id"): _resolve(workbook, rel.get("Target"))
+        for rel in _relationships(package, workbook)
+    }
+    root = XmlPart(package.read(workbook)).root
+    return [
+        (sheet.get("name"), targets[sheet.get(f"{{{_OFFICE_RELATIONSHIPS}}}id")])
+        for sheet in root.iter(_main("sheet"))
+    ]
+
+
+class _Styles:
+    """Merges the cell formats of the new workbook into the styles part
+    of the existing workbook and maps their indexes.
+
+    Sheets written by openpyxl in write-only mode only format numbers
+    (e.g. dates), so only the number formats of the cell formats are
+    taken over.
+    """
+
+    def __init__(self, part, new_part):
+        self.part = part
+        self.mapping = {}
+        stylesheet = part.root
+        number_formats = stylesheet.find(_main("numFmts"))
+        if number_formats is None:
+            # numFmts is the first child of the style sheet
+            number_formats = ET.Element(_main("numFmts"))
+            stylesheet.insert(0, number_formats)
+        self._number_formats = number_formats
+        self._cell_xfs = stylesheet.find(_main("cellXfs"))
+        if self._cell_xfs is None:
+            raise ValueError("styles part without cell formats")
+
+        new_formats = {
+            number_format.get("numFmtId"): number_format.get("formatCode")
+            for number_format in new_part.root.iter(_main("numFmt"))
+        }
+        new_xfs = new_part.root.find(_main("cellXfs"))
+        for index, xf in enumerate([] if new_xfs is None else new_xfs):
+            if index == 0:
+                continue
+            number_format = xf.get("numFmtId", "0")
+            if number_format in new_formats:
+                number_format = self._number_format(new_formats[number_format])
+            self.mapping[index] = self._cell_xf(number_format)
+
+        if len(number_formats) == 0:
+            stylesheet.remove(number_formats)
+        number_formats.set("count", str(len(number_formats)))
+        self._cell_xfs.set("count", str(len(self._cell_xfs)))
+
+    def _number_format(self, format_code):
+        """Returns the id of a custom number format, which is added if
+        it does not exist."""
+        ids = [_FIRST_CUSTOM_NUMBER_FORMAT - 1]
+        for number_format in self._number_formats:
+            if number_format.get("formatCode") == format_code:
+                return number_format.get("numFmtId")
+            ids.append(int(number_format.get("numFmtId")))
+        number_format = str(max(ids) + 1)
+        ET.SubElement(
+            self._number_formats,
+            _main("numFmt"),
+            {"numFmtId": number_format, "formatCode": format_code},
+        )
+        return number_format
+
+    def _cell_xf(self, number_format):
+        """Returns the index of the cell format with a number format and
+        the default font, fill and border, which is added if it does
+        not exist."""
+        for index, xf in enumerate(self._cell_xfs):
+            if (
+                xf.get("numFmtId", "0") == number_format
+                and all(xf.get(key, "0") == "0" for key in _DEFAULT_XF_IDS)
+                and len(xf) == 0
+            ):
+                return index
+        ET.SubElement(
+            self._cell_xfs,
+            _main("xf"),
+            {
+                "numFmtId": number_format,
+                **{key: "0" for key in _DEFAULT_XF_IDS},
+                "applyNumberFormat": "1",
+            },
+        )
+        return len(self._cell_xfs) - 1
+
+
+def _copy_worksheet(source, out, part, style_mapping):
+    """Streams a worksheet part written by openpyxl and maps the style
+    indexes of its cells."""
+
+    def _map(match):
+        index = int(match.group(2))
+        return b"%s%d%s" % (
+            match.group(1),
+            style_mapping.get(index, index),
+            match.group(3),
+        )
+
+    with source as src, out.open(part, "w") as dst:
+        if all(index == target for index, target in style_mapping.items()):
+            shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+            return
+        pending = b""
+        for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+            data = pending + chunk
+            # keep an element that may be cut at the end of the chunk
+            cut = max(data.rfind(b"<"), 0)
+            data, pending = data[:cut], data[cut:]
+            dst.write(_CELL_STYLE.sub(_map, data))
+        dst.write(_CELL_STYLE.sub(_map, pending))
+
+
+class _Package:
+    """The package of the existing workbook with the parts that are
+    written again."""
+
+    def __init__(self, package):
+        self.package = package
+        self.workbook = _workbook_part(package)
+        self.parts = {
+            part: XmlPart(package.read(part))
+            for part in (self.workbook, rels_part(self.workbook), CONTENT_TYPES_PART)
+        }
+        self.removed = set()
+
+    @property
+    def workbook_root(self):
+        return self.parts[self.workbook].root
+
+    @property
+    def relationships(self):
+        return self.parts[rels_part(self.workbook)].root
+
+    @property
+    def content_types(self):
+        return self.parts[CONTENT_TYPES_PART].root
+
+    def add_part(self, part, rel_type, content_type):
+        """Adds a relationship of the workbook and the content type of a
+        part and returns the relationship id."""
+        rel_id = _unique_name("rId{}", {rel.get("Id") for rel in self.relationships})
+        ET.SubElement(
+            self.relationships,
+            f"{{{RELATIONSHIPS_NS}}}Relationship",
+            {
+                "Id": rel_id,
+                "Type": rel_type,
+                "Target": posixpath.relpath(part, posixpath.dirname(self.workbook)),
+            },
+        )
+        ET.SubElement(
+            self.content_types,
+            f"{{{CONTENT_TYPES_NS}}}Override",
+            {"PartName": "/" + part, "ContentType": content_type},
+        )
+        return rel_id
+
+    def remove_part(self, part):
+        self.removed.add(part)
+        for override in list(self.content_types):
+            if override.get("PartName") == "/" + part:
+                self.content_types.remove(override)
+        for rel in list(self.relationships):
+            if (
+                rel.get("TargetMode") != "External"
+                and _resolve(self.workbook, rel.get("Target")) == part
+            ):
+                self.relationships.remove(rel)
+
+    def add_sheet(self, title):
+        """Adds a sheet behind the existing sheets and returns the name
+        of its worksheet part."""
+        names = set(self.package.namelist()) | {
+            _resolve(self.workbook, rel.get("Target")) for rel in self.relationships
+        }
+        folder = posixpath.join(posixpath.dirname(self.workbook), "worksheets")
+        part = _unique_name(posixpath.join(folder, "sheet{}.xml"), names)
+        rel_id = self.add_part(part, WORKSHEET_REL_TYPE, WORKSHEET_CONTENT_TYPE)
+        sheets = self.workbook_root.find(_main("sheets"))
+        sheet_ids = [int(sheet.get("sheetId")) for sheet in sheets]
+        ET.SubElement(
+            sheets,
+            _main("sheet"),
+            {
+                "name": title,
+                "sheetId": str(max(sheet_ids + [0]) + 1),
+                f"{{{_OFFICE_RELATIONSHIPS}}}id": rel_id,
+            },
+        )
+        return part
+
+    def clear_sheet(self, title, part):
+        """Removes the parts that the worksheet part of a replaced sheet
+        refers to and the built-in defined names of the sheet."""
+        self.removed.add(rels_part(part))
+        for target in _internal_targets(self.package, part):
+            self.remove_part(target)
+            self.removed.add(rels_part(target))
+        defined_names = self.workbook_root.find(_main("definedNames"))
+        if defined_names is None:
+            return
+        sheets = self.workbook_root.iter(_main("sheet"))
+        titles = [sheet.get("name") for sheet in sheets]
+        sheet_index = str(titles.index(title))
+        for defined_name in list(defined_names):
+            if (
+                defined_name.get("name", "").startswith("_xlnm.")
+                and defined_name.get("localSheetId") == sheet_index
+            ):
+                defined_names.remove(defined_name)
+        if len(defined_names) == 0:
+            self.workbook_root.remove(defined_names)
+
+
+def replace_sheets(path, sheets_path, out_path):
+    """Writes the workbook at path with the sheets of the workbook at
+    sheets_path to out_path, see the module docstring."""
+    with zipfile.ZipFile(path) as old, zipfile.ZipFile(sheets_path) as new:
+        package = _Package(old)
+        old_sheets = dict(sheet_parts(old))
+
+        # worksheet part of the new package -> part in the output
+        worksheets = {}
+        for title, new_part in sheet_parts(new):
+            if title in old_sheets:
+                package.clear_sheet(title, old_sheets[title])
+                worksheets[new_part] = old_sheets[title]
+            else:
+                worksheets[new_part] = package.add_sheet(title)
+        if any(part in old_sheets.values() for part in worksheets.values()):
+            # Excel rebuilds the chain of formula cells
+            for target in _internal_targets(old, package.workbook, CALC_CHAIN_REL_TYPE):
+                package.remove_part(target)
+
+        style_mapping = {}
+        new_styles = _internal_targets(new, _workbook_part(new), STYLES_REL_TYPE)
+        old_styles = _internal_targets(old, package.workbook, STYLES_REL_TYPE)
+        if len(old_styles) > 0:
+            styles = _Styles(
+                XmlPart(old.read(old_styles[0])), XmlPart(new.read(new_styles[0]))
+            )
+            package.parts[old_styles[0]] = styles.part
+            style_mapping = styles.mapping
+        elif len(new_styles) > 0:
+            # the cells of the existing sheets are not styled
+            package.parts[new_styles[0]] = XmlPart(new.read(new_styles[0]))
+            package.add_part(new_styles[0], STYLES_REL_TYPE, STYLES_CONTENT_TYPE)
+
+        with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out:
+            skipped = package.removed | set(worksheets.values()) | set(package.parts)
+            for info in old.infolist():
+                if info.filename in skipped:
+                    continue
+                with old.open(info) as src, out.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+            for part, xml_part in package.parts.items():
+                out.writestr(part, xml_part.to_bytes())
+            for new_part, part in worksheets.items():
+                _copy_worksheet(new.open(new_part), out, part, style_mapping)
+
+
+def _unique_name(pattern, names):
+    i = 1
+    while pattern.format(i) in names:
+        i += 1
+    return pattern.format(i)
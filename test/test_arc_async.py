@@ -0,0 +1,96 @@
+import asyncio
+
+from abstract_arc_test import AbstractArcTest
+
+from omero_arc import ArcPacker, AsyncArcPacker
+
+import pytest
+
+
+class TestAsyncArcPacker(AbstractArcTest):
+    def test_async_pack_equals_pack(
+        self,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+        tmp_path,
+    ):
+        def _files(path):
+            return sorted(
+                p.relative_to(path)
+                for p in path.rglob("*")
+                if p.is_file() and ".git" not in p.parts
+            )
+
+        ArcPacker(
+            ome_object=project_czi,
+            destination_path=tmp_path / "arc_sync",
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+        ).pack()
+
+        packer = AsyncArcPacker(
+            project_czi,
+            tmp_path / "arc_async",
+            path_omero_data_czi,
+            omero_data_czi_image_filenames_mapping,
+            self.gw,
+        )
+
+        async def _pack():
+            task = asyncio.create_task(packer.pack())
+            events = [event async for event in packer.progress()]
+            await task
+            return events
+
+        events = asyncio.run(_pack())
+
+        assert _files(tmp_path / "arc_async") == _files(tmp_path / "arc_sync")
+        stages = [event.stage for event in events]
+        assert stages[0] == "start"
+        assert stages[-1] == "end"
+        assert stages.count("sheets") == len(packer.packer.assay_contexts)
+        assert events[-1].fraction == 1.0
+        for event in events:
+            if event.stage == "images":
+                assert 0 < event.completed <= event.total
+
+    def test_async_pack_cancel(
+        self,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+        tmp_path,
+    ):
+        path_to_arc_repo = tmp_path / "my_arc"
+
+        def _packer():
+            return AsyncArcPacker(
+                project_czi,
+                path_to_arc_repo,
+                path_omero_data_czi,
+                omero_data_czi_image_filenames_mapping,
+                self.gw,
+            )
+
+        async def _pack_and_cancel():
+            packer = _packer()
+            task = asyncio.create_task(packer.pack())
+            async for event in packer.progress():
+                if event.stage == "start":
+                    task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(_pack_and_cancel())
+        assert (path_to_arc_repo / "isa.investigation.xlsx").exists()
+
+        # packing again completes the cancelled pack
+        packer = _packer()
+        asyncio.run(packer.pack())
+        for assay_identifier in packer.packer.assay_contexts:
+            assert (
+                path_to_arc_repo / f"assays/{assay_identifier}/isa.assay.xlsx"
+            ).exists()
+        assert packer.packer.staging_summary.total_bytes() > 0
@@ -0,0 +1,55 @@
+import openpyxl
+
+from omero_arc.arc_backend import INVESTIGATION_FILENAME, XlsxIsaBackend
+
+
+def _person_command(*options):
+    return [
+        "arc",
+        "investigation",
+        "person",
+        "register",
+        "--lastname",
+        "Doe",
+        "--firstname",
+        "Jane",
+        *options,
+    ]
+
+
+def _row(path, label):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            if row[0] == label:
+                return [value for value in row[1:] if value is not None]
+    finally:
+        wb.close()
+    return None
+
+
+def test_xlsx_backend_registers_person_once(tmp_path):
+    backend = XlsxIsaBackend(tmp_path)
+    backend.run(["arc", "investigation", "create", "--identifier", "my-arc"])
+
+    backend.run(_person_command("--email", "jane@example.org"))
+    # e.g. a pack into an ARC without manifest
+    backend.run(_person_command("--email", "other@example.org"))
+
+    path = tmp_path / INVESTIGATION_FILENAME
+    assert _row(path, "Investigation Person Last Name") == ["Doe"]
+    assert _row(path, "Investigation Person Email") == ["jane@example.org"]
+
+
+def test_xlsx_backend_updates_person(tmp_path):
+    backend = XlsxIsaBackend(tmp_path)
+    backend.run(["arc", "investigation", "create", "--identifier", "my-arc"])
+    backend.run(_person_command("--email", "jane@example.org"))
+
+    command = _person_command("--email", "other@example.org")
+    command[3] = "update"
+    backend.run(command + ["--addifmissing"])
+
+    path = tmp_path / INVESTIGATION_FILENAME
+    assert _row(path, "Investigation Person Last Name") == ["Doe"]
+    assert _row(path, "Investigation Person Email") == ["other@example.org"]
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from abstract_arc_test import AbstractArcTest
+
+from omero_arc import ArcBatchPacker
+
+
+class TestArcBatchPacker(AbstractArcTest):
+    def test_pack_batch(
+        self,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+        tmp_path,
+    ):
+        project_2 = self.make_project(name="My Other Study")
+        project_2 = self.gw.getObject("Project", project_2.id._val)
+        path_to_arc_repo = tmp_path / "my_arc"
+
+        bp = ArcBatchPacker(
+            [project_czi, project_2],
+            destination_path=path_to_arc_repo,
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+            max_workers=2,
+        )
+        bp.pack()
+
+        assert set(os.listdir(path_to_arc_repo / "studies")) == {
+            "my-study-with-a-czi-image",
+            "my-other-study",
+        }
+        assert set(os.listdir(path_to_arc_repo / "assays")) == {
+            "my-first-assay",
+            "my-assay-with-czi-images",
+        }
+        assert (
+            path_to_arc_repo / "assays/my-first-assay/isa.assay.xlsx"
+        ).exists()
+        assert bp.staging_summary().total_bytes() > 0
+
+    def test_pack_batch_fails_for_duplicate_assays(
+        self,
+        project_1,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+        tmp_path,
+    ):
+        path_to_arc_repo = tmp_path / "my_arc"
+
+        # both projects contain dataset_1
+        bp = ArcBatchPacker(
+            [project_1, project_czi],
+            destination_path=path_to_arc_repo,
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+        )
+        with pytest.raises(ValueError):
+            bp.pack()
+        assert not path_to_arc_repo.exists()
@@ -0,0 +1,47 @@
+import hashlib
+
+from omero_arc.arc_checksums import (
+    CHECKSUMS_FILENAME,
+    read_checksum_index,
+    verify_arc,
+    write_assay_checksums,
+)
+from omero_arc.arc_manifest import ArcManifest
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_write_and_verify_assay_checksums(tmp_path):
+    files = {
+        "assays/assay-1/dataset/image_1.czi": b"image 1",
+        "assays/assay-1/protocols/ImageID1_metadata.json": b"{}",
+        "assays/assay-2/dataset/image 2.czi": b"image 2",
+    }
+    manifest = ArcManifest(tmp_path)
+    for relpath, data in files.items():
+        path = tmp_path / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        manifest.data["files"][relpath] = {"sha256": _sha256(data)}
+
+    write_assay_checksums(tmp_path, manifest, ["assay-1", "assay-2"])
+
+    assert read_checksum_index(tmp_path / "assays/assay-1" / CHECKSUMS_FILENAME) == {
+        "dataset/image_1.czi": _sha256(b"image 1"),
+        "protocols/ImageID1_metadata.json": _sha256(b"{}"),
+    }
+    assert (tmp_path / "assays/assay-2" / CHECKSUMS_FILENAME).read_text() == (
+        f"{_sha256(b'image 2')}  dataset/image 2.czi\n"
+    )
+    assert verify_arc(tmp_path) == []
+
+    (tmp_path / "assays/assay-1/dataset/image_1.czi").write_bytes(b"changed")
+    (tmp_path / "assays/assay-2/dataset/image 2.czi").unlink()
+    mismatches = verify_arc(tmp_path)
+
+    assert [(m.path.name, m.actual) for m in mismatches] == [
+        ("image_1.czi", _sha256(b"changed")),
+        ("image 2.czi", None),
+    ]
@@ -0,0 +1,59 @@
+from omero_arc.arc_experimenters import ExperimenterCache
+from omero_arc.arc_instrumentation import RecordingInstrumentation
+
+
+class Experimenter:
+    def __init__(self, experimenter_id):
+        self.experimenter_id = experimenter_id
+
+    def getId(self):
+        return self.experimenter_id
+
+
+class Details:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def getOwner(self):
+        return self.owner
+
+
+class OmeObject:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def getDetails(self):
+        return Details(self.owner)
+
+    def getOwner(self):
+        return self.owner
+
+
+class Conn:
+    def __init__(self, experimenters):
+        self.experimenters = {e.getId(): e for e in experimenters}
+        self.queries = []
+
+    def getObjects(self, obj_type, ids):
+        self.queries.append((obj_type, ids))
+        return [self.experimenters[i] for i in ids]
+
+
+def test_experimenter_cache():
+    owners = [Experimenter(i) for i in range(3)]
+    objects = [OmeObject(owners[i % 2]) for i in range(10)]
+    conn = Conn(owners)
+    instrumentation = RecordingInstrumentation()
+    cache = ExperimenterCache(instrumentation)
+
+    cache.prefetch(conn, objects)
+    cache.prefetch(conn, objects)
+    assert conn.queries == [("Experimenter", [0, 1])]
+
+    for ome_object in objects:
+        assert cache.owner(ome_object) is ome_object.owner
+    assert cache.owner(OmeObject(owners[2])) is owners[2]
+
+    assert len(cache) == 3
+    assert instrumentation.counters["experimenter cache hits"] == 10
+    assert instrumentation.counters["experimenter cache misses"] == 1
@@ -0,0 +1,100 @@
+import hashlib
+import os
+
+import pytest
+
+from omero_arc.arc_checksums import verify_checksums, write_checksum_index
+from omero_arc.arc_git_stores import (
+    GitAnnexStore,
+    GitLfsStore,
+    annex_hash_dirs,
+    annex_key,
+    create_git_store,
+    lfs_object_path,
+    read_lfs_pointer,
+)
+from omero_arc.arc_staging import FileStager
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+@pytest.fixture()
+def repo(tmp_path):
+    path = tmp_path / "arc"
+    os.makedirs(path / ".git")
+    return path
+
+
+@pytest.fixture()
+def image_files(tmp_path):
+    src_folder = tmp_path / "src"
+    os.makedirs(src_folder)
+    files = []
+    # the first and the last file have equal content
+    for i, data in enumerate([b"image 1", b"image 2", b"image 1"]):
+        path = src_folder / f"image_{i}.ome.tiff"
+        path.write_bytes(data)
+        files.append(path)
+    return files
+
+
+def test_annex_key():
+    assert annex_key(EMPTY_SHA256, 0, "image.ome.tiff") == (
+        f"SHA256E-s0--{EMPTY_SHA256}.ome.tiff"
+    )
+    assert annex_key(EMPTY_SHA256, 0, "image.0.1.czi").endswith(".1.czi")
+    assert annex_key(EMPTY_SHA256, 0, "image.original").endswith(EMPTY_SHA256)
+    # same directory as git-annex uses for an empty file
+    assert annex_hash_dirs(f"SHA256E-s0--{EMPTY_SHA256}") == "pX/ZJ"
+
+
+@pytest.mark.parametrize("strategies", [["hardlink"], ["copy"]])
+def test_stage_into_lfs(repo, image_files, strategies):
+    stager = FileStager(strategies=strategies, store=GitLfsStore(repo))
+    pairs = [(path, repo / "assays/a/dataset" / path.name) for path in image_files]
+    stager.stage(pairs)
+
+    for src, dst in pairs:
+        sha256 = hashlib.sha256(src.read_bytes()).hexdigest()
+        assert read_lfs_pointer(dst) == sha256
+        assert dst.read_text().endswith(f"size {src.stat().st_size}\n")
+        assert lfs_object_path(repo / ".git/lfs/objects", sha256).read_bytes() == (
+            src.read_bytes()
+        )
+    # equal content is stored once
+    assert len(list((repo / ".git/lfs/objects").rglob("*/*/*"))) == 2
+    assert (repo / ".gitattributes").read_text() == (
+        "assays/a/dataset/** filter=lfs diff=lfs merge=lfs -text\n"
+    )
+
+    write_checksum_index(
+        repo / "assays/a/checksums.sha256",
+        {
+            f"dataset/{src.name}": hashlib.sha256(src.read_bytes()).hexdigest()
+            for src in image_files
+        },
+    )
+    assert verify_checksums(repo / "assays/a", repo / ".git/lfs/objects") == []
+
+
+def test_stage_into_annex(repo, image_files):
+    stager = FileStager(strategies=["copy"], store=GitAnnexStore(repo))
+    pairs = [(path, repo / "assays/a/dataset" / path.name) for path in image_files]
+    stager.stage(pairs)
+
+    for src, dst in pairs:
+        assert dst.is_symlink()
+        assert not os.path.isabs(os.readlink(dst))
+        assert dst.read_bytes() == src.read_bytes()
+        assert dst.resolve().parent.name == dst.resolve().name
+        assert dst.resolve().name.startswith("SHA256E-s7--")
+    assert os.readlink(pairs[0][1]) == os.readlink(pairs[2][1])
+
+
+def test_git_store_needs_repo(tmp_path, image_files):
+    stager = FileStager(store=create_git_store("lfs", tmp_path / "arc"))
+    with pytest.raises(ValueError, match="not a git repository"):
+        stager.stage([(image_files[0], tmp_path / "arc/image.czi")])
+    assert create_git_store("files", tmp_path) is None
+    with pytest.raises(ValueError):
+        create_git_store("dropbox", tmp_path)
@@ -0,0 +1,55 @@
+import json
+
+from omero_arc.arc_instrumentation import (
+    NULL_INSTRUMENTATION,
+    JsonLinesInstrumentation,
+    RecordingInstrumentation,
+    instrumentation_from_env,
+)
+
+
+def test_null_instrumentation():
+    with NULL_INSTRUMENTATION.span("stage"):
+        NULL_INSTRUMENTATION.count("server calls")
+    assert not NULL_INSTRUMENTATION.enabled
+    assert NULL_INSTRUMENTATION.summary() == ""
+
+
+def test_recording_instrumentation():
+    instrumentation = RecordingInstrumentation()
+    for _ in range(3):
+        with instrumentation.span("image copy"):
+            instrumentation.count("bytes copied", 100)
+    instrumentation.server_call("getObjects")
+
+    assert instrumentation.spans["image copy"][0] == 3
+    assert instrumentation.counters["bytes copied"] == 300
+    assert instrumentation.counters["server calls: getObjects"] == 1
+    assert "image copy" in instrumentation.summary()
+
+
+def test_json_lines_instrumentation(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    instrumentation = JsonLinesInstrumentation(path)
+    with instrumentation.span("sheets"):
+        instrumentation.count("subprocesses")
+    instrumentation.close()
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e["event"], e["name"]) for e in events] == [
+        ("count", "subprocesses"),
+        ("span", "sheets"),
+    ]
+
+
+def test_instrumentation_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv("OMERO_ARC_TRACE", raising=False)
+    assert instrumentation_from_env() is NULL_INSTRUMENTATION
+
+    monkeypatch.setenv("OMERO_ARC_TRACE", "summary")
+    assert isinstance(instrumentation_from_env(), RecordingInstrumentation)
+
+    monkeypatch.setenv("OMERO_ARC_TRACE", str(tmp_path / "trace.jsonl"))
+    instrumentation = instrumentation_from_env()
+    assert isinstance(instrumentation, JsonLinesInstrumentation)
+    instrumentation.close()
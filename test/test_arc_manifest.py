@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from omero_arc.arc_manifest import MANIFEST_FILENAME, MANIFEST_VERSION, ArcManifest
+
+
+def _write_manifest(path, data):
+    path = path / MANIFEST_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def test_manifest_is_saved_with_version(tmp_path):
+    manifest = ArcManifest(tmp_path)
+    manifest.data["files"]["assays/a/dataset/image.czi"] = {"size": 1}
+    manifest.save()
+
+    with open(tmp_path / MANIFEST_FILENAME) as f:
+        assert json.load(f)["version"] == MANIFEST_VERSION
+    assert ArcManifest(tmp_path).data["files"] == manifest.data["files"]
+
+
+@pytest.mark.parametrize("version", [None, MANIFEST_VERSION + 1])
+def test_manifest_of_other_version_is_ignored(tmp_path, version):
+    data = {"files": {"assays/a/dataset/image.czi": {"size": 1}}}
+    if version is not None:
+        data["version"] = version
+    _write_manifest(tmp_path, data)
+
+    manifest = ArcManifest(tmp_path)
+
+    assert manifest.data["version"] == MANIFEST_VERSION
+    assert manifest.data["files"] == {}
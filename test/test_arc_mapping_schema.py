@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from omero_arc import arc_mapping_schema
+from omero_arc.arc_mapping_schema import (
+    ISA_MAPPING,
+    compile_mapping,
+    isa_mapping,
+    merge_mapping,
+)
+
+
+class Owner:
+    def getLastName(self):
+        return "Doe"
+
+    def getFirstName(self):
+        return "Jane"
+
+    def getEmail(self):
+        return "jane.doe@example.org"
+
+
+class Project:
+    def __init__(self):
+        self.owner_calls = 0
+
+    def getName(self):
+        return "My Study"
+
+    def getDescription(self):
+        return None
+
+    def getOwner(self):
+        self.owner_calls += 1
+        return Owner()
+
+
+class Mapper:
+    def __init__(self):
+        self.obj = Project()
+
+    def owner(self):
+        return self.obj.getOwner()
+
+    def study_identifier(self):
+        return "my-study"
+
+
+def _spec(kind, annotation_type, mapping=None):
+    compiled = compile_mapping(ISA_MAPPING if mapping is None else mapping)
+    for spec in compiled[kind]:
+        if spec.annotation_type == annotation_type:
+            return spec
+
+
+def test_placeholders_are_bound_lazily():
+    mapper = Mapper()
+    spec = _spec("study", "metadata")
+    assert mapper.obj.owner_calls == 0
+
+    assert dict(spec.default_values(mapper)) == {
+        "Study Identifier": "my-study",
+        "Study Title": "My Study",
+    }
+    assert mapper.obj.owner_calls == 0
+
+    contacts = _spec("study", "contacts")
+    assert dict(contacts.default_values(mapper))["Study Person Last Name"] == "Doe"
+    assert contacts.bind_command(mapper)[-2:] == ["--studyidentifier", "my-study"]
+
+
+def test_site_mapping(tmp_path, monkeypatch):
+    site_mapping = {
+        "study": {
+            "metadata": {
+                "default_values": {
+                    "Study Identifier": "{identifier}",
+                    "Study Title": "Imaging core facility study",
+                }
+            }
+        }
+    }
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps(site_mapping))
+    monkeypatch.setenv("OMERO_ARC_MAPPING", str(path))
+
+    mapping = isa_mapping()
+    spec = [s for s in mapping["study"] if s.annotation_type == "metadata"][0]
+
+    assert spec.namespace == "ARC:ISA:STUDY:STUDY"
+    assert dict(spec.default_values(Mapper()))["Study Title"] == (
+        "Imaging core facility study"
+    )
+    assert isa_mapping() is mapping
+    monkeypatch.delenv("OMERO_ARC_MAPPING")
+    assert isa_mapping() is not mapping
+    arc_mapping_schema._compiled.pop(str(path))
+
+
+def test_unknown_placeholder():
+    mapping = merge_mapping(
+        ISA_MAPPING,
+        {"study": {"metadata": {"default_values": {"Study Title": "{title}"}}}},
+    )
+    with pytest.raises(ValueError):
+        compile_mapping(mapping)
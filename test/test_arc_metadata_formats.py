@@ -0,0 +1,157 @@
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from omero_arc.arc_metadata import GlobalMetadataDigests
+from omero_arc.arc_metadata_formats import (
+    INDEX_FILENAME,
+    OriginalMetadataFormat,
+    global_metadata_digest,
+    read_original_metadata,
+)
+
+GLOBAL_METADATA = {f"key {i}": f"value {i}" for i in range(100)}
+
+
+def _metadata(image_id):
+    return {
+        "series_metadata": {"series key": image_id},
+        "global_metadata": GLOBAL_METADATA if image_id != 2 else None,
+        "image_id": image_id,
+        "image_filename": f"image{image_id}.tiff",
+    }
+
+
+def _write(fmt, folder, image_ids):
+    digests = GlobalMetadataDigests()
+    metadata = [_metadata(image_id) for image_id in image_ids]
+    global_metadata = [digests.split(m, fileset_id=1) for m in metadata]
+    if fmt.per_image:
+        for m, g in zip(metadata, global_metadata):
+            fmt.write_image_file(folder, m, g)
+    else:
+        with fmt.writer(folder / fmt.filename()) as writer:
+            for m, g in zip(metadata, global_metadata):
+                writer.write(m, g)
+
+
+@pytest.mark.parametrize(
+    "spec", ["json", "json.gz", "json.zst", "jsonl", "jsonl.gz", "jsonl.zst", "parquet"]
+)
+def test_write_and_read_original_metadata(spec, tmp_path):
+    if spec.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    if spec.startswith("parquet"):
+        pytest.importorskip("pyarrow")
+    fmt = OriginalMetadataFormat.from_spec(spec)
+    assert fmt.spec == spec
+
+    _write(fmt, tmp_path, [3, 1, 2])
+
+    for image_id in [1, 2, 3]:
+        metadata = read_original_metadata(tmp_path, image_id)
+        assert metadata.pop("global_metadata_sha256") == global_metadata_digest(
+            _metadata(image_id)["global_metadata"]
+        )
+        assert metadata == _metadata(image_id)
+    with pytest.raises(KeyError):
+        read_original_metadata(tmp_path, 4)
+
+
+def test_uncompressed_json_is_pretty_printed(tmp_path):
+    fmt = OriginalMetadataFormat()
+    metadata = {"series_metadata": {"a": 1}, "image_id": 1}
+    metadata["global_metadata_sha256"] = None
+    fmt.write_image_file(tmp_path, metadata)
+
+    with open(tmp_path / "ImageID1_metadata.json") as f:
+        content = f.read()
+    assert content == json.dumps(metadata, indent=4)
+
+
+def test_global_metadata_is_stored_once(tmp_path):
+    fmt = OriginalMetadataFormat()
+    _write(fmt, tmp_path, [1, 2, 3, 4])
+
+    digest = global_metadata_digest(GLOBAL_METADATA)
+    assert sorted(p.name for p in tmp_path.glob("global_metadata_*")) == [
+        f"global_metadata_{digest}.json"
+    ]
+    with open(tmp_path / "ImageID3_metadata.json") as f:
+        assert "global_metadata" not in json.load(f)
+
+
+def test_write_image_file_returns_global_metadata_path(tmp_path):
+    fmt = OriginalMetadataFormat()
+    digests = GlobalMetadataDigests()
+    paths = []
+    for image_id in [1, 2]:
+        metadata = _metadata(image_id)
+        global_metadata = digests.split(metadata, fileset_id=1)
+        paths.append(fmt.write_image_file(tmp_path, metadata, global_metadata))
+
+    digest = global_metadata_digest(GLOBAL_METADATA)
+    assert paths == [tmp_path / f"global_metadata_{digest}.json", None]
+
+
+@pytest.mark.parametrize("spec", ["jsonl", "parquet"])
+def test_consolidated_writer_other_paths(spec, tmp_path):
+    if spec.startswith("parquet"):
+        pytest.importorskip("pyarrow")
+    fmt = OriginalMetadataFormat.from_spec(spec)
+    _write(fmt, tmp_path, [1, 2])
+
+    writer = fmt.writer(tmp_path / fmt.filename())
+    assert len(writer.other_paths) > 0
+    for path in writer.other_paths:
+        assert path.exists()
+
+
+def test_global_metadata_digests_in_threads():
+    digests = GlobalMetadataDigests()
+    metadata = [
+        {"series_metadata": None, "global_metadata": {"a": 1}} for _ in range(20)
+    ]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda m: digests.split(m, fileset_id=7), metadata))
+
+    assert len({m["global_metadata_sha256"] for m in metadata}) == 1
+
+
+def test_global_metadata_digest_per_fileset():
+    digests = GlobalMetadataDigests()
+    first = {"series_metadata": None, "global_metadata": {"a": 1}}
+    assert digests.split(first, fileset_id=7) == {"a": 1}
+
+    # images of the same fileset are not hashed again
+    second = {"series_metadata": None, "global_metadata": {"a": 1}}
+    digests.split(second, fileset_id=7)
+    assert second["global_metadata_sha256"] == first["global_metadata_sha256"]
+    assert "global_metadata" not in second
+
+    other = {"series_metadata": None, "global_metadata": {"a": 2}}
+    digests.split(other)
+    assert other["global_metadata_sha256"] != first["global_metadata_sha256"]
+
+
+def test_json_lines_are_compressed_separately(tmp_path):
+    fmt = OriginalMetadataFormat.from_spec("jsonl.gz")
+    _write(fmt, tmp_path, [1, 2])
+
+    # the lines are gzip members, the whole file is valid gzip
+    with gzip.open(tmp_path / "original_metadata.jsonl.gz") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["image_id"] for line in lines] == [1, 2]
+    with gzip.open(tmp_path / "original_metadata.global.jsonl.gz") as f:
+        assert [json.loads(line) for line in f] == [GLOBAL_METADATA]
+    with open(tmp_path / INDEX_FILENAME) as f:
+        assert sorted(json.load(f)["images"]) == ["1", "2"]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        OriginalMetadataFormat.from_spec("xml")
+    with pytest.raises(ValueError):
+        OriginalMetadataFormat.from_spec("jsonl.bz2")
@@ -0,0 +1,166 @@
+import datetime
+import zipfile
+
+import pytest
+
+import openpyxl
+import openpyxl.styles
+import openpyxl.worksheet.table
+
+from omero_arc.arc_model import IsaBlock, IsaTable, Person, Study
+from omero_arc.arc_xlsx import IsaSheet, write_sheets_streaming
+
+
+def test_isa_item_fields():
+    study = Study.from_labels(
+        {"Study Identifier": "my-study", "Study Title": "My Study"}
+    )
+
+    assert study.identifier == "my-study"
+    assert study.title == "My Study"
+    assert study.description is None
+    assert study["Study Title"] == "My Study"
+    assert study == Study(identifier="my-study", title="My Study")
+    assert not hasattr(study, "__dict__")
+    with pytest.raises(KeyError):
+        study["Study Color"]
+    with pytest.raises(AttributeError):
+        study.color = "red"
+
+
+def test_isa_item_comments():
+    person = Person.from_labels(
+        {"Study Person Last Name": "Doe", "Comment[Department]": "Imaging"}
+    )
+
+    assert person.last_name == "Doe"
+    assert person.comments == {"Comment[Department]": "Imaging"}
+    assert person["Comment[Department]"] == "Imaging"
+    assert Person(last_name="Doe").comments is None
+
+
+def test_isa_block_commands():
+    block = IsaBlock(
+        ["arc", "study", "person", "register", "--studyidentifier", "my-study"],
+        [
+            ("Last Name", "--lastname"),
+            ("First Name", "--firstname"),
+            ("Comment", None),
+        ],
+        [
+            Person.from_labels({"Last Name": "Doe", "First Name": "Jane"}),
+            Person.from_labels({"Last Name": "Roe", "Comment": "not an option"}),
+        ],
+    )
+
+    cmds = list(block.arccommander_commands())
+
+    assert cmds == [
+        [
+            "arc", "study", "person", "register", "--studyidentifier", "my-study",
+            "--lastname", "Doe", "--firstname", "Jane",
+        ],
+        [
+            "arc", "study", "person", "register", "--studyidentifier", "my-study",
+            "--lastname", "Roe",
+        ],
+    ]
+
+
+def test_isa_table():
+    table = IsaTable.from_rows(
+        "Image Files",
+        [{"Image ID": 1, "Name": "a.tiff"}, {"Image ID": 2}],
+    )
+
+    assert table.columns == ("Image ID", "Name")
+    assert len(table) == 2
+    assert table.column("Name") == ["a.tiff", None]
+    assert list(table.rows()) == [(1, "a.tiff"), (2, None)]
+
+    df = table.to_pandas()
+    assert df.name == "Image Files"
+    assert list(df.columns) == ["Image ID", "Name"]
+    assert df["Image ID"].tolist() == [1, 2]
+
+
+def test_empty_isa_table_keeps_columns():
+    table = IsaTable("Image Files", ["Image ID", "Name"])
+
+    assert len(table) == 0
+    assert list(table.to_pandas().columns) == ["Image ID", "Name"]
+
+
+def test_write_isa_tables(tmp_path):
+    path = tmp_path / "isa.assay.xlsx"
+    table = IsaTable("Image Files", ["Image ID", "Name"], [[1, 2], ["a", "b"]])
+
+    write_sheets_streaming(path, [table, ("Other", iter([{"Key": "value"}]))])
+
+    wb = openpyxl.load_workbook(path, read_only=True)
+    assert list(wb["Image Files"].values) == [("Image ID", "Name"), (1, "a"), (2, "b")]
+    assert list(wb["Other"].values) == [("Key",), ("value",)]
+    wb.close()
+
+
+def test_write_sheets_keeps_existing_sheets(tmp_path):
+    path = tmp_path / "isa.assay.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Assay"
+    ws.append(["Sample Name", "Protocol"])
+    ws.append(["s1", "p1"])
+    ws["A1"].font = openpyxl.styles.Font(bold=True)
+    ws["A1"].fill = openpyxl.styles.PatternFill("solid", fgColor="FFFF00")
+    ws.column_dimensions["A"].width = 42
+    ws.merge_cells("C1:D1")
+    ws.add_table(openpyxl.worksheet.table.Table(displayName="Samples", ref="A1:B2"))
+    wb.save(path)
+
+    date = datetime.datetime(2024, 5, 17, 12, 30)
+    write_sheets_streaming(path, [("Images", iter([{"Name": "a", "Date": date}]))])
+    write_sheets_streaming(path, [("Images", iter([{"Name": "b", "Date": date}]))])
+
+    wb = openpyxl.load_workbook(path)
+    assert wb.sheetnames == ["Assay", "Images"]
+    ws = wb["Assay"]
+    assert ws["A1"].font.bold
+    assert ws["A1"].fill.fgColor.rgb == "00FFFF00"
+    assert ws.column_dimensions["A"].width == 42
+    assert [str(cells) for cells in ws.merged_cells.ranges] == ["C1:D1"]
+    assert list(ws.tables) == ["Samples"]
+    assert list(ws.iter_rows(max_col=2, values_only=True)) == [
+        ("Sample Name", "Protocol"),
+        ("s1", "p1"),
+    ]
+    assert list(wb["Images"].values) == [("Name", "Date"), ("b", date)]
+    assert wb["Images"]["B2"].is_date
+
+    def _cell_formats():
+        with zipfile.ZipFile(path) as package:
+            return package.read("xl/styles.xml").count(b"<xf ")
+
+    n_cell_formats = _cell_formats()
+    write_sheets_streaming(path, [("Images", iter([{"Name": "c", "Date": date}]))])
+    assert _cell_formats() == n_cell_formats
+
+
+def test_isa_sheet_save_keeps_other_sheets(tmp_path):
+    path = tmp_path / "isa.assay.xlsx"
+    wb = openpyxl.Workbook()
+    wb.active.title = "Annotation"
+    wb.active["A1"] = "Source Name"
+    wb.active["A1"].font = openpyxl.styles.Font(bold=True)
+    wb.create_sheet("Assay")
+    wb.save(path)
+
+    sheet = IsaSheet.new("Assay", {"ASSAY": ["Measurement Type"]})
+    sheet.section("ASSAY").append({"Measurement Type": "imaging"})
+    sheet.save(path)
+
+    wb = openpyxl.load_workbook(path)
+    assert wb.sheetnames == ["Annotation", "Assay"]
+    assert wb["Annotation"]["A1"].font.bold
+    assert IsaSheet.load(path, "Assay").section("ASSAY").columns == [
+        {"Measurement Type": "imaging"}
+    ]
@@ -3,6 +3,8 @@ import pandas as pd
 from abstract_arc_test import AbstractArcTest
 
 from omero_arc import ArcPacker
+from omero_arc.arc_checksums import CHECKSUMS_FILENAME, verify_arc
+from omero_arc.arc_metadata import OriginalMetadataFetcher, original_image_metadata
 from omero_arc.arc_packer import is_arc_repo
 
 import pytest
@@ -283,6 +285,22 @@ class TestArcPacker(AbstractArcTest):
         for df in dfs:
             assert not df.empty
 
+    def test_assay_context_is_reused(self, arc_repo_1):
+        ap = arc_repo_1
+        context = ap.assay_contexts["my-assay-with-czi-images"]
+
+        tables = context.sheet_tables(self.gw)
+        assert context.sheet_tables(self.gw) is tables
+        assert ap._isa_sheet_mappers("my-assay-with-czi-images") is (
+            context.mapper.isa_sheets
+        )
+
+        dfs = ap.isa_assay_tables(assay_identifier="my-assay-with-czi-images")
+        for df, table in zip(dfs, tables):
+            assert df.name == table.name
+            assert list(df.columns) == list(table.columns)
+            assert len(df) == len(table) == len(context.images)
+
     def test_add_isa_assay_sheets(
         self,
         arc_repo_1,
@@ -298,3 +316,221 @@ class TestArcPacker(AbstractArcTest):
                 df = pd.read_excel(isa_assay_file, sheet_name=sheet_name)
                 assert not df.empty
         pass
+
+    def test_isa_backends_write_equal_isa_files(
+        self, project_with_arc_assay_annotation, tmp_path
+    ):
+        def _pack_isa_files(isa_backend):
+            path_to_arc_repo = tmp_path / isa_backend
+            ap = ArcPacker(
+                ome_object=project_with_arc_assay_annotation,
+                destination_path=path_to_arc_repo,
+                tmp_path=None,
+                image_filenames_mapping=None,
+                conn=self.gw,
+                isa_backend=isa_backend,
+            )
+            ap.initialize_arc_repo()
+            ap._create_study()
+            ap._create_assays()
+            return path_to_arc_repo
+
+        path_arccommander = _pack_isa_files("arccommander")
+        path_xlsx = _pack_isa_files("xlsx")
+
+        for filename in [
+            "isa.investigation.xlsx",
+            "studies/my-custom-study-id/isa.study.xlsx",
+            "assays/my-custom-assay-id/isa.assay.xlsx",
+        ]:
+            sheets_arccommander = pd.read_excel(
+                path_arccommander / filename, sheet_name=None, header=None
+            )
+            sheets_xlsx = pd.read_excel(
+                path_xlsx / filename, sheet_name=None, header=None
+            )
+            assert list(sheets_xlsx) == list(sheets_arccommander)
+            for sheet_name, df_arccommander in sheets_arccommander.items():
+                pd.testing.assert_frame_equal(
+                    sheets_xlsx[sheet_name], df_arccommander, check_dtype=False
+                )
+
+    def test_arc_packer_dry_run(self, project_with_arc_assay_annotation, tmp_path):
+        path_to_arc_repo = tmp_path / "my_arc"
+        ap = ArcPacker(
+            ome_object=project_with_arc_assay_annotation,
+            destination_path=path_to_arc_repo,
+            tmp_path=None,
+            image_filenames_mapping=None,
+            conn=self.gw,
+        )
+        plan = ap.pack(dry_run=True)
+
+        assert not path_to_arc_repo.exists()
+        workbooks = list(plan.commands_by_workbook().keys())
+        assert "isa.investigation.xlsx" in workbooks
+        assert "studies/my-custom-study-id/isa.study.xlsx" in workbooks
+        assert "assays/my-custom-assay-id/isa.assay.xlsx" in workbooks
+        assert plan.ordered_commands()[0][:3] == ["arc", "investigation", "create"]
+
+    def test_original_metadata_parallel(self, project_czi, dataset_czi_1):
+        dataset = self.gw.getObject("Dataset", dataset_czi_1.id._val)
+        images = list(self.gw.getObjects("Image", opts={"dataset": dataset.getId()}))
+
+        expected = [
+            (image.getId(), original_image_metadata(image)) for image in images
+        ]
+        fetcher = OriginalMetadataFetcher(self.gw, max_workers=3)
+        # in the order of the images, whatever order the requests complete
+        results = [(image.getId(), metadata) for image, metadata in fetcher.fetch(images)]
+        fetcher.close()
+
+        assert results == expected
+        assert self.gw.isConnected()
+
+    def test_repack_skips_unchanged_objects(
+        self,
+        arc_repo_1,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+    ):
+        path_to_arc_repo = arc_repo_1.path_to_arc_repo
+        assert (path_to_arc_repo / ".arc/omero_arc_manifest.json").exists()
+        n_files = len(arc_repo_1.manifest.data["files"])
+        assert n_files > 0
+
+        ap = ArcPacker(
+            ome_object=project_czi,
+            destination_path=path_to_arc_repo,
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+        )
+        ap.pack()
+
+        assert ap.staging_summary.total_bytes() == 0
+        assert len(ap.manifest.data["files"]) == n_files
+        for assay_identifier in ap.assay_contexts:
+            assert (
+                path_to_arc_repo / f"assays/{assay_identifier}" / CHECKSUMS_FILENAME
+            ).exists()
+        assert verify_arc(path_to_arc_repo) == []
+        assert not (path_to_arc_repo / "studies/my-study-with-a-czi-image-1").exists()
+
+    def test_repack_rewrites_deleted_global_metadata(
+        self,
+        arc_repo_1,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+    ):
+        path_to_arc_repo = arc_repo_1.path_to_arc_repo
+        global_paths = list(
+            path_to_arc_repo.glob("assays/*/protocols/global_metadata_*.json")
+        )
+        assert len(global_paths) > 0
+        for path in global_paths:
+            relpath = path.relative_to(path_to_arc_repo).as_posix()
+            assert relpath in arc_repo_1.manifest.data["files"]
+        global_paths[0].unlink()
+
+        ap = ArcPacker(
+            ome_object=project_czi,
+            destination_path=path_to_arc_repo,
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+        )
+        ap.pack()
+
+        assert global_paths[0].exists()
+        assert verify_arc(path_to_arc_repo) == []
+
+    @pytest.mark.parametrize("isa_backend", ["xlsx", "arccommander"])
+    def test_repack_updates_changed_isa_metadata(
+        self, project_with_arc_assay_annotation, tmp_path, isa_backend
+    ):
+        path_to_arc_repo = tmp_path / "my_arc"
+
+        def _pack_isa_files(project):
+            ap = ArcPacker(
+                ome_object=project,
+                destination_path=path_to_arc_repo,
+                tmp_path=None,
+                image_filenames_mapping=None,
+                conn=self.gw,
+                isa_backend=isa_backend,
+            )
+            with ap.batched_isa_commands():
+                if not is_arc_repo(path_to_arc_repo):
+                    ap.initialize_arc_repo()
+                ap._create_study()
+                ap._create_assays()
+            ap._record_isa_objects()
+            return ap
+
+        _pack_isa_files(project_with_arc_assay_annotation)
+
+        for annotation in project_with_arc_assay_annotation.listAnnotations(
+            ns="ARC:ISA:STUDY:STUDY"
+        ):
+            annotation.setValue(
+                [
+                    [key, "My Changed Study Title" if key == "Study Title" else value]
+                    for key, value in annotation.getValue()
+                ]
+            )
+            annotation.save()
+        project = self.gw.getObject(
+            "Project", project_with_arc_assay_annotation.getId()
+        )
+
+        ap = _pack_isa_files(project)
+
+        for filename, sheet_name in [
+            ("isa.investigation.xlsx", "isa_investigation"),
+            ("studies/my-custom-study-id/isa.study.xlsx", "Study"),
+        ]:
+            df = pd.read_excel(
+                path_to_arc_repo / filename, sheet_name=sheet_name, index_col=0
+            )
+            assert df.loc["Study Title"].iloc[0] == "My Changed Study Title"
+            # updated items are not registered again
+            assert df.loc["Study Publication DOI"].count() == 2
+        assert (
+            ap.manifest.isa_object_status(
+                "studies",
+                project,
+                ap.study_mapper.study_identifier(),
+                ap.study_mapper.arccommander_commands(),
+            )
+            == "current"
+        )
+
+    def test_progress_events(
+        self,
+        project_czi,
+        path_omero_data_czi,
+        omero_data_czi_image_filenames_mapping,
+        tmp_path,
+    ):
+        events = []
+        ap = ArcPacker(
+            ome_object=project_czi,
+            destination_path=tmp_path / "my_arc",
+            tmp_path=path_omero_data_czi,
+            image_filenames_mapping=omero_data_czi_image_filenames_mapping,
+            conn=self.gw,
+            progress_callback=events.append,
+        )
+        ap.pack()
+
+        assert events[0].stage == "start"
+        assert events[-1].stage == "end"
+        assert events[-1].fraction == 1.0
+        assert events[-1].bytes_completed == ap.staging_summary.total_bytes()
+        assert [e.completed for e in events if e.stage == "sheets"] == [
+            i + 1 for i in range(len(ap.assay_contexts))
+        ]
+        assert "my-assay-with-czi-images" in ap.progress.summary()
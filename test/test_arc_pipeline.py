@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from omero_arc.arc_pipeline import END_OF_STREAM, Pipeline
+
+
+def test_pipeline_passes_items_in_order():
+    pipeline = Pipeline(queue_size=2)
+    numbers = pipeline.queue()
+    squares = pipeline.queue()
+    results = []
+
+    def _produce():
+        for i in range(100):
+            pipeline.put(numbers, i)
+            # backpressure: never more than queue_size items buffered
+            assert numbers.qsize() <= 2
+        pipeline.put(numbers, END_OF_STREAM)
+
+    def _square():
+        while True:
+            item = pipeline.get(numbers)
+            if item is END_OF_STREAM:
+                pipeline.put(squares, END_OF_STREAM)
+                return
+            pipeline.put(squares, item * item)
+
+    def _collect():
+        while True:
+            item = pipeline.get(squares)
+            if item is END_OF_STREAM:
+                return
+            results.append(item)
+
+    pipeline.stage("produce", _produce)
+    pipeline.stage("square", _square)
+    pipeline.stage("collect", _collect)
+    pipeline.join()
+
+    assert results == [i * i for i in range(100)]
+
+
+def test_pipeline_aborts_all_stages_on_error():
+    pipeline = Pipeline(queue_size=1)
+    items = pipeline.queue()
+    blocked = threading.Event()
+
+    def _produce():
+        for i in range(100):
+            if i == 2:
+                blocked.set()
+            pipeline.put(items, i)
+
+    def _fail():
+        pipeline.get(items)
+        blocked.wait()
+        raise ValueError("stage failed")
+
+    pipeline.stage("produce", _produce)
+    pipeline.stage("fail", _fail)
+    with pytest.raises(ValueError, match="stage failed"):
+        pipeline.join()
@@ -0,0 +1,42 @@
+from omero_arc.arc_pixels import PixelsTable
+
+
+def test_pixels_table():
+    pixels = PixelsTable()
+    pixels.append(3, (512, 256, 10, 2, 1), (0.1, 0.1, 0.5), "MICROMETER", "uint16")
+    pixels.append(5, (64, 64, 1, 1, 1), (None, None, None), None, "uint8")
+
+    assert len(pixels) == 2
+    assert 3 in pixels
+    assert 4 not in pixels
+    assert pixels.values(3) == {
+        "size_x": 512,
+        "size_y": 256,
+        "size_z": 10,
+        "size_c": 2,
+        "size_t": 1,
+        "physical_size_x": 0.1,
+        "physical_size_y": 0.1,
+        "physical_size_z": 0.5,
+        "unit": "MICROMETER",
+        "pixel_type": "uint16",
+    }
+    values = pixels.values(5)
+    assert values["physical_size_x"] is None
+    assert values["unit"] is None
+    assert list(pixels.columns["size_x"]) == [512, 64]
+
+
+def test_pixels_table_columns():
+    pixels = PixelsTable()
+    pixels.append(3, (512, 256, 10, 2, 1), (0.1, 0.1, 0.5), "MICROMETER", "uint16")
+    other = PixelsTable()
+    other.append(5, (64, 64, 1, 1, 1), (None, None, None), None, "uint8")
+
+    pixels = PixelsTable.concat([pixels, other])
+
+    assert pixels.column("size_x", [5, 3]) == [64, 512]
+    assert pixels.column("physical_size_z", [3, 5]) == [0.5, None]
+    assert pixels.column("unit", [3, 5]) == ["MICROMETER", None]
+    assert pixels.column("pixel_type", [5]) == ["uint8"]
+    assert pixels.values(5)["size_t"] == 1
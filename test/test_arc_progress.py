@@ -0,0 +1,112 @@
+import io
+import threading
+
+import pytest
+
+from omero_arc.arc_progress import PackProgress, ProgressBar, format_seconds
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return _Clock()
+
+
+def test_pack_progress_events(clock):
+    events = []
+    progress = PackProgress(callbacks=[events.append], clock=clock)
+    progress.start(
+        {
+            "assay-1": {"images": 2, "bytes": 300, "metadata": 2, "sheets": 1},
+            "assay-2": {"images": 1, "bytes": 100, "metadata": 1, "sheets": 1},
+        }
+    )
+    assert events[-1].stage == "start"
+    assert events[-1].total == 3
+    assert events[-1].bytes_total == 400
+    assert events[-1].eta is None
+
+    # assay-2 is up to date
+    progress.set_total("images", "assay-2", 0, 0)
+    progress.set_total("metadata", "assay-2", 0)
+    progress.set_total("sheets", "assay-2", 0)
+
+    clock.now = 10.0
+    progress.advance("images", "assay-1", nbytes=150)
+    event = events[-1]
+    assert (event.stage, event.assay_identifier) == ("images", "assay-1")
+    assert (event.completed, event.total) == (1, 2)
+    assert (event.bytes_completed, event.bytes_total) == (150, 300)
+    # half of the images, nothing of metadata and sheets
+    assert event.fraction == pytest.approx(0.5 / 3)
+    assert event.eta == pytest.approx(50.0)
+
+    clock.now = 20.0
+    progress.advance("images", "assay-1", nbytes=150)
+    progress.advance("metadata", "assay-1", count=2)
+    progress.advance("sheets", "assay-1")
+    progress.finish()
+    assert events[-1].stage == "end"
+    assert events[-1].fraction == 1.0
+    assert events[-1].eta == 0.0
+
+    summary = progress.summary().splitlines()
+    assert summary[1].split()[:5] == ["assay-1", "2", "0.0", "2", "1"]
+    assert summary[-1] == "packed in 20.0 s"
+
+
+def test_progress_bar(clock):
+    stream = io.StringIO()
+    progress = PackProgress(
+        callbacks=[ProgressBar(stream=stream, width=10, clock=clock)], clock=clock
+    )
+    progress.start({"assay-1": {"images": 2, "bytes": 2**30, "sheets": 1}})
+    clock.now = 1.0
+    progress.advance("images", "assay-1", nbytes=2**29)
+    # drawn at most every min_interval seconds
+    progress.advance("images", "assay-1", nbytes=2**29)
+    clock.now = 2.0
+    progress.advance("sheets", "assay-1")
+    progress.finish()
+
+    lines = stream.getvalue().split("\r")[1:]
+    assert len(lines) == 4
+    assert lines[1].startswith("[##--------]  25% images 1/2 0.5/1.0 GiB ETA 0:00:03")
+    assert lines[2].startswith("[##########] 100% sheets 1/1")
+    assert lines[3].endswith("\n")
+
+
+def test_format_seconds():
+    assert format_seconds(None) == "--:--:--"
+    assert format_seconds(3725.4) == "1:02:05"
+
+
+def test_pack_progress_callbacks_without_lock(clock):
+    progress = PackProgress(clock=clock)
+    progress.start({"assay-1": {"images": 2, "bytes": 200}})
+    unlocked = []
+
+    def _acquire():
+        acquired = progress._lock.acquire(blocking=False)
+        if acquired:
+            progress._lock.release()
+        unlocked.append(acquired)
+
+    def _callback(event):
+        # other threads can advance the progress while a callback runs
+        thread = threading.Thread(target=_acquire)
+        thread.start()
+        thread.join()
+
+    progress.add_callback(_callback)
+    progress.advance("images", "assay-1", nbytes=100)
+    progress.finish()
+
+    assert unlocked == [True, True]
@@ -0,0 +1,47 @@
+from abstract_arc_test import AbstractArcTest
+
+from omero_arc.arc_snapshot import ProjectSnapshot
+
+
+class TestProjectSnapshot(AbstractArcTest):
+    def test_load_project_snapshot(self, project_with_arc_assay_annotation):
+        project = project_with_arc_assay_annotation
+        snapshot = ProjectSnapshot.load(self.gw, project)
+
+        dataset_names = sorted(dataset.getName() for dataset in snapshot.datasets)
+        assert dataset_names == ["My Assay with Annotations", "My First Assay"]
+
+        for dataset in snapshot.datasets:
+            expected_ids = sorted(
+                image.getId()
+                for image in self.gw.getObjects(
+                    "Image", opts={"dataset": dataset.getId()}
+                )
+            )
+            images = snapshot.images(dataset.getId())
+            assert [image.getId() for image in images] == expected_ids
+            pixels = snapshot.pixels(dataset.getId())
+            assert list(pixels.image_ids) == expected_ids
+            for image in images:
+                values = pixels.values(image.getId())
+                assert values["size_x"] == image.getSizeX() > 0
+                assert values["size_c"] == image.getSizeC()
+                assert values["pixel_type"] == image.getPixelsType()
+                # the unit string of the baseline sheet, from getUnit()
+                pixel_size = self.gw.getObject("Image", image.getId()).getPixelSizeX(
+                    units=True
+                )
+                expected_unit = (
+                    None if pixel_size is None else str(pixel_size.getUnit())
+                )
+                assert values["unit"] == expected_unit
+
+        namespaces = [a.getNs() for a in snapshot.annotations(project)]
+        assert "ARC:ISA:STUDY:STUDY" in namespaces
+        assert len(namespaces) == len(list(project.listAnnotations()))
+
+        dataset = [
+            d for d in snapshot.datasets if d.getName() == "My Assay with Annotations"
+        ][0]
+        namespaces = [a.getNs() for a in snapshot.annotations(dataset)]
+        assert namespaces.count("ARC:ISA:ASSAY:ASSAY PERFORMERS") == 2
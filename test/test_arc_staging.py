@@ -0,0 +1,78 @@
+import hashlib
+import os
+
+import pytest
+
+from omero_arc.arc_staging import FileStager
+
+
+@pytest.fixture()
+def image_files(tmp_path):
+    src_folder = tmp_path / "src"
+    os.makedirs(src_folder)
+    files = []
+    for i in range(5):
+        path = src_folder / f"image_{i}.czi"
+        path.write_bytes(os.urandom(1000 * (i + 1)))
+        files.append(path)
+    return files
+
+
+@pytest.mark.parametrize(
+    "strategies", [["hardlink"], ["reflink"], ["copy"], ["hardlink", "copy"]]
+)
+def test_stage_files(image_files, tmp_path, strategies):
+    stager = FileStager(max_workers=3, strategies=strategies)
+    pairs = [(path, tmp_path / "dataset" / path.name) for path in image_files]
+
+    summary = stager.stage(pairs)
+
+    for src, dst in pairs:
+        assert dst.read_bytes() == src.read_bytes()
+    assert sum(summary.files.values()) == len(image_files)
+    assert summary.total_bytes() == sum(src.stat().st_size for src in image_files)
+
+
+@pytest.mark.parametrize("strategies", [["hardlink"], ["reflink"], ["copy"]])
+def test_stage_files_checksums(image_files, tmp_path, strategies):
+    stager = FileStager(max_workers=3, strategies=strategies)
+    pairs = [(path, tmp_path / "dataset" / path.name) for path in image_files]
+    checksums = {}
+
+    def _staged(src, dst, sha256):
+        checksums[dst] = sha256
+
+    stager.stage(pairs, callback=_staged)
+
+    assert checksums == {
+        dst: hashlib.sha256(src.read_bytes()).hexdigest() for src, dst in pairs
+    }
+
+
+def test_stage_files_unknown_strategy():
+    with pytest.raises(ValueError):
+        FileStager(strategies=["teleport"])
+
+
+@pytest.mark.parametrize("strategies", [["hardlink"], ["copy"]])
+def test_stage_files_same_destination(image_files, tmp_path, strategies):
+    # a multi-series file is listed once per series
+    stager = FileStager(max_workers=4, strategies=strategies)
+    dst = tmp_path / "dataset" / image_files[0].name
+    pairs = [(image_files[0], dst)] * 20
+
+    summary = stager.stage(pairs)
+
+    assert dst.read_bytes() == image_files[0].read_bytes()
+    assert sum(summary.files.values()) == 1
+    assert os.listdir(dst.parent) == [dst.name]
+
+    # staging again replaces the file
+    stager.stage(pairs)
+    assert os.listdir(dst.parent) == [dst.name]
+
+
+def test_stage_files_conflicting_destination(image_files, tmp_path):
+    dst = tmp_path / "dataset" / "image.czi"
+    with pytest.raises(ValueError):
+        FileStager().stage([(image_files[0], dst), (image_files[1], dst)])
@@ -0,0 +1,66 @@
+import zipfile
+
+import openpyxl
+import openpyxl.worksheet.table
+
+from omero_arc.arc_xlsx_package import XmlPart, replace_sheets, sheet_parts
+
+
+def test_xml_part_keeps_namespace_prefixes():
+    data = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        b'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+        b'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+        b'xmlns:x15="http://schemas.microsoft.com/office/spreadsheetml/2010/11/main" '
+        b'mc:Ignorable="x15">'
+        b'<sheets><sheet name="Assay" sheetId="1" r:id="rId1"/></sheets>'
+        b"<extLst><ext uri=\"{1}\"><x15:workbookPr chartTrackingRefBase=\"1\"/>"
+        b"</ext></extLst></workbook>"
+    )
+
+    out = XmlPart(data).to_bytes()
+
+    assert b"<workbook " in out
+    assert b'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"' in out
+    assert b' r:id="rId1"' in out
+    assert b'mc:Ignorable="x15"' in out
+    assert b"<x15:workbookPr " in out
+    assert sorted(XmlPart(out).namespaces) == sorted(XmlPart(data).namespaces)
+
+
+def test_replace_sheets(tmp_path):
+    path = tmp_path / "old.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Images"
+    ws.append(["Name"])
+    ws.append(["a"])
+    ws.add_table(openpyxl.worksheet.table.Table(displayName="Images", ref="A1:A2"))
+    ws.print_area = "A1:A2"
+    wb.create_sheet("Assay")["A1"] = "kept"
+    wb.save(path)
+
+    sheets_path = tmp_path / "new.xlsx"
+    wb = openpyxl.Workbook(write_only=True)
+    wb.create_sheet("Images").append(["Name", "Size"])
+    wb.create_sheet("Metadata").append(["Key"])
+    wb.save(sheets_path)
+
+    out_path = tmp_path / "out.xlsx"
+    replace_sheets(path, sheets_path, out_path)
+
+    with zipfile.ZipFile(out_path) as package:
+        assert [title for title, _ in sheet_parts(package)] == [
+            "Images",
+            "Assay",
+            "Metadata",
+        ]
+        assert not any("tables/" in name for name in package.namelist())
+        assert b"table" not in package.read("[Content_Types].xml")
+        assert b"_xlnm.Print_Area" not in package.read("xl/workbook.xml")
+    wb = openpyxl.load_workbook(out_path)
+    assert list(wb["Images"].values) == [("Name", "Size")]
+    assert list(wb["Images"].tables) == []
+    assert wb["Assay"]["A1"].value == "kept"
+    assert list(wb["Metadata"].values) == [("Key",)]
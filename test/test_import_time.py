@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import omero_arc
+
+# omero-cli-transfer imports omero_arc for every command through the
+# pack plugin entry point, so importing it must stay cheap
+IMPORT_TIME_BUDGET_US = 50_000
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "omero"]
+
+
+def _importtime(statement):
+    """Returns module -> cumulative import time in us of running
+    statement in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_does_not_load_heavy_modules():
+    times = _importtime("import omero_arc")
+
+    assert "omero_arc" in times
+    for module in times:
+        assert module.split(".")[0] not in HEAVY_MODULES
+
+
+def test_import_time_budget():
+    times = _importtime("import omero_arc")
+
+    assert times["omero_arc"] < IMPORT_TIME_BUDGET_US
+
+
+def test_entry_point_resolves_lazily():
+    times = _importtime("from omero_arc import pack_arc")
+
+    assert "omero_arc.arc_packer" not in times
+
+
+def test_lazy_attributes():
+    from omero_arc.arc_batch import ArcBatchPacker
+    from omero_arc.arc_packer import ArcPacker
+
+    assert omero_arc.ArcPacker is ArcPacker
+    assert omero_arc.ArcBatchPacker is ArcBatchPacker
+    assert "ArcPacker" in dir(omero_arc)
@@ -1,6 +1,9 @@
 from abstract_arc_test import AbstractArcTest
 
-from omero_arc.arc_mapping import IsaAssayMapper
+from omero_arc.arc_mapping import (
+    IsaAssayMapper,
+    IsaAssaySheetImageMetadataMapper,
+)
 
 
 class TestIsaAssayMapper(AbstractArcTest):
@@ -14,11 +17,11 @@ class TestIsaAssayMapper(AbstractArcTest):
         )
 
         assert (
-            mapper_1.isa_attributes["metadata"]["values"][0]["Assay Identifier"]
+            mapper_1.isa_attributes["metadata"].values[0]["Assay Identifier"]
             == "my-first-assay"
         )
 
-        assert mapper_1.isa_attributes["contacts"]["values"][0]["Last Name"] is not None
+        assert mapper_1.isa_attributes["contacts"].values[0]["Last Name"] is not None
 
         da = dataset_with_arc_assay_annotation_obj
 
@@ -27,9 +30,37 @@ class TestIsaAssayMapper(AbstractArcTest):
         )
 
         assert (
-            mapper_2.isa_attributes["metadata"]["values"][0]["Assay Identifier"]
+            mapper_2.isa_attributes["metadata"].values[0]["Assay Identifier"]
             == "my-custom-assay-id"
         )
 
         for i in range(2):
-            assert mapper_2.isa_attributes["contacts"]["values"][i]["Last Name"] in ["Laura", "Doe"]
+            assert mapper_2.isa_attributes["contacts"].values[i]["Last Name"] in ["Laura", "Doe"]
+
+    def test_image_metadata_sheet(self, dataset_czi_1):
+        dataset = self.gw.getObject("Dataset", dataset_czi_1.id._val)
+        mapper = IsaAssaySheetImageMetadataMapper(dataset)
+
+        table = mapper.table(self.gw)
+
+        images = sorted(
+            self.gw.getObjects("Image", opts={"dataset": dataset.getId()}),
+            key=lambda image: image.getId(),
+        )
+        assert len(table) == len(images) > 0
+        for row, image in zip(table.rows(), images):
+            pixel_size = image.getPixelSizeX(units=True)
+            assert row == (
+                image.getId(),
+                image.getSizeX(),
+                image.getSizeY(),
+                image.getSizeZ(),
+                image.getPixelSizeX(),
+                image.getPixelSizeY(),
+                image.getPixelSizeZ(),
+                # as written by the baseline from getUnit()
+                None if pixel_size is None else str(pixel_size.getUnit()),
+                image.getSizeC(),
+                image.getSizeT(),
+                image.getPixelsType(),
+            )
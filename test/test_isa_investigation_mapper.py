@@ -13,20 +13,20 @@ class TestIsaInvestigationMapper(AbstractArcTest):
         m = IsaInvestigationMapper(p)
         ma = IsaInvestigationMapper(pa)
 
-        assert len(ma.isa_attributes["investigation"]["values"]) == 1
-        assert len(m.isa_attributes["investigation"]["values"]) == 1
+        assert len(ma.isa_attributes["investigation"].values) == 1
+        assert len(m.isa_attributes["investigation"].values) == 1
 
         assert (
-            m.isa_attributes["investigation"]["values"][0]["Investigation Identifier"]
+            m.isa_attributes["investigation"].values[0]["Investigation Identifier"]
             == "default-investigation-id"
         )
 
         assert (
-            ma.isa_attributes["investigation"]["values"][0]["Investigation Identifier"]
+            ma.isa_attributes["investigation"].values[0]["Investigation Identifier"]
             == "my-custom-investigation-id"
         )
 
         assert (
-            ma.isa_attributes["investigation"]["values"][0]["Investigation Title"]
+            ma.isa_attributes["investigation"].values[0]["Investigation Title"]
             == "Mitochondria in HeLa Cells"
         )
@@ -10,32 +10,32 @@ class TestIsaStudyMapper(AbstractArcTest):
 
         mapper_1 = IsaStudyMapper(p)
         assert (
-            mapper_1.isa_attributes["metadata"]["values"][0]["Study Identifier"]
+            mapper_1.isa_attributes["metadata"].values[0]["Study Identifier"]
             == "my-first-study"
         )
         assert (
-            mapper_1.isa_attributes["metadata"]["values"][0]["Study Title"]
+            mapper_1.isa_attributes["metadata"].values[0]["Study Title"]
             == "My First Study"
         )
 
         mapper_2 = IsaStudyMapper(pa)
         assert (
-            mapper_2.isa_attributes["metadata"]["values"][0]["Study Identifier"]
+            mapper_2.isa_attributes["metadata"].values[0]["Study Identifier"]
             == "my-custom-study-id"
         )
         assert (
-            mapper_2.isa_attributes["metadata"]["values"][0]["Study Title"]
+            mapper_2.isa_attributes["metadata"].values[0]["Study Title"]
             == "My Custom Study Title"
         )
 
         assert (
-            mapper_2.isa_attributes["publications"]["values"][0]
-            != mapper_2.isa_attributes["publications"]["values"][1]
+            mapper_2.isa_attributes["publications"].values[0]
+            != mapper_2.isa_attributes["publications"].values[1]
         )
-        assert mapper_2.isa_attributes["publications"]["values"][0][
+        assert mapper_2.isa_attributes["publications"].values[0][
             "Study Publication PubMed ID"
         ] in ("678978", "7898961")
-        assert mapper_2.isa_attributes["publications"]["values"][1][
+        assert mapper_2.isa_attributes["publications"].values[1][
             "Study Publication PubMed ID"
         ] in ("678978", "7898961")
 
@@ -158,3 +158,13 @@ class TestIsaStudyMapper(AbstractArcTest):
             "678978",
             "7898961",
         )
+
+    def test_annotation_store(self, project_with_arc_assay_annotation):
+        pa = project_with_arc_assay_annotation
+
+        mapper = IsaStudyMapper(pa)
+        store = mapper.annotation_store()
+        assert store is mapper.annotation_store()
+        assert len(store.annotations("ARC:ISA:STUDY:STUDY PUBLICATIONS")) == 2
+        assert len(store.annotations("ARC:ISA:STUDY:STUDY")) == 1
+        assert store.annotations("not a namespace") == []